@@ -1,15 +1,457 @@
 # ./api_authenticator.py
+import base64
 import json
 import functools
-from flask import request, jsonify
+import hashlib
+import hmac
+import os
+import threading
+import time
+from flask import request, jsonify, g
+from file_handler import stat_signature
 import logging
 
+# The secret shipped in .env, which must be replaced before session tokens are enabled
+placeholder_secret = 'change-me'
+
+
+class APIKeyIndex:
+    """
+    In-memory index of every API key found in the users directory.
+
+    The index is built by scanning `users/*.json` once and maps the SHA-256 digest of each key to
+    the set of projects it may access and its user record, so authorizing a request is a single
+    dict lookup. Raw keys are never kept in memory. The directory is rescanned at most once per
+    `refresh_interval` seconds and only files whose stat signature changed are re-read.
+
+    Attributes:
+        users_dir (str): Directory containing the `<project_name>.json` key files.
+        refresh_interval (float): Seconds the index is trusted before the directory is rescanned.
+        hits (int): Lookups that found the key.
+        misses (int): Lookups for unknown keys.
+        reloads (int): Number of key files (re)read from disk.
+    """
+
+    def __init__(self, users_dir='./users', refresh_interval=None):
+        """
+        Initializes the index and builds it from the users directory.
+
+        Args:
+            users_dir (str): Directory containing the per-project key files.
+            refresh_interval (float, optional): Seconds between rescans of the directory.
+                Defaults to the API_KEY_CACHE_INTERVAL environment variable, or 2 seconds.
+        """
+        if refresh_interval is None:
+            refresh_interval = float(os.getenv('API_KEY_CACHE_INTERVAL', 2))
+        self.users_dir = users_dir
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._files = {}
+        self._index = {}
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        # Separate from _lock, which is held for whole rescans that lookups must not wait for
+        self._counters_lock = threading.Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """
+        Rescans the users directory and re-indexes added, changed or removed key files.
+
+        Only one thread rescans at a time; concurrent callers keep using the current index.
+
+        Args:
+            force (bool): Rescan even if the refresh interval has not elapsed yet.
+        """
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            signatures = {}
+            try:
+                with os.scandir(self.users_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.name.endswith('.json'):
+                            signatures[entry.name[:-len('.json')]] = stat_signature(entry.path)
+            except FileNotFoundError:
+                logging.error(f"Users directory not found: {self.users_dir}")
+
+            files = dict(self._files)
+            changed = False
+            for project_name in set(files) - set(signatures):
+                del files[project_name]
+                changed = True
+                logging.info(f"API keys removed for project: {project_name}")
+
+            for project_name, signature in signatures.items():
+                cached = files.get(project_name)
+                if cached is not None and cached['signature'] == signature:
+                    continue
+                files[project_name] = self._load_project(project_name, signature)
+                changed = True
+
+            if changed:
+                # Lookups are lock free: build the new index aside and swap it in with one assignment,
+                # so a reload never briefly drops valid keys
+                self._index = self._build_index(files)
+                self._files = files
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _load_project(self, project_name, signature):
+        """
+        Loads the key file of a project.
+
+        Args:
+            project_name (str): The name of the project.
+            signature (tuple): The stat signature the file was read at.
+
+        Returns:
+            dict: The file's signature and a mapping of key digest to user record.
+        """
+        api_keys = load_api_keys(os.path.join(self.users_dir, f"{project_name}.json"))
+        with self._counters_lock:
+            self.reloads += 1
+        digests = {_hash_api_key(api_key): user for api_key, user in api_keys.items()}
+        return {'signature': signature, 'digests': digests}
+
+    @staticmethod
+    def _build_index(files):
+        """
+        Builds the key index from the loaded key files.
+
+        Args:
+            files (dict): Mapping of project name to its loaded key file.
+
+        Returns:
+            dict: Mapping of key digest to {'projects', 'user', 'user_id'}.
+        """
+        index = {}
+        for project_name, loaded in files.items():
+            for digest, user in loaded['digests'].items():
+                current = index.get(digest)
+                if current is not None:
+                    current['projects'] = current['projects'] | {project_name}
+                else:
+                    index[digest] = {
+                        'projects': frozenset([project_name]),
+                        'user': user,
+                        'user_id': _user_id(user, digest),
+                    }
+        return index
+
+    def lookup(self, api_key):
+        """
+        Looks up an API key in the index.
+
+        Args:
+            api_key (str): The raw API key.
+
+        Returns:
+            dict or None: {'projects': frozenset, 'user': dict, 'user_id': str} for a known key,
+                None otherwise.
+        """
+        if not api_key:
+            return None
+        self.refresh()
+        digest = _hash_api_key(api_key)
+        entry = self._index.get(digest)
+        with self._counters_lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def authorize(self, api_key, project_name):
+        """
+        Checks whether an API key may access a project.
+
+        Args:
+            api_key (str): The raw API key.
+            project_name (str): The name of the project.
+
+        Returns:
+            dict or None: The user record of the key if access is allowed, None otherwise.
+        """
+        entry = self.lookup(api_key)
+        if entry is None or project_name not in entry['projects']:
+            return None
+        return entry['user']
+
+    def projects_for_key(self, api_key):
+        """
+        Returns every project an API key can reach.
+
+        Args:
+            api_key (str): The raw API key.
+
+        Returns:
+            frozenset: The project names, empty for an unknown key.
+        """
+        entry = self.lookup(api_key)
+        return entry['projects'] if entry else frozenset()
+
+    def stats(self):
+        """
+        Returns the index counters.
+
+        Returns:
+            dict: Hits, misses, file reloads and the number of indexed keys and projects.
+        """
+        with self._counters_lock:
+            counters = {'hits': self.hits, 'misses': self.misses, 'reloads': self.reloads}
+        return {
+            **counters,
+            'keys': len(self._index),
+            'projects': len(self._files),
+        }
+
+
+def _hash_api_key(api_key):
+    """
+    Hashes an API key for storage in the in-memory index.
+
+    Args:
+        api_key (str): The raw API key.
+
+    Returns:
+        str: The hex SHA-256 digest of the key.
+    """
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _user_id(user, digest):
+    """
+    Derives a stable user id for a key's user record.
+
+    Args:
+        user (dict): The user record from the key file.
+        digest (str): The hex digest of the API key.
+
+    Returns:
+        str: The record's `id` or `email`, or a prefix of the key digest if it has neither.
+    """
+    if isinstance(user, dict) and (user.get('id') or user.get('email')):
+        return str(user.get('id') or user.get('email'))
+    return digest[:16]
+
+
+class SessionTokenSigner:
+    """
+    Issues and verifies short-lived session tokens signed with HMAC-SHA256.
+
+    A token has the form `<key id>.<payload>.<signature>` where the payload is base64url encoded
+    compact JSON carrying the project (`p`), the user id (`u`) and the expiry time (`exp`).
+    Verifying a token is pure CPU work and never touches the users directory.
+
+    Secrets are configured through SESSION_TOKEN_SECRETS as a comma separated list of
+    `<key id>:<secret>` pairs. The first pair signs new tokens; the others are still accepted,
+    which allows secrets to be rotated without invalidating tokens that are already issued.
+
+    Attributes:
+        ttl (int): Lifetime of issued tokens in seconds.
+        enabled (bool): Whether a signing secret is configured. Without one no tokens are issued.
+    """
+
+    def __init__(self, signing_keys=None, ttl=None):
+        """
+        Initializes the signer.
+
+        Args:
+            signing_keys (list of tuple, optional): (key id, secret) pairs, the first one signs.
+                Defaults to SESSION_TOKEN_SECRETS. Without any, session tokens are disabled.
+            ttl (int, optional): Token lifetime in seconds. Defaults to SESSION_TOKEN_TTL, or 900.
+        """
+        if signing_keys is None:
+            signing_keys = self._parse_signing_keys(os.getenv('SESSION_TOKEN_SECRETS', ''))
+        placeholders = [kid for kid, secret in signing_keys if secret == placeholder_secret]
+        signing_keys = [(kid, secret) for kid, secret in signing_keys if secret != placeholder_secret]
+        if not signing_keys:
+            # A per-process secret would make tokens fail on other workers and after every restart
+            logging.warning("SESSION_TOKEN_SECRETS has no secret configured, session tokens are disabled.")
+        elif placeholders:
+            logging.error(f"SESSION_TOKEN_SECRETS still has the placeholder secret for {', '.join(placeholders)}, ignoring it.")
+        if ttl is None:
+            ttl = int(os.getenv('SESSION_TOKEN_TTL', 900))
+        self.ttl = ttl
+        self._signing_kid = None
+        self._secrets = {}
+        for kid, secret in reversed(signing_keys):
+            self.rotate(kid, secret)
+
+    @property
+    def enabled(self):
+        return self._signing_kid is not None
+
+    @staticmethod
+    def _parse_signing_keys(value):
+        """
+        Parses a `<key id>:<secret>,...` list.
+
+        Args:
+            value (str): The raw configuration value.
+
+        Returns:
+            list of tuple: (key id, secret) pairs in configured order.
+        """
+        signing_keys = []
+        for item in value.split(','):
+            kid, _, secret = item.strip().partition(':')
+            if kid and secret:
+                signing_keys.append((kid, secret))
+        return signing_keys
+
+    def rotate(self, kid, secret, retire=None):
+        """
+        Makes a new secret the signing secret, keeping the previous ones valid for verification.
+
+        Args:
+            kid (str): The id of the new secret. Must not contain a '.'.
+            secret (str): The secret itself.
+            retire (list of str, optional): Key ids that should no longer be accepted.
+        """
+        if '.' in kid:
+            raise ValueError("Session token key ids cannot contain '.'")
+        secrets_by_kid = dict(self._secrets)
+        secrets_by_kid[kid] = secret.encode('utf-8')
+        for retired_kid in retire or []:
+            if retired_kid != kid:
+                secrets_by_kid.pop(retired_kid, None)
+        self._secrets = secrets_by_kid
+        self._signing_kid = kid
+
+    def issue(self, project_name, user_id):
+        """
+        Issues a token for a project and user.
+
+        Args:
+            project_name (str): The project the token grants access to.
+            user_id (str): The id of the user the token was issued to.
+
+        Returns:
+            dict: The token, its type and its expiry.
+
+        Raises:
+            RuntimeError: If no signing secret is configured.
+        """
+        if not self.enabled:
+            raise RuntimeError("Session tokens are disabled, SESSION_TOKEN_SECRETS is not set")
+        expires_at = int(time.time()) + self.ttl
+        payload = json.dumps({'p': project_name, 'u': user_id, 'exp': expires_at}, separators=(',', ':'))
+        signed_part = f"{self._signing_kid}.{_b64encode(payload.encode('utf-8'))}"
+        token = f"{signed_part}.{self._sign(self._signing_kid, signed_part)}"
+        return {'token': token, 'token_type': 'Bearer', 'expires_in': self.ttl, 'expires_at': expires_at}
+
+    def verify(self, token):
+        """
+        Verifies a token's signature and expiry.
+
+        Args:
+            token (str): The token to verify.
+
+        Returns:
+            dict or None: The token claims ({'p', 'u', 'exp'}) if the token is valid, None otherwise.
+        """
+        try:
+            kid, payload, signature = token.split('.')
+        except ValueError:
+            return None
+        if kid not in self._secrets:
+            return None
+        if not hmac.compare_digest(self._sign(kid, f"{kid}.{payload}"), signature):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+            return None
+        return claims
+
+    def _sign(self, kid, signed_part):
+        """
+        Computes the signature of a token.
+
+        Args:
+            kid (str): The id of the secret to sign with.
+            signed_part (str): The `<key id>.<payload>` part of the token.
+
+        Returns:
+            str: The base64url encoded HMAC-SHA256 signature.
+        """
+        digest = hmac.new(self._secrets[kid], signed_part.encode('utf-8'), hashlib.sha256).digest()
+        return _b64encode(digest)
+
+
+def _b64encode(data):
+    """
+    Encodes bytes as unpadded base64url.
+    """
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    """
+    Decodes unpadded base64url into bytes.
+    """
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def load_api_keys(api_keys_file):
+    """
+    Load API keys from a specified JSON file.
+
+    Args:
+        api_keys_file (str): The path to the JSON file containing API keys.
+
+    Returns:
+        dict: Mapping of API key to user record, empty if the file cannot be read.
+    """
+    try:
+        with open(api_keys_file, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        logging.error(f"API keys file not found: {api_keys_file}")
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding API keys file {api_keys_file}: {e}")
+    return {}
+
+
 class APIAuthenticator:
-    def __init__(self):
+    def __init__(self, key_index=None, token_signer=None):
         """
-        Initializes the APIAuthenticator. API keys will be loaded dynamically per request.
+        Initializes the APIAuthenticator. API keys are served from an index of the users directory
+        that picks up changes to the key files without a restart.
+
+        Args:
+            key_index (APIKeyIndex, optional): The key index to use. A new one is built if omitted.
+            token_signer (SessionTokenSigner, optional): Signer for session tokens. A new one is
+                created from the environment if omitted.
         """
-        self.api_keys = {}
+        self.key_index = key_index or APIKeyIndex()
+        self.token_signer = token_signer or SessionTokenSigner()
+
+    def issue_session_token(self, api_key, project_name):
+        """
+        Exchanges an API key for a session token scoped to one project.
+
+        Args:
+            api_key (str): The raw API key.
+            project_name (str): The project the token should grant access to.
+
+        Returns:
+            dict or None: The issued token, or None if the key may not access the project.
+        """
+        entry = self.key_index.lookup(api_key)
+        if entry is None or project_name not in entry['projects']:
+            return None
+        return self.token_signer.issue(project_name, entry['user_id'])
 
     def load_api_keys(self, api_keys_file):
         """
@@ -17,18 +459,20 @@ class APIAuthenticator:
 
         Args:
             api_keys_file (str): The path to the JSON file containing API keys.
+
+        Returns:
+            dict: Mapping of API key to user record.
         """
-        try:
-            with open(api_keys_file, 'r') as file:
-                self.api_keys = json.load(file)
-        except FileNotFoundError:
-            logging.error(f"API keys file not found: {api_keys_file}")
-            self.api_keys = {}
+        return load_api_keys(api_keys_file)
 
     def require_api_key(self, view_function):
         """
         Decorator function to secure routes with API key authentication.
 
+        Requests may authenticate with an `X-API-Key` header or with an `Authorization: Bearer`
+        session token issued for the project. A request sending both is let through by a valid API key
+        when its token is expired or invalid. The authenticated user id is stored in `g.auth_user`.
+
         Args:
             view_function (function): The Flask view function to decorate.
 
@@ -39,15 +483,23 @@ class APIAuthenticator:
         def decorated_function(*args, **kwargs):
             # Extract project name from URL path parameter
             project_name = kwargs.get('project_name')
-            if project_name:
-                api_keys_file = f"./users/{project_name}.json"
-                self.load_api_keys(api_keys_file)
-            else:
+            if not project_name:
                 logging.error("Project name not provided in the URL.")
                 return jsonify({"error": "Project name required"}), 400
 
-            api_key = request.headers.get('X-API-Key')
-            if api_key and api_key in self.api_keys:
+            authorization = request.headers.get('Authorization', '')
+            if authorization.startswith('Bearer '):
+                claims = self.token_signer.verify(authorization[len('Bearer '):].strip())
+                if claims and claims.get('p') == project_name:
+                    g.auth_user = claims.get('u')
+                    return view_function(*args, **kwargs)
+                if 'X-API-Key' not in request.headers:
+                    logging.warning("Unauthorized access attempt with an invalid session token.")
+                    return jsonify({"error": "Unauthorized"}), 401
+
+            entry = self.key_index.lookup(request.headers.get('X-API-Key'))
+            if entry is not None and project_name in entry['projects']:
+                g.auth_user = entry['user_id']
                 return view_function(*args, **kwargs)
             else:
                 logging.warning("Unauthorized access attempt.")
@@ -7,9 +7,13 @@ ensuring maintainability and scalability.
 """
 
 from flask import Flask
-from cors_module import init_cors  
 from dotenv import load_dotenv
 import os
+
+# Load environment variables from .env file before the modules below read their configuration
+load_dotenv()
+
+from cors_module import init_cors  
 from error_handler import init_error_handlers 
 from log_middleware import configure_logging, init_log_middleware
 from api_authenticator import api_auth_instance 
@@ -17,9 +21,8 @@ from task_routes import task_blueprint
 from notes_routes import notes_blueprint 
 from prompt_routes import prompt_blueprint  
 from disk_routes import disk_blueprint
+from auth_routes import auth_blueprint
 
-# Load environment variables from .env file
-load_dotenv()
 configure_logging()
 
 # Initialize Flask app
@@ -34,11 +37,12 @@ init_error_handlers(app)
 # Initialize logging middleware
 init_log_middleware(app)
 
-# Register blueprints for tasks, notes, and prompts
+# Register blueprints for tasks, notes, prompts, disk files and session tokens
 app.register_blueprint(task_blueprint, url_prefix='/tasks')
 app.register_blueprint(notes_blueprint, url_prefix='/notes')
 app.register_blueprint(prompt_blueprint, url_prefix='/prompts')
 app.register_blueprint(disk_blueprint, url_prefix='/disk')
+app.register_blueprint(auth_blueprint, url_prefix='/auth')
 
 if __name__ == '__main__':
     # Fetch configuration from environment variables
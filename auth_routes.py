@@ -0,0 +1,45 @@
+# ./auth_routes.py
+"""
+Auth Routes Module
+------------------
+Defines the Flask routes for exchanging an API key for a short-lived session token. High-volume
+clients (the Chrome extension and automation agents) send the token as `Authorization: Bearer <token>`
+on subsequent requests, which is verified without reading any key file.
+
+Functions:
+- issue_token: Exchanges the `X-API-Key` header for a signed session token for a project.
+
+Dependencies:
+- api_auth_instance: Shared APIAuthenticator holding the key index and token signer.
+"""
+
+from flask import Blueprint, request, jsonify
+from api_authenticator import api_auth_instance
+import logging
+
+# Initialize Blueprint for auth routes
+auth_blueprint = Blueprint('auth_routes', __name__)
+
+@auth_blueprint.route('/<project_name>/token', methods=['POST'])
+def issue_token(project_name):
+    """
+    Issues a session token for the specified project in exchange for a valid API key.
+
+    Args:
+        project_name (str): The project the token grants access to.
+
+    Returns:
+        A JSON response with the token and its expiry, or an error message. Answers 503 if session
+        tokens are disabled because SESSION_TOKEN_SECRETS is not configured.
+    """
+    if not api_auth_instance.token_signer.enabled:
+        logging.error("Session token requested but SESSION_TOKEN_SECRETS is not configured.")
+        return jsonify({"error": "Session tokens are not configured"}), 503
+
+    token = api_auth_instance.issue_session_token(request.headers.get('X-API-Key'), project_name)
+    if token is None:
+        logging.warning(f"Unauthorized session token request for project '{project_name}'.")
+        return jsonify({"error": "Unauthorized"}), 401
+
+    logging.info(f"Session token issued for project '{project_name}'.")
+    return jsonify(token), 200
@@ -0,0 +1,580 @@
+# ./backup_store.py
+"""
+BackupStore Module
+------------------
+Keeps the version history of task documents in a content-addressed store instead of full
+timestamped copies. Every version is serialized canonically and stored once under the SHA-256 of
+its content, gzip-compressed, so repeated snapshots of an unchanged document cost nothing. Versions
+can optionally be stored as JSON deltas against the previous version of the same project, with a
+full copy every few versions to bound the cost of restoring.
+
+Layout under the store directory:
+- objects/<sha[:2]>/<sha>.json.gz: {"full": document} or {"base": sha, "delta": delta}.
+- timeline/<project>.jsonl: one {"time": epoch seconds, "sha": sha, "changed": [task numbers]} line
+  per stored version.
+- timeline/<project>.imported: names of the legacy full-copy backups already imported.
+
+Each project's timeline is read once and then kept in memory as a sorted index, updated as versions
+are recorded, so finding the version current at a point in time is a binary search. Legacy
+`datetime_<project>_<timestamp>.json` backups found next to the store are imported into the timelines
+by a background thread when the store is created.
+
+A retention policy thins each timeline (keep the most recent versions, then one per hour, then one
+per day) and a background pruner applies it periodically and deletes objects no longer referenced.
+
+Classes:
+- BackupStore: Snapshots, restores and prunes document versions.
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from file_handler import atomic_write_bytes
+
+_DELETED = '-'
+_CHANGED = '~'
+_SET = '='
+_ORDER = '#'
+
+
+def _diff(old, new):
+    """
+    Computes a delta that turns one JSON object into another.
+
+    Args:
+        old (dict): The previous version.
+        new (dict): The next version.
+
+    Returns:
+        dict: The delta; nested objects that changed are diffed recursively.
+    """
+    delta = {}
+    deleted = [key for key in old if key not in new]
+    if deleted:
+        delta[_DELETED] = deleted
+    for key, value in new.items():
+        if key in old:
+            previous = old[key]
+            if previous is value or previous == value:
+                continue
+            if isinstance(previous, dict) and isinstance(value, dict):
+                delta.setdefault(_CHANGED, {})[key] = _diff(previous, value)
+                continue
+        delta.setdefault(_SET, {})[key] = value
+    # New keys are appended when the delta is applied; record the order if that is not enough
+    merged = [key for key in old if key in new] + [key for key in new if key not in old]
+    if merged != list(new):
+        delta[_ORDER] = list(new)
+    return delta
+
+
+def _patch(old, delta):
+    """
+    Applies a delta computed by _diff.
+
+    Args:
+        old (dict): The previous version, left unmodified.
+        delta (dict): The delta.
+
+    Returns:
+        dict: The next version.
+    """
+    deleted = set(delta.get(_DELETED, ()))
+    new = {key: value for key, value in old.items() if key not in deleted}
+    for key, child_delta in delta.get(_CHANGED, {}).items():
+        new[key] = _patch(new[key], child_delta)
+    new.update(delta.get(_SET, {}))
+    if _ORDER in delta:
+        new = {key: new[key] for key in delta[_ORDER]}
+    return new
+
+
+def _changed_tasks(old, new):
+    """
+    Lists the task and subtask numbers that differ between two versions of a task document.
+
+    Args:
+        old (dict or None): The previous version, None for the first version.
+        new (dict): The next version.
+
+    Returns:
+        list or None: The changed task numbers, or None if there is no previous version.
+    """
+    if old is None:
+        return None
+    old_tasks = old.get('tasks', {}) if isinstance(old, dict) else {}
+    new_tasks = new.get('tasks', {}) if isinstance(new, dict) else {}
+    changed = []
+    for task_key in list(old_tasks) + [key for key in new_tasks if key not in old_tasks]:
+        old_task, new_task = old_tasks.get(task_key), new_tasks.get(task_key)
+        if old_task == new_task:
+            continue
+        if not isinstance(old_task, dict) or not isinstance(new_task, dict):
+            changed.append(task_key)
+            continue
+        if any(old_task.get(field) != new_task.get(field) for field in ('status', 'description', 'task')):
+            changed.append(task_key)
+        for subtask_key in list(old_task) + [key for key in new_task if key not in old_task]:
+            if '.' in subtask_key and old_task.get(subtask_key) != new_task.get(subtask_key):
+                changed.append(subtask_key)
+    return changed
+
+
+class _Timeline:
+    """
+    In-memory index of a project's timeline: the entries and their times, both sorted by time.
+    """
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry['time'])
+        self.times = [entry['time'] for entry in self.entries]
+
+    def append(self, entry):
+        self.entries.append(entry)
+        self.times.append(entry['time'])
+
+    def at(self, when):
+        """
+        Returns the entry of the version current at a point in time, or None if there was none yet.
+        """
+        position = bisect.bisect_right(self.times, when)
+        return self.entries[position - 1] if position else None
+
+
+def _serialize(document):
+    """
+    Returns the canonical serialization of a document, the one its content address is computed from.
+    """
+    return json.dumps(document, indent=4).encode('utf-8')
+
+
+class BackupStore:
+    """
+    Content-addressed, deduplicated store of task document versions.
+
+    Attributes:
+        root (str): The directory of the store.
+        deltas (bool): Whether versions are stored as deltas against the previous version.
+        full_every (int): Maximum number of consecutive deltas before a full copy is stored.
+        keep_recent (int): Number of most recent versions always kept per project.
+        hourly_hours (int): Age in hours up to which one version per hour is kept.
+        daily_days (int): Age in days up to which one version per day is kept.
+        prune_interval (float): Seconds between background prunes; 0 disables the pruner.
+        legacy_dir (str): Directory of legacy full-copy backups to import, or None.
+    """
+
+    def __init__(self, root, deltas=None, full_every=None, keep_recent=None, hourly_hours=None,
+                 daily_days=None, prune_interval=None, legacy_dir=None):
+        """
+        Initializes the store, creating its directories if needed. Unspecified settings are read
+        from the TASK_BACKUP_* environment variables.
+
+        Args:
+            root (str): The directory of the store.
+            deltas (bool, optional): Store versions as deltas. Defaults to TASK_BACKUP_DELTAS, or False.
+            full_every (int, optional): Store a full copy after this many deltas. Defaults to
+                TASK_BACKUP_FULL_EVERY, or 20.
+            keep_recent (int, optional): Defaults to TASK_BACKUP_KEEP_RECENT, or 50.
+            hourly_hours (int, optional): Defaults to TASK_BACKUP_HOURLY_HOURS, or 48.
+            daily_days (int, optional): Defaults to TASK_BACKUP_DAILY_DAYS, or 30.
+            prune_interval (float, optional): Defaults to TASK_BACKUP_PRUNE_INTERVAL, or 3600.
+            legacy_dir (str, optional): Directory of legacy `datetime_<project>_<timestamp>.json`
+                backups to import into the timelines.
+        """
+        self.root = root
+        self.deltas = (deltas if deltas is not None
+                       else os.getenv('TASK_BACKUP_DELTAS', 'false').lower() == 'true')
+        self.full_every = full_every if full_every is not None else int(os.getenv('TASK_BACKUP_FULL_EVERY', 20))
+        self.keep_recent = keep_recent if keep_recent is not None else int(os.getenv('TASK_BACKUP_KEEP_RECENT', 50))
+        self.hourly_hours = (hourly_hours if hourly_hours is not None
+                             else int(os.getenv('TASK_BACKUP_HOURLY_HOURS', 48)))
+        self.daily_days = daily_days if daily_days is not None else int(os.getenv('TASK_BACKUP_DAILY_DAYS', 30))
+        self.prune_interval = (prune_interval if prune_interval is not None
+                               else float(os.getenv('TASK_BACKUP_PRUNE_INTERVAL', 3600)))
+        self.legacy_dir = legacy_dir
+        self.objects_dir = os.path.join(root, 'objects')
+        self.timeline_dir = os.path.join(root, 'timeline')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.timeline_dir, exist_ok=True)
+        # project -> (sha, document, delta chain length) of the last version snapshotted
+        self._last = {}
+        # project -> _Timeline
+        self._timelines = {}
+        self._lock = threading.Lock()
+        # Versions snapshotted while a prune runs, which it must not delete; None if none runs
+        self._touched = None
+        self._prune_lock = threading.Lock()
+        self._pruner = None
+        if legacy_dir:
+            threading.Thread(target=self.import_legacy, name='backup-import', daemon=True).start()
+
+    def snapshot(self, project_name, document):
+        """
+        Records a version of a project's task document. Content already in the store is not
+        written again, and a version identical to the project's latest one is not added to its
+        timeline.
+
+        Args:
+            project_name (str): The name of the project.
+            document (dict): The parsed task document; it is not modified.
+
+        Returns:
+            str: The content address (SHA-256) of the version.
+        """
+        self._start_pruner()
+        payload = _serialize(document)
+        sha = hashlib.sha256(payload).hexdigest()
+        with self._lock:
+            timeline = self._timeline_for(project_name)
+            last_entry = timeline.entries[-1] if timeline.entries else None
+            last_sha = last_entry['sha'] if last_entry else None
+            last = self._last.get(project_name)
+            if last is not None and last[0] != last_sha:
+                last = None
+
+            if not os.path.exists(self._object_path(sha)):
+                chain = 0
+                if self.deltas and last is not None and last[0] != sha and last[2] + 1 < self.full_every:
+                    stored = {"base": last[0], "delta": _diff(last[1], document)}
+                    chain = last[2] + 1
+                else:
+                    stored = {"full": document}
+                self._write_object(sha, stored)
+            elif last is not None and last[0] == sha:
+                chain = last[2]
+            else:
+                chain = self.full_every
+
+            if sha != last_sha:
+                if last is not None:
+                    previous = last[1]
+                else:
+                    previous = self._load_or_none(last_sha)
+                entry = {
+                    "time": max(time.time(), last_entry['time'] if last_entry else 0),
+                    "sha": sha,
+                    "changed": _changed_tasks(previous, document)
+                }
+                self._append_timeline(project_name, entry)
+                timeline.append(entry)
+                logging.info(f"Backup {sha[:12]} recorded for project {project_name}")
+            self._last[project_name] = (sha, document, chain)
+            if self._touched is not None:
+                # A reused delta needs its bases as well
+                kept = sha
+                while kept is not None and kept not in self._touched:
+                    self._touched.add(kept)
+                    kept = self._base_of(kept)
+        return sha
+
+    def load(self, sha):
+        """
+        Restores a stored version.
+
+        Args:
+            sha (str): The content address of the version.
+
+        Returns:
+            dict: The document.
+
+        Raises:
+            FileNotFoundError: If the version (or a version it is a delta of) is not in the store.
+        """
+        deltas = []
+        while True:
+            with gzip.open(self._object_path(sha), 'rb') as file:
+                stored = json.loads(file.read().decode('utf-8'))
+            if 'full' in stored:
+                document = stored['full']
+                break
+            deltas.append(stored['delta'])
+            sha = stored['base']
+        for delta in reversed(deltas):
+            document = _patch(document, delta)
+        return document
+
+    def timeline(self, project_name):
+        """
+        Returns the stored versions of a project, oldest first.
+
+        Args:
+            project_name (str): The name of the project.
+
+        Returns:
+            list: {"time": epoch seconds, "sha": content address, "changed": task numbers} entries.
+        """
+        with self._lock:
+            return list(self._timeline_for(project_name).entries)
+
+    def version_at(self, project_name, when):
+        """
+        Finds the version of a project's task document that was current at a point in time.
+
+        Args:
+            project_name (str): The name of the project.
+            when (float): The point in time, in epoch seconds.
+
+        Returns:
+            dict or None: The timeline entry of the version, or None if there was no version yet.
+        """
+        with self._lock:
+            return self._timeline_for(project_name).at(when)
+
+    def prune(self, now=None):
+        """
+        Applies the retention policy to every project's timeline and deletes objects that are no
+        longer referenced, directly or as the base of a retained delta.
+
+        The store's lock is only held to thin the timelines and collect the referenced versions,
+        and briefly per deleted object; the walk over the objects runs without it, so snapshots are
+        not held up. Versions snapshotted while a prune runs are never deleted by it.
+
+        Args:
+            now (float, optional): The current time in epoch seconds, for testing.
+
+        Returns:
+            tuple: (timeline entries removed, objects deleted).
+        """
+        now = now if now is not None else time.time()
+        removed = 0
+        with self._prune_lock:
+            with self._lock:
+                self._touched = set()
+                referenced = set()
+                for filename in os.listdir(self.timeline_dir):
+                    if not filename.endswith('.jsonl'):
+                        continue
+                    project_name = filename[:-len('.jsonl')]
+                    entries = self._timeline_for(project_name).entries
+                    retained = self._retain(entries, now)
+                    if len(retained) != len(entries):
+                        removed += len(entries) - len(retained)
+                        self._rewrite_timeline(project_name, retained)
+                    referenced.update(entry['sha'] for entry in retained)
+                for last in self._last.values():
+                    referenced.add(last[0])
+
+            try:
+                # Deltas keep their bases alive; stored objects never change, so no lock is needed
+                pending = list(referenced)
+                while pending:
+                    base = self._base_of(pending.pop())
+                    if base is not None and base not in referenced:
+                        referenced.add(base)
+                        pending.append(base)
+
+                deleted = 0
+                for directory, _, filenames in os.walk(self.objects_dir):
+                    for filename in filenames:
+                        sha = filename[:-len('.json.gz')]
+                        if not filename.endswith('.json.gz') or sha in referenced:
+                            continue
+                        with self._lock:
+                            if sha in self._touched:
+                                continue
+                            os.unlink(os.path.join(directory, filename))
+                        deleted += 1
+            finally:
+                with self._lock:
+                    self._touched = None
+        if removed or deleted:
+            logging.info(f"Backup store pruned {removed} versions and {deleted} objects")
+        return removed, deleted
+
+    def _retain(self, entries, now):
+        """
+        Selects the timeline entries kept by the retention policy: the `keep_recent` most recent,
+        then the newest per hour up to `hourly_hours` old, then the newest per day up to `daily_days` old.
+        """
+        kept = entries[-self.keep_recent:] if self.keep_recent > 0 else entries[-1:]
+        buckets = set()
+        older = []
+        for entry in reversed(entries[:len(entries) - len(kept)]):
+            age = now - entry['time']
+            if age <= self.hourly_hours * 3600:
+                bucket = ('hour', int(entry['time'] // 3600))
+            elif age <= self.daily_days * 86400:
+                bucket = ('day', int(entry['time'] // 86400))
+            else:
+                continue
+            if bucket not in buckets:
+                buckets.add(bucket)
+                older.append(entry)
+        return older[::-1] + kept
+
+    def _timeline_for(self, project_name):
+        """
+        Returns the in-memory timeline of a project, reading it on first use. Must be called with
+        the lock held.
+        """
+        timeline = self._timelines.get(project_name)
+        if timeline is None:
+            timeline = self._timelines[project_name] = _Timeline(self._read_timeline(project_name))
+        return timeline
+
+    def import_legacy(self):
+        """
+        Imports the legacy full-copy backups that have not been imported yet, using the timestamps
+        in their filenames as the version times. Backups are read and stored one file at a time
+        without holding the store's lock, which is only taken to merge each project's imported
+        versions into its timeline. Runs on a background thread when the store is created.
+
+        Returns:
+            int: The number of backups imported.
+        """
+        legacy = {}
+        filenames = os.listdir(self.legacy_dir) if self.legacy_dir and os.path.isdir(self.legacy_dir) else []
+        for filename in filenames:
+            if not filename.startswith('datetime_') or not filename.endswith('.json'):
+                continue
+            project_name, _, stamp = filename[len('datetime_'):-len('.json')].rpartition('_')
+            try:
+                when = datetime.strptime(stamp, '%Y%m%d%H%M%S').timestamp()
+            except ValueError:
+                logging.warning(f"Skipping legacy backup {filename}: no timestamp in its name")
+                continue
+            legacy.setdefault(project_name, []).append((when, filename))
+
+        total = 0
+        for project_name, backups in legacy.items():
+            try:
+                total += self._import_project(project_name, sorted(backups))
+            except OSError as e:
+                logging.error(f"Error importing the legacy backups of project {project_name}: {e}")
+        return total
+
+    def _import_project(self, project_name, backups):
+        """
+        Imports the legacy backups of one project, given as (time, filename) pairs sorted by time.
+        """
+        imported_path = os.path.join(self.timeline_dir, project_name + '.imported')
+        try:
+            with open(imported_path, 'r', encoding='utf-8') as file:
+                imported = set(json.load(file))
+        except FileNotFoundError:
+            imported = set()
+
+        entries = []
+        previous = None
+        for when, filename in backups:
+            if filename in imported:
+                continue
+            try:
+                with open(os.path.join(self.legacy_dir, filename), 'r', encoding='utf-8') as file:
+                    document = json.load(file)
+            except (ValueError, OSError) as e:
+                logging.warning(f"Skipping legacy backup {filename}: {e}")
+                continue
+            sha = hashlib.sha256(_serialize(document)).hexdigest()
+            if not os.path.exists(self._object_path(sha)):
+                self._write_object(sha, {"full": document})
+            entries.append(({"time": when, "sha": sha, "changed": _changed_tasks(previous, document)}, filename))
+            previous = document
+        if not entries:
+            return 0
+
+        with self._lock:
+            # A prune that ran meanwhile may have deleted objects no timeline referenced yet; those
+            # backups are imported again next time
+            entries = [(entry, filename) for entry, filename in entries
+                       if os.path.exists(self._object_path(entry['sha']))]
+            if self._touched is not None:
+                self._touched.update(entry['sha'] for entry, _ in entries)
+            timeline = self._timeline_for(project_name)
+            merged = _Timeline(timeline.entries + [entry for entry, _ in entries])
+            self._rewrite_timeline(project_name, merged.entries)
+            imported.update(filename for _, filename in entries)
+            atomic_write_bytes(imported_path, json.dumps(sorted(imported)).encode('utf-8'))
+        logging.info(f"Imported {len(entries)} legacy backups of project {project_name}")
+        return len(entries)
+
+    def _rewrite_timeline(self, project_name, entries):
+        """
+        Replaces a project's timeline file and in-memory index. Must be called with the lock held.
+        """
+        payload = ''.join(json.dumps(entry) + '\n' for entry in entries)
+        atomic_write_bytes(self._timeline_path(project_name), payload.encode('utf-8'))
+        self._timelines[project_name] = _Timeline(entries)
+
+    def _load_or_none(self, sha):
+        """
+        Restores a stored version, or returns None if there is none or it cannot be read.
+        """
+        if sha is None:
+            return None
+        try:
+            return self.load(sha)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not restore backup {sha[:12]}: {e}")
+            return None
+
+    def _base_of(self, sha):
+        """
+        Returns the base version of a stored delta, or None for full copies and missing objects.
+        """
+        try:
+            with gzip.open(self._object_path(sha), 'rb') as file:
+                return json.loads(file.read().decode('utf-8')).get('base')
+        except FileNotFoundError:
+            return None
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha + '.json.gz')
+
+    def _timeline_path(self, project_name):
+        return os.path.join(self.timeline_dir, project_name + '.jsonl')
+
+    def _write_object(self, sha, stored):
+        path = self._object_path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write_bytes(path, gzip.compress(json.dumps(stored).encode('utf-8')))
+
+    def _read_timeline(self, project_name):
+        try:
+            with open(self._timeline_path(project_name), 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A partially written last line from a crash
+                logging.warning(f"Skipping unreadable timeline entry of project {project_name}")
+        return entries
+
+    def _append_timeline(self, project_name, entry):
+        with open(self._timeline_path(project_name), 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _start_pruner(self):
+        """
+        Starts the background prune thread, once per store.
+        """
+        if self._pruner is not None or self.prune_interval <= 0:
+            return
+        with self._lock:
+            if self._pruner is not None:
+                return
+            self._pruner = threading.Thread(target=self._prune_periodically, name='backup-pruner', daemon=True)
+            self._pruner.start()
+
+    def _prune_periodically(self):
+        """
+        Body of the background prune thread.
+        """
+        while True:
+            time.sleep(self.prune_interval)
+            try:
+                self.prune()
+            except Exception as e:
+                logging.error(f"Error pruning the backup store: {e}")
@@ -0,0 +1,250 @@
+# ./change_feed.py
+"""
+ChangeFeed Module
+-----------------
+Publishes task and note changes to subscribers so clients can follow a project instead of polling
+it. Each channel (e.g. ('tasks', project)) keeps the most recent events in a ring buffer, numbered
+with a per-channel sequence number. Clients resume from the last sequence number they saw; if that
+event has already left the buffer, or the server restarted since (the feed's epoch changed), they
+get a 'reset' event telling them to re-fetch the full document.
+
+Events are served as Server-Sent Events or, for clients that cannot use SSE, by long polling.
+Subscribers wait on a per-channel condition variable and hold no other resources while idle. Under
+a gevent worker (`gunicorn -k gevent app:app`) the waits are greenlets rather than threads, so one
+worker can hold hundreds of idle subscribers. The feed is per process: run the API in a single
+worker process, or subscribers only see changes made through their own worker. Channels nothing was
+published to are dropped when their last subscriber leaves.
+
+Classes:
+- ChangeFeed: Per-channel ring buffers of change events with blocking reads.
+
+Functions:
+- parse_event_id: Parses a client's resume position.
+- sse_stream: Generates a Server-Sent Events stream of a channel.
+- changes_response: Answers a `/changes` request with an SSE stream or a long poll.
+
+Instances:
+- change_feed: The process-wide feed shared by all blueprints.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from flask import Response, request, jsonify
+
+# Seconds between SSE keep-alive comments, and the maximum wait of a long poll
+heartbeat_interval = float(os.getenv('CHANGE_FEED_HEARTBEAT', 15))
+max_poll_timeout = float(os.getenv('CHANGE_FEED_POLL_TIMEOUT', 30))
+
+
+class _Channel:
+    """
+    The ring buffer and condition variable of one channel.
+    """
+
+    def __init__(self, capacity):
+        self.events = deque(maxlen=capacity)
+        self.seq = 0
+        self.condition = threading.Condition()
+        # Subscribers currently reading the channel
+        self.readers = 0
+
+
+class ChangeFeed:
+    """
+    Per-channel ring buffers of change events.
+
+    Attributes:
+        epoch (str): Identifies this feed instance; sequence numbers of another epoch are stale.
+        capacity (int): Number of events kept per channel.
+    """
+
+    def __init__(self, capacity=None):
+        """
+        Initializes an empty feed.
+
+        Args:
+            capacity (int, optional): Events kept per channel. Defaults to CHANGE_FEED_CAPACITY, or 1000.
+        """
+        self.epoch = uuid.uuid4().hex[:8]
+        self.capacity = capacity or int(os.getenv('CHANGE_FEED_CAPACITY', 1000))
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event_type, data):
+        """
+        Appends an event to a channel and wakes its subscribers.
+
+        Args:
+            channel (tuple): The channel, e.g. ('tasks', project_name).
+            event_type (str): The type of the event, e.g. 'task_updated'.
+            data (dict): The JSON-serializable payload of the event.
+
+        Returns:
+            int: The sequence number of the event.
+        """
+        # Held so the channel cannot be dropped as unused before the event is in it
+        with self._lock:
+            state = self._channels.get(channel)
+            if state is None:
+                state = self._channels[channel] = _Channel(self.capacity)
+            with state.condition:
+                state.seq += 1
+                state.events.append({"seq": state.seq, "type": event_type, "time": time.time(), "data": data})
+                state.condition.notify_all()
+                return state.seq
+
+    def read(self, channel, since, timeout):
+        """
+        Returns the events of a channel after a sequence number, waiting up to `timeout` seconds for
+        one to be published if there are none yet.
+
+        Args:
+            channel (tuple): The channel.
+            since (int or None): The last sequence number the client saw, None to start from now.
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            tuple: (events, seq, reset). `events` are the new events, `seq` the sequence number to
+                resume from, and `reset` is True if events after `since` were lost and the client
+                must re-fetch the full document.
+        """
+        state = self._subscribe(channel)
+        try:
+            with state.condition:
+                if since is None or since > state.seq:
+                    # New subscriber, or a sequence number from a different epoch that slipped through
+                    reset = since is not None
+                    since = state.seq
+                    if reset:
+                        return [], since, True
+                if state.seq == since:
+                    state.condition.wait(timeout)
+                if state.events and state.events[0]['seq'] > since + 1:
+                    return [], state.seq, True
+                events = [event for event in state.events if event['seq'] > since]
+                return events, state.seq, False
+        finally:
+            self._unsubscribe(channel, state)
+
+    def _subscribe(self, channel):
+        """
+        Returns the state of a channel for a reader, creating it if needed.
+        """
+        with self._lock:
+            state = self._channels.get(channel)
+            if state is None:
+                state = self._channels[channel] = _Channel(self.capacity)
+            state.readers += 1
+            return state
+
+    def _unsubscribe(self, channel, state):
+        """
+        Releases a reader's channel, dropping the channel if nothing was ever published to it and
+        no one reads it, so subscriptions to made-up channels leave nothing behind.
+        """
+        with self._lock:
+            state.readers -= 1
+            if state.readers == 0 and state.seq == 0 and self._channels.get(channel) is state:
+                del self._channels[channel]
+
+
+def parse_event_id(value, epoch):
+    """
+    Parses a client's resume position, as sent in `Last-Event-ID` or the `since` query parameter.
+
+    Args:
+        value (str or None): '<epoch>-<seq>', or a bare sequence number of the current epoch.
+        epoch (str): The feed's current epoch.
+
+    Returns:
+        tuple: (since, stale). `since` is the sequence number or None to start from now, `stale` is
+            True if the position belongs to another epoch or cannot be parsed.
+    """
+    if not value:
+        return None, False
+    value_epoch, _, seq = value.rpartition('-')
+    if value_epoch and value_epoch != epoch:
+        return None, True
+    try:
+        return int(seq), False
+    except ValueError:
+        return None, True
+
+
+def sse_stream(feed, channel, since, stale, heartbeat):
+    """
+    Generates a Server-Sent Events stream of a channel until the client disconnects.
+
+    Args:
+        feed (ChangeFeed): The feed.
+        channel (tuple): The channel.
+        since (int or None): The sequence number to resume after, None to start from now.
+        stale (bool): Whether the client's resume position was unusable, which sends a reset first.
+        heartbeat (float): Seconds between keep-alive comments while idle.
+
+    Yields:
+        str: SSE messages.
+    """
+    # Ask clients to reconnect after 3 seconds if the connection drops
+    yield "retry: 3000\n\n"
+    if stale:
+        since = feed.read(channel, None, 0)[1]
+        yield _sse_message(feed.epoch, since, 'reset', {})
+    while True:
+        events, seq, reset = feed.read(channel, since, heartbeat)
+        if reset:
+            yield _sse_message(feed.epoch, seq, 'reset', {})
+        elif not events:
+            yield ": heartbeat\n\n"
+        for event in events:
+            yield _sse_message(feed.epoch, event['seq'], event['type'], event['data'])
+        since = seq
+
+
+def changes_response(feed, channel):
+    """
+    Answers a request for a channel's changes. By default the response is a Server-Sent Events
+    stream; with `mode=poll` it is a long poll returning the events after `since` as JSON as soon
+    as there are any, or an empty list after `timeout` seconds.
+
+    Query Parameters:
+        mode (str, optional): 'sse' (default) or 'poll'.
+        since (str, optional): The last event ID seen; SSE clients may send Last-Event-ID instead.
+        timeout (float, optional): Long poll wait in seconds, capped by CHANGE_FEED_POLL_TIMEOUT.
+
+    Args:
+        feed (ChangeFeed): The feed.
+        channel (tuple): The channel.
+
+    Returns:
+        Response: The SSE stream or the JSON long poll response.
+    """
+    since, stale = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('since'), feed.epoch)
+
+    if request.args.get('mode', 'sse') == 'poll':
+        timeout = min(max(request.args.get('timeout', max_poll_timeout, type=float), 0), max_poll_timeout)
+        events, seq, reset = feed.read(channel, None if stale else since, 0 if stale else timeout)
+        return jsonify({
+            "last_event_id": f"{feed.epoch}-{seq}",
+            "reset": reset or stale,
+            "events": [{
+                "id": f"{feed.epoch}-{event['seq']}",
+                "type": event['type'],
+                "time": event['time'],
+                "data": event['data']
+            } for event in events]
+        }), 200
+
+    return Response(sse_stream(feed, channel, since, stale, heartbeat_interval), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _sse_message(epoch, seq, event_type, data):
+    return f"id: {epoch}-{seq}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+change_feed = ChangeFeed()
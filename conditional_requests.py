@@ -0,0 +1,137 @@
+# ./conditional_requests.py
+"""
+Conditional Requests Module
+---------------------------
+Helpers for answering conditional GET requests. Every GET blueprint derives a strong ETag from the
+version of the underlying document (its stat signature or revision) plus the requested
+representation, and answers a matching `If-None-Match` with 304 Not Modified before reading,
+parsing or rendering anything.
+
+Documents with a revision number (see revisions.py) use ETags of the form `<revision>.<digest>`,
+so mutations can honour `If-Match` by comparing revisions, whatever representation the client's
+ETag was taken from.
+
+Functions:
+- make_etag: Derives an ETag from a document version and representation.
+- not_modified: Returns a 304 response if the request's If-None-Match matches an ETag.
+- with_etag: Attaches an ETag to a response.
+- revision_etag: Derives an ETag from a document revision and representation.
+- if_match_satisfied: Checks a parsed If-Match header against a revision.
+- stale_revision: Returns the 412 response to a stale If-Match.
+- precondition_failed: Returns a 412 response if the request's If-Match does not match a revision.
+"""
+
+import hashlib
+from flask import request, make_response, jsonify
+
+
+def make_etag(*parts):
+    """
+    Derives a strong ETag from the parts identifying a representation of a document version,
+    e.g. a file's stat signature, the requested format and the requested task number.
+
+    Args:
+        *parts: Values identifying the representation; their repr is hashed.
+
+    Returns:
+        str: The (unquoted) ETag.
+    """
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def not_modified(etag):
+    """
+    Checks the request's If-None-Match header against an ETag.
+
+    Args:
+        etag (str): The current ETag of the requested representation.
+
+    Returns:
+        Response or None: A 304 response if the client's copy is current, None otherwise.
+    """
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    """
+    Attaches an ETag to a view's response.
+
+    Args:
+        response: Anything a Flask view may return, e.g. a (body, status, headers) tuple.
+        etag (str): The ETag of the representation.
+
+    Returns:
+        Response: The response with its ETag header set.
+    """
+    response = make_response(response)
+    if etag is not None and response.status_code == 200:
+        response.set_etag(etag)
+    return response
+
+
+def revision_etag(revision, *parts):
+    """
+    Derives an ETag from a document's revision and the parts identifying the representation.
+
+    Args:
+        revision (int): The revision of the document.
+        *parts: Values identifying the representation; their repr is hashed.
+
+    Returns:
+        str: The (unquoted) ETag, `<revision>.<digest>`.
+    """
+    return f"{revision}.{make_etag(*parts)[:16]}"
+
+
+def if_match_satisfied(if_match, revision):
+    """
+    Checks an If-Match header against the revision of a document. ETags of any representation of
+    the revision match, as do bare revision numbers and '*' if the document exists. Takes the
+    parsed header rather than the request, for changes committed on behalf of another request.
+
+    Args:
+        if_match (ETags or None): The parsed If-Match header, None if the request had none.
+        revision (int or None): The revision of the document, None if it does not exist.
+
+    Returns:
+        bool: True if the request may proceed.
+    """
+    if if_match is None:
+        return True
+    if if_match.star_tag:
+        return revision is not None
+    return revision is not None and any(tag.split('.', 1)[0] == str(revision) for tag in if_match)
+
+
+def stale_revision(revision):
+    """
+    Returns the 412 response to a request whose If-Match names a stale revision.
+
+    Args:
+        revision (int or None): The current revision of the document.
+    """
+    return jsonify({
+        "error": "Precondition failed, the document was modified",
+        "revision": revision
+    }), 412
+
+
+def precondition_failed(revision):
+    """
+    Checks the request's If-Match header against the current revision of a document, see
+    if_match_satisfied.
+
+    Args:
+        revision (int or None): The current revision of the document, None if it does not exist.
+
+    Returns:
+        tuple or None: A 412 response if the client's revision is stale, None if the request may proceed.
+    """
+    if_match = request.if_match if 'If-Match' in request.headers else None
+    if if_match_satisfied(if_match, revision):
+        return None
+    return stale_revision(revision)
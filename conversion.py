@@ -2,55 +2,111 @@
 import json
 
 def convert_json_to_markdown(openapi_json):
-    md_content = ""
+    md_content = []
 
     # Adding general information
     info = openapi_json.get("info", {})
-    md_content += f"# {info.get('title', 'API Documentation')}\n"
-    md_content += f"**Version:** {info.get('version', 'N/A')}\n\n"
-    md_content += f"{info.get('description', '')}\n\n"
+    md_content.append(f"# {info.get('title', 'API Documentation')}\n")
+    md_content.append(f"**Version:** {info.get('version', 'N/A')}\n\n")
+    md_content.append(f"{info.get('description', '')}\n\n")
 
     # Adding server information
     servers = openapi_json.get("servers", [])
     if servers:
-        md_content += "## Servers\n"
+        md_content.append("## Servers\n")
         for server in servers:
-            md_content += f"- URL: {server.get('url', 'N/A')}\n"
-        md_content += "\n"
+            md_content.append(f"- URL: {server.get('url', 'N/A')}\n")
+        md_content.append("\n")
 
     # Adding paths and operations
     paths = openapi_json.get("paths", {})
     for path, operations in paths.items():
-        md_content += f"## Path: `{path}`\n\n"
+        md_content.append(f"## Path: `{path}`\n\n")
         for operation, details in operations.items():
-            md_content += f"### {operation.upper()}\n"
-            md_content += f"**Summary:** {details.get('summary', 'N/A')}\n\n"
-            md_content += f"**Description:** {details.get('description', 'N/A')}\n\n"
-            md_content += "#### Parameters\n"
+            if not isinstance(details, dict):
+                # Path-level entries such as shared 'parameters' or a '$ref'
+                continue
+            md_content.append(f"### {operation.upper()}\n")
+            md_content.append(f"**Summary:** {details.get('summary', 'N/A')}\n\n")
+            md_content.append(f"**Description:** {details.get('description', 'N/A')}\n\n")
+            md_content.append("#### Parameters\n")
             for param in details.get('parameters', []):
-                md_content += f"- {param.get('name', 'N/A')} ({param.get('in', 'N/A')}): {param.get('description', 'N/A')}\n"
-            md_content += "\n"
+                md_content.append(f"- {param.get('name', 'N/A')} ({param.get('in', 'N/A')}): {param.get('description', 'N/A')}\n")
+            md_content.append("\n")
 
             # Responses
             responses = details.get("responses", {})
-            md_content += "#### Responses\n"
+            md_content.append("#### Responses\n")
             for status_code, response_details in responses.items():
-                md_content += f"- Status {status_code}: {response_details.get('description', 'N/A')}\n"
-                md_content += "\n"
+                md_content.append(f"- Status {status_code}: {response_details.get('description', 'N/A')}\n")
+            md_content.append("\n")
 
+    # Components (Schemas), once after all paths
+    components = openapi_json.get("components", {}).get("schemas", {})
+    if components:
+        md_content.append("## Components (Schemas)\n\n")
+        for schema_name, schema_details in components.items():
+            md_content.append(f"### {schema_name}\n")
+            properties = schema_details.get('properties', {})
+            for prop_name, prop_details in properties.items():
+                md_content.append(f"- **{prop_name}**: {prop_details.get('type', 'N/A')}\n")
+                if 'description' in prop_details:
+                    md_content.append(f"  - Description: {prop_details['description']}\n")
+            md_content.append("\n")
 
-            # Components (Schemas)
-            components = openapi_json.get("components", {}).get("schemas", {})
-            if components:
-                md_content += "## Components (Schemas)\n\n"
-                for schema_name, schema_details in components.items():
-                    md_content += f"### {schema_name}\n"
-                    properties = schema_details.get('properties', {})
-                    for prop_name, prop_details in properties.items():
-                        md_content += f"- **{prop_name}**: {prop_details.get('type', 'N/A')}\n"
-                        if 'description' in prop_details:
-                            md_content += f"  - Description: {prop_details['description']}\n"
-                    md_content += "\n"
+    return ''.join(md_content)
 
-            return md_content
 
+def convert_data_to_markdown(data, title=None):
+    """
+    Converts arbitrary JSON/YAML data to Markdown: top-level keys become sections and nested
+    objects and lists become nested bullet lists. OpenAPI documents are converted with
+    convert_json_to_markdown instead.
+
+    Args:
+        data: The parsed JSON or YAML data.
+        title (str, optional): A title for the document.
+
+    Returns:
+        str: The Markdown document.
+    """
+    if isinstance(data, dict) and ('openapi' in data or 'swagger' in data):
+        return convert_json_to_markdown(data)
+
+    md_content = [f"# {title}\n\n"] if title else []
+    if isinstance(data, dict):
+        for key, value in data.items():
+            md_content.append(f"## {key}\n\n")
+            _append_markdown_value(md_content, value, 0)
+            md_content.append("\n")
+    else:
+        _append_markdown_value(md_content, data, 0)
+    return ''.join(md_content)
+
+
+def _append_markdown_value(md_content, value, depth):
+    indent = '  ' * depth
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (dict, list)) and item:
+                md_content.append(f"{indent}- **{key}**:\n")
+                _append_markdown_value(md_content, item, depth + 1)
+            else:
+                md_content.append(f"{indent}- **{key}**: {_markdown_scalar(item)}\n")
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, (dict, list)) and item:
+                md_content.append(f"{indent}-\n")
+                _append_markdown_value(md_content, item, depth + 1)
+            else:
+                md_content.append(f"{indent}- {_markdown_scalar(item)}\n")
+    else:
+        md_content.append(f"{indent}{_markdown_scalar(value)}\n")
+
+
+def _markdown_scalar(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool) or value is None:
+        return json.dumps(value)
+    return str(value)
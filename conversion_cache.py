@@ -0,0 +1,158 @@
+# ./conversion_cache.py
+"""
+ConversionCache Module
+----------------------
+Converts JSON and YAML files on disk (e.g. OpenAPI specifications) to Markdown, JSON or YAML and
+caches the converted output. Outputs are kept in a DocumentCache keyed by path, source format and
+target format and validated against the source file's stat signature, so a repeated request for an
+unchanged file is a single lookup and an edited file is converted again on its next request.
+
+Conversions run on a small thread pool rather than on the request thread. Concurrent requests for
+the same file version and target share one conversion. A request waits up to a timeout for its
+conversion; if it is still running the caller is told to retry, and the finished output is cached
+for the retry.
+
+Under a gevent worker (`gunicorn -k gevent`) a monkey-patched ThreadPoolExecutor would run the
+conversions as greenlets, blocking the worker's hub while they parse and render and making the
+timeout ineffective. When threading is monkey-patched, gevent's native thread pool executor is used
+instead, so conversions run on real threads and the waiting request yields to other greenlets. The
+pool is created on first use, after gunicorn has patched the worker.
+
+Classes:
+- ConversionCache: Thread pool backed, stat-validated cache of converted files.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import yaml
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+except ImportError:
+    gevent_monkey = None
+from conversion import convert_data_to_markdown
+from document_cache import DocumentCache
+from file_handler import stat_signature
+
+# Formats files can be converted from, and to
+source_formats = ('json', 'yaml', 'yml')
+target_formats = ('md', 'json', 'yaml')
+
+
+class ConversionCache:
+    """
+    Cache of converted files, filled by a thread pool.
+
+    Attributes:
+        cache (DocumentCache): The converted outputs, keyed by path and (source format, target format).
+        timeout (float): Seconds a request waits for a conversion before it is told to retry.
+    """
+
+    def __init__(self, disk_manager, max_bytes=None, workers=None, timeout=None):
+        """
+        Initializes an empty cache; its thread pool is created on first use.
+
+        Args:
+            disk_manager (DiskManager): Provides the parsed source files, through its content cache.
+            max_bytes (int, optional): Byte budget, measured as the size of the source files.
+                Defaults to DISK_CONVERSION_CACHE_MAX_BYTES, or 64 MiB.
+            workers (int, optional): Number of conversion threads. Defaults to DISK_CONVERSION_WORKERS, or 2.
+            timeout (float, optional): Seconds a request waits for a conversion. Defaults to
+                DISK_CONVERSION_TIMEOUT, or 5.
+        """
+        if max_bytes is None:
+            max_bytes = int(os.getenv('DISK_CONVERSION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        if workers is None:
+            workers = int(os.getenv('DISK_CONVERSION_WORKERS', 2))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DISK_CONVERSION_TIMEOUT', 5))
+        self.cache = DocumentCache(self._convert, max_bytes=max_bytes, name='conversions')
+        self._disk_manager = disk_manager
+        self._workers = workers
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def convert(self, full_path, source_format, target_format):
+        """
+        Returns a file converted to a target format, from the cache or by converting it.
+
+        Args:
+            full_path (str): The full path of the source file.
+            source_format (str): The format of the source file, one of `source_formats`.
+            target_format (str): The format to convert to, one of `target_formats`.
+
+        Returns:
+            tuple: (content, signature), or (None, None) if the file does not exist. The signature
+                identifies the version of the source file the content was converted from.
+
+        Raises:
+            TimeoutError: If the conversion is still running after `timeout` seconds.
+        """
+        variant = (source_format, target_format)
+        content, signature = self.cache.peek(full_path, variant)
+        if content is not None:
+            return content, signature
+
+        key = (os.path.abspath(full_path), stat_signature(full_path), variant)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                if self._executor is None:
+                    self._executor = _create_executor(self._workers)
+                future = self._pending[key] = self._executor.submit(self.cache.get, full_path, variant)
+                future.add_done_callback(lambda _: self._finish(key))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            logging.info(f"Conversion of {full_path} to {target_format} is still running.")
+            raise TimeoutError(f"Conversion of {full_path} is still running")
+
+    def stats(self):
+        """
+        Returns the cache counters and the number of conversions in progress.
+        """
+        with self._lock:
+            pending = len(self._pending)
+        return dict(self.cache.stats(), pending=pending)
+
+    def _finish(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _convert(self, full_path, variant):
+        """
+        Converts a file; the loader of the cache.
+
+        Args:
+            full_path (str): The full path of the source file.
+            variant (tuple): The source and target formats.
+
+        Returns:
+            str: The converted content, or None if the file does not exist.
+        """
+        source_format, target_format = variant
+        data, _ = self._disk_manager.cache.get(full_path, source_format)
+        if data is None and not os.path.exists(full_path):
+            return None
+
+        logging.info(f"Converting {full_path} from {source_format} to {target_format}.")
+        if target_format == 'md':
+            title = os.path.splitext(os.path.basename(full_path))[0]
+            return convert_data_to_markdown(data, title=title)
+        if target_format == 'yaml':
+            return yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def _create_executor(workers):
+    """
+    Creates the conversion thread pool: gevent's pool of native threads if threading is
+    monkey-patched, a standard ThreadPoolExecutor otherwise.
+    """
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        logging.info(f"Running conversions on {workers} native threads of the gevent hub.")
+        return NativeThreadPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='disk-conversion')
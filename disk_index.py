@@ -0,0 +1,203 @@
+# ./disk_index.py
+"""
+DiskIndex Module
+----------------
+Keeps an in-memory index of the files and folders of a disk project, used to list a project and to
+answer "does this file exist" without touching the file itself. The index is built lazily, one
+folder at a time with `os.scandir`, the first time a folder is needed. A folder's modification time
+is checked at most once per `recheck_interval`, so lookups in between cost no system call at all. It
+is scanned again only when its modification time changed (a file in it was created, deleted or
+renamed, which includes atomic writes) or its entry is older than the TTL, which also picks up files
+edited in place. Folders modified within the last second are rescanned on their next use, since
+another change in the same clock tick would not change their modification time. A file created
+outside the API may therefore be reported missing for up to `recheck_interval` seconds.
+
+Folders are scanned without holding the index's lock, which is only taken to look up and swap in
+a folder's entry, so a listing of a large project does not hold up `exists` checks. Scanned
+folders are replaced, never modified (except for their timestamps), and can be read without the lock.
+
+Classes:
+- DiskIndex: Lazily built, incrementally refreshed index of one project folder.
+"""
+
+import fnmatch
+import os
+import threading
+import time
+
+# Folders created by the API next to the files they protect, not listed
+hidden_folders = ('backups',)
+
+# Seconds a folder's entry is trusted without checking the folder's modification time
+recheck_interval = 1.0
+
+
+class _Folder:
+    """
+    The scanned contents of one folder.
+    """
+
+    def __init__(self, mtime_ns, scanned_at, files, folders):
+        self.mtime_ns = mtime_ns
+        self.scanned_at = scanned_at
+        self.checked_at = time.monotonic()
+        # name -> (size, mtime)
+        self.files = files
+        self.folders = folders
+
+
+class DiskIndex:
+    """
+    Index of the files and folders under a project folder.
+
+    Attributes:
+        root (str): The project folder.
+        ttl (float): Seconds a folder's scan is trusted while its modification time is unchanged.
+    """
+
+    def __init__(self, root, ttl):
+        """
+        Initializes an empty index; folders are scanned as they are used.
+
+        Args:
+            root (str): The project folder.
+            ttl (float): Seconds a folder's scan is trusted while its modification time is unchanged.
+        """
+        self.root = root
+        self.ttl = ttl
+        self._folders = {}
+        self._lock = threading.Lock()
+
+    def exists(self, relative_path):
+        """
+        Returns whether a file exists, from the index of its folder.
+
+        Args:
+            relative_path (str): The path of the file relative to the project folder.
+
+        Returns:
+            bool: True if the file exists.
+        """
+        folder_path, name = os.path.split(os.path.normpath(relative_path))
+        folder = self._folder(folder_path)
+        return folder is not None and name in folder.files
+
+    def entries(self, pattern='*', depth=1):
+        """
+        Lists the files and folders of the project, sorted by path.
+
+        Args:
+            pattern (str): Glob the paths relative to the project folder, with their extension, must
+                match, e.g. '*.json' or 'specs/*'. '*' also matches '/'.
+            depth (int): Number of folder levels to list, 1 for the project folder only, 0 for all.
+
+        Returns:
+            list: Entries with 'path' and 'type' ('file' or 'folder'). The path of a file is given
+                without its extension, which is its 'format', as GET /disk/<project>/<path>?format=
+                expects them. Files also have 'size' and 'modified' (epoch seconds). Files without
+                an extension cannot be fetched and are not listed.
+
+        Raises:
+            FileNotFoundError: If the project folder does not exist.
+        """
+        entries = []
+        if self._folder('') is None:
+            raise FileNotFoundError(f"Folder not found: {self.root}")
+        pending = [('', 1)]
+        while pending:
+            folder_path, level = pending.pop()
+            folder = self._folder(folder_path)
+            if folder is None:
+                continue
+            for name in folder.folders:
+                if name.startswith('.') or name in hidden_folders:
+                    continue
+                path = _join(folder_path, name)
+                if fnmatch.fnmatchcase(path, pattern):
+                    entries.append({'path': path, 'type': 'folder'})
+                if depth == 0 or level < depth:
+                    pending.append((path, level + 1))
+            for name, (size, mtime) in folder.files.items():
+                stem, extension = os.path.splitext(name)
+                if name.startswith('.') or not extension:
+                    continue
+                if fnmatch.fnmatchcase(_join(folder_path, name), pattern):
+                    entries.append({'path': _join(folder_path, stem), 'type': 'file', 'format': extension[1:],
+                                    'size': size, 'modified': mtime})
+        entries.sort(key=lambda entry: (entry['path'], entry.get('format', '')))
+        return entries
+
+    def invalidate(self, relative_path):
+        """
+        Marks the folder of a file for rescanning, after the file was written.
+
+        Args:
+            relative_path (str): The path of the file relative to the project folder.
+        """
+        folder_path = os.path.dirname(os.path.normpath(relative_path))
+        with self._lock:
+            folder = self._folders.get(folder_path)
+            if folder is not None:
+                folder.scanned_at = float('-inf')
+
+    def _folder(self, folder_path):
+        """
+        Returns a folder's contents, scanning it if it is not indexed or changed. Recently checked
+        entries are returned without a system call. The scan runs
+        without the lock; concurrent scans of a folder may both store their result, and a stale one
+        is replaced on the next use since its modification time no longer matches.
+        """
+        with self._lock:
+            folder = self._folders.get(folder_path)
+        now = time.monotonic()
+        if folder is not None and now - folder.scanned_at < self.ttl and now - folder.checked_at < recheck_interval:
+            return folder
+
+        full_path = os.path.join(self.root, folder_path)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            with self._lock:
+                self._forget(folder_path)
+            return None
+        if folder is not None and folder.mtime_ns == stat.st_mtime_ns and now - folder.scanned_at < self.ttl:
+            folder.checked_at = now
+            return folder
+
+        files, folders = {}, []
+        try:
+            with os.scandir(full_path) as scanned:
+                for entry in scanned:
+                    try:
+                        if entry.is_dir():
+                            folders.append(entry.name)
+                        elif entry.is_file():
+                            entry_stat = entry.stat()
+                            files[entry.name] = (entry_stat.st_size, entry_stat.st_mtime)
+                    except OSError:
+                        continue
+        except (NotADirectoryError, FileNotFoundError):
+            with self._lock:
+                self._forget(folder_path)
+            return None
+
+        recent = time.time_ns() - stat.st_mtime_ns < 1_000_000_000
+        scanned_folder = _Folder(stat.st_mtime_ns, float('-inf') if recent else time.monotonic(), files, folders)
+        with self._lock:
+            if folder is not None:
+                for name in set(folder.folders) - set(folders):
+                    self._forget(_join(folder_path, name))
+            self._folders[folder_path] = scanned_folder
+        return scanned_folder
+
+    def _forget(self, folder_path):
+        """
+        Drops a folder and its subfolders from the index. Must be called with the lock held.
+        """
+        prefix = folder_path + os.sep if folder_path else ''
+        for path in [path for path in self._folders if path == folder_path or path.startswith(prefix)]:
+            del self._folders[path]
+
+
+def _join(folder_path, name):
+    return os.path.join(folder_path, name) if folder_path else name
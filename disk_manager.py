@@ -1,14 +1,52 @@
 # disk_manager.py
 # Purpose: This module provides functionality for managing disk operations such as reading and writing files. 
 # It handles various file formats and ensures the files are accessed and stored correctly.
+# Parsed file contents are kept in a DocumentCache, keyed by path and format and validated against the
+# file's stat signature, so hot files are not re-read and re-parsed on every request. Each project has a
+# DiskIndex of its files, used to list the project and to answer reads of missing files without a stat.
+# Uploads are streamed to a temporary file, validated and renamed into place, so a file is never left
+# partially written and large uploads are never held in memory. Validation is incremental too: YAML is
+# checked by iterating its parse events and JSON with ijson if it is installed. Without ijson, JSON
+# uploads are parsed whole, up to DISK_UPLOAD_JSON_VALIDATE_MAX_BYTES; larger ones are rejected.
 
 import os
 import json
 import yaml
+try:
+    import ijson
+except ImportError:
+    ijson = None
+import hashlib
 import logging
 import shutil
+import tempfile
+import threading
 from datetime import datetime
 from conversion import convert_json_to_markdown
+from document_cache import DocumentCache
+from disk_index import DiskIndex
+from file_handler import sync_directory
+
+# Size of the chunks uploads are streamed and hashed in
+upload_chunk_size = 64 * 1024
+
+# Formats whose uploads must be UTF-8 text
+text_formats = ('md', 'txt')
+
+# Formats uploads are accepted in; each is validated before it is stored
+upload_formats = ('json', 'yaml', 'yml') + text_formats
+
+# Largest JSON upload validated by parsing it whole, when ijson is not installed
+json_validate_max_bytes = int(os.getenv('DISK_UPLOAD_JSON_VALIDATE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Errors raised by the parsers uploads are validated with
+validation_errors = (ValueError, yaml.YAMLError) + ((ijson.JSONError,) if ijson is not None else ())
+
+
+class PayloadTooLarge(Exception):
+    """
+    Raised when an upload exceeds the maximum upload size.
+    """
 
 class DiskManager:
     """
@@ -16,16 +54,97 @@ class DiskManager:
     Supports operations such as reading and writing files in various formats.
     """
 
-    def __init__(self, base_path='./disk'):
+    def __init__(self, base_path='./disk', cache_max_bytes=None, index_ttl=None):
         """
         Initializes the DiskManager with a base path for file operations.
         Args:
             base_path (str): The base directory path for file operations.
+            cache_max_bytes (int, optional): Byte budget of the parsed content cache, measured as the
+                size of the cached files. Defaults to DISK_CACHE_MAX_BYTES, or 64 MiB.
+            index_ttl (float, optional): Seconds a folder's entry in a project index is trusted while
+                the folder's modification time is unchanged. Defaults to DISK_INDEX_TTL, or 30.
         """
         self.base_path = base_path
+        if cache_max_bytes is None:
+            cache_max_bytes = int(os.getenv('DISK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.cache = DocumentCache(self._parse_file, max_bytes=cache_max_bytes, name='disk')
+        self.index_ttl = index_ttl if index_ttl is not None else float(os.getenv('DISK_INDEX_TTL', 30))
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
         logging.basicConfig(level=logging.INFO)
         logging.info(f"DiskManager initialized with base path: {base_path}")
 
+    def project_dir(self, project_name):
+        """
+        Returns the folder of a project.
+        Args:
+            project_name (str): The name of the project folder.
+        Returns:
+            str: The path of the project folder.
+        Raises:
+            FileNotFoundError: If the name would escape the base path (e.g. '..').
+        """
+        project_dir = os.path.join(self.base_path, project_name)
+        if os.path.realpath(self.base_path) != os.path.dirname(os.path.realpath(project_dir)):
+            logging.warning(f"Rejected project folder outside of the base path: {project_dir}")
+            raise FileNotFoundError(f"Project not found: {project_name}")
+        return project_dir
+
+    def index(self, project_name):
+        """
+        Returns the file index of a project, creating it on first use.
+        Args:
+            project_name (str): The name of the project folder.
+        Returns:
+            DiskIndex: The project's index.
+        Raises:
+            FileNotFoundError: If the project does not exist or the name would escape the base path.
+        """
+        project_dir = self.project_dir(project_name)
+        with self._indexes_lock:
+            index = self._indexes.get(project_name)
+        if index is not None:
+            return index
+        # Only existing projects get an index, requests for made-up names leave nothing behind
+        if not os.path.isdir(project_dir):
+            raise FileNotFoundError(f"Project not found: {project_name}")
+        with self._indexes_lock:
+            return self._indexes.setdefault(project_name, DiskIndex(project_dir, self.index_ttl))
+
+    def list_files(self, project_name, pattern='*', depth=1):
+        """
+        Lists the files and folders of a project from its index.
+        Args:
+            project_name (str): The name of the project folder.
+            pattern (str): Glob the paths relative to the project folder must match.
+            depth (int): Number of folder levels to list, 1 for the project folder only, 0 for all.
+        Returns:
+            list: The matching entries, sorted by path.
+        Raises:
+            FileNotFoundError: If the project does not exist.
+        """
+        return self.index(project_name).entries(pattern, depth)
+
+    def resolve_path(self, project_name, file_path, format_type):
+        """
+        Resolves the full path of a file from its project name, file path, and format type.
+        Args:
+            project_name (str): The name of the project folder.
+            file_path (str): The relative path of the file within the project folder.
+            format_type (str): The format type of the file (e.g., 'json', 'yaml', 'txt').
+        Returns:
+            str: The full path of the file on disk.
+        Raises:
+            FileNotFoundError: If the path would escape the project folder (e.g. through '..').
+        """
+        project_dir = self.project_dir(project_name)
+        full_path = os.path.join(project_dir, file_path + '.' + format_type)
+        real_project_dir = os.path.realpath(project_dir)
+        if os.path.commonpath([real_project_dir, os.path.realpath(full_path)]) != real_project_dir:
+            logging.warning(f"Rejected path outside of the project folder: {full_path}")
+            raise FileNotFoundError(f"File not found: {full_path}")
+        return full_path
+
     def read_file(self, project_name, file_path, format_type):
         """
         Reads a file from the disk based on the given project name, file path, and format type.
@@ -38,13 +157,48 @@ class DiskManager:
         Raises:
             FileNotFoundError: If the file does not exist.
         """
-        file_extension = '.' + format_type
-        full_path = os.path.join(self.base_path, project_name, file_path + file_extension)
-
-        if not os.path.exists(full_path):
+        full_path = self.resolve_path(project_name, file_path, format_type)
+        if not self.index(project_name).exists(file_path + '.' + format_type):
             logging.error(f"File not found: {full_path}")
             raise FileNotFoundError(f"File not found: {full_path}")
+        return self.read_path(full_path, format_type)
+
+    def read_path(self, full_path, format_type, signature=None):
+        """
+        Reads a file resolved with resolve_path, through the content cache.
+        Args:
+            full_path (str): The full path of the file.
+            format_type (str): The format type of the file (e.g., 'json', 'yaml', 'txt').
+            signature (tuple, optional): The file's stat signature, if the caller has just taken it.
+        Returns:
+            The content of the file in the requested format.
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        try:
+            content, _ = self.cache.get(full_path, format_type, signature)
+            if content is None:
+                if not os.path.exists(full_path):
+                    logging.error(f"File not found: {full_path}")
+                    raise FileNotFoundError(f"File not found: {full_path}")
+                # An empty YAML document parses to None, which is not cached
+                content = self._parse_file(full_path, format_type)
+            return content
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            logging.error(f"Error reading file {full_path}: {e}")
+            raise
 
+    def _parse_file(self, full_path, format_type):
+        """
+        Reads and parses a file; the loader of the content cache.
+        Args:
+            full_path (str): The full path of the file.
+            format_type (str): The format type of the file (e.g., 'json', 'yaml', 'txt').
+        Returns:
+            The parsed content, or None if the file does not exist.
+        """
         try:
             with open(full_path, 'r', encoding='utf-8') as file:
                 logging.info(f"Reading file: {full_path}")
@@ -54,9 +208,8 @@ class DiskManager:
                     return yaml.safe_load(file)
                 else:
                     return file.read()
-        except Exception as e:
-            logging.error(f"Error reading file {full_path}: {e}")
-            raise
+        except FileNotFoundError:
+            return None
 
     def write_file(self, project_name, file_path, content, format_type):
         """
@@ -69,8 +222,7 @@ class DiskManager:
         Raises:
             Exception: If there is an error in writing to the file.
         """
-        file_extension = '.' + format_type
-        full_path = os.path.join(self.base_path, project_name, file_path + file_extension)
+        full_path = self.resolve_path(project_name, file_path, format_type)
 
         # Create a backup of the existing file
         self._create_backup(full_path)
@@ -88,6 +240,125 @@ class DiskManager:
         except Exception as e:
             logging.error(f"Error writing to file {full_path}: {e}")
             raise
+        finally:
+            self.cache.invalidate(full_path)
+            self.index(project_name).invalidate(file_path + '.' + format_type)
+
+    def upload_file(self, project_name, file_path, stream, format_type, max_bytes):
+        """
+        Stores an uploaded file. The upload is streamed in chunks to a temporary file next to the
+        target while it is hashed, validated against its format and renamed over the target. If the
+        content is identical to the existing file nothing is written; otherwise the existing file is
+        backed up first.
+        Args:
+            project_name (str): The name of the project folder.
+            file_path (str): The relative path of the file within the project folder.
+            stream: A binary file-like object with the uploaded content.
+            format_type (str): The format type of the file (e.g., 'json', 'yaml', 'md').
+            max_bytes (int): Maximum size of the upload in bytes.
+        Returns:
+            dict: The 'sha256' and 'size' of the content, and whether the file was 'created' or 'changed'.
+        Raises:
+            FileNotFoundError: If the project does not exist.
+            PayloadTooLarge: If the upload is larger than max_bytes, or is JSON too large to validate
+                without ijson.
+            ValueError: If the format is not one of `upload_formats` or the content is not valid for it.
+        """
+        if format_type not in upload_formats:
+            raise ValueError(f"Unsupported upload format '{format_type}', expected one of {', '.join(upload_formats)}")
+        full_path = self.resolve_path(project_name, file_path, format_type)
+        if not os.path.isdir(self.project_dir(project_name)):
+            raise FileNotFoundError(f"Project not found: {project_name}")
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        changed = False
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(full_path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                while True:
+                    chunk = stream.read(upload_chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise PayloadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    file.write(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            self._validate_upload(temp_path, format_type, size)
+
+            sha256 = digest.hexdigest()
+            created = not os.path.exists(full_path)
+            changed = created or self._file_sha256(full_path) != sha256
+            if changed:
+                self._create_backup(full_path)
+                os.replace(temp_path, full_path)
+                sync_directory(directory)
+                logging.info(f"Upload of {size} bytes written to {full_path}")
+            else:
+                os.unlink(temp_path)
+                logging.info(f"Upload to {full_path} is identical to the existing file, nothing written")
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        finally:
+            if changed:
+                self.cache.invalidate(full_path)
+                self.index(project_name).invalidate(file_path + '.' + format_type)
+        return {'sha256': sha256, 'size': size, 'created': created, 'changed': changed}
+
+    def _validate_upload(self, temp_path, format_type, size):
+        """
+        Checks that an uploaded file parses as its format, without loading it into memory (except
+        for JSON when ijson is not installed).
+        Args:
+            temp_path (str): The path of the uploaded file.
+            format_type (str): The declared format type of the file, one of `upload_formats`.
+            size (int): The size of the uploaded file in bytes.
+        Raises:
+            PayloadTooLarge: If the upload is JSON too large to validate without ijson.
+            ValueError: If the content is not valid for its format.
+        """
+        try:
+            if format_type == 'json' and ijson is not None:
+                with open(temp_path, 'rb') as file:
+                    for _ in ijson.parse(file):
+                        pass
+            elif format_type == 'json':
+                if size > json_validate_max_bytes:
+                    raise PayloadTooLarge(f"JSON uploads larger than {json_validate_max_bytes} bytes cannot be validated")
+                with open(temp_path, 'r', encoding='utf-8') as file:
+                    json.load(file)
+            elif format_type in ['yml', 'yaml']:
+                with open(temp_path, 'r', encoding='utf-8') as file:
+                    for event in yaml.parse(file, Loader=yaml.SafeLoader):
+                        tag = getattr(event, 'tag', None)
+                        # Tags only the unsafe loaders construct, e.g. !!python/object
+                        if tag not in (None, '!') and tag not in yaml.SafeLoader.yaml_constructors:
+                            raise ValueError(f"unsupported tag {tag}")
+            else:
+                with open(temp_path, 'r', encoding='utf-8') as file:
+                    while file.read(upload_chunk_size):
+                        pass
+        except validation_errors as e:
+            raise ValueError(f"Invalid {format_type} content: {e}") from e
+
+    def _file_sha256(self, full_path):
+        """
+        Returns the SHA-256 of a file, read in chunks.
+        """
+        digest = hashlib.sha256()
+        with open(full_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(upload_chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
 
     def _create_backup(self, full_path):
         """
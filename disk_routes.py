@@ -1,42 +1,158 @@
 # disk_routes.py
 # Purpose: This module defines routes for handling file operations in different formats. 
 # It provides an API endpoint for retrieving files stored on disk in specified formats like JSON, Markdown, etc.
+# Responses carry an ETag derived from the file's stat signature and format, and a matching If-None-Match
+# is answered with 304 before the file is read or parsed. With raw=true the file is streamed from disk
+# as is, with support for Range and If-Modified-Since requests. With as=md|json|yaml a JSON or YAML file
+# (e.g. an OpenAPI specification) is returned converted to that format, through the ConversionCache.
+# GET /disk/<project> lists the project's files from its DiskIndex, filtered by glob and paginated.
+# PUT /disk/<project>/<path> streams an upload into place atomically; it requires the project's API key.
 
-from flask import Blueprint, jsonify, request
-from disk_manager import DiskManager
+from flask import Blueprint, jsonify, request, send_file, abort
+from disk_manager import DiskManager, PayloadTooLarge, upload_formats
+from api_authenticator import api_auth_instance
+from conversion_cache import ConversionCache, source_formats, target_formats
+from conditional_requests import make_etag, not_modified, with_etag
+from file_handler import stat_signature
 import logging
-from conversion import convert_json_to_markdown
+import os
 
 # Initialize the Blueprint for disk-related routes
 disk_blueprint = Blueprint('disk_routes', __name__)
 disk_manager = DiskManager()
+conversion_cache = ConversionCache(disk_manager)
+
+# Content types of files served raw, by format
+raw_mimetypes = {
+    'json': 'application/json',
+    'md': 'text/markdown',
+    'yaml': 'application/yaml',
+    'yml': 'application/yaml'
+}
+
+# Maximum size of an upload in bytes, larger uploads are answered with 413
+max_upload_bytes = int(os.getenv('DISK_MAX_UPLOAD_BYTES', 100 * 1024 * 1024))
+
+# Maximum page size of a listing
+max_per_page = 1000
+
+# Content types of converted files, by target format
+converted_mimetypes = {
+    'md': 'text/markdown; charset=utf-8',
+    'json': 'application/json',
+    'yaml': 'application/yaml; charset=utf-8'
+}
+
+@disk_blueprint.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Route to retrieve the hit rate and the bytes held by the parsed file content cache, with the
+    statistics of the converted file cache under 'conversions'.
+    """
+    return jsonify(dict(disk_manager.cache.stats(), conversions=conversion_cache.stats())), 200
+
+@disk_blueprint.route('/<project_name>', methods=['GET'])
+def list_files(project_name):
+    """
+    Route to list the files and folders of a project. Files are listed with their path without
+    the extension and their 'format', so an entry is fetched with GET /disk/<project>/<path>?format=<format>.
+
+    Query Parameters:
+        list (str, optional): Glob the paths relative to the project folder must match, e.g. '*.json'
+            or 'specs/*' ('*' also matches '/'). Defaults to '*'.
+        depth (int, optional): Number of folder levels to list, 1 (default) for the project folder
+            only, 0 for all.
+        page (int, optional): The page to return, starting at 1.
+        per_page (int, optional): Entries per page, 100 by default and at most 1000.
+    """
+    pattern = request.args.get('list') or '*'
+    depth = request.args.get('depth', 1, type=int)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    if depth < 0 or page < 1 or not 1 <= per_page <= max_per_page:
+        return jsonify({'error': f"depth must be 0 or more, page 1 or more and per_page between 1 and {max_per_page}"}), 400
+
+    try:
+        entries = disk_manager.list_files(project_name, pattern, depth)
+    except FileNotFoundError:
+        logging.error(f"Project '{project_name}' not found.")
+        return jsonify({'error': 'Project not found'}), 404
+
+    start = (page - 1) * per_page
+    return jsonify({
+        'project': project_name,
+        'page': page,
+        'per_page': per_page,
+        'total': len(entries),
+        'entries': entries[start:start + per_page]
+    }), 200
 
 @disk_blueprint.route('/<project_name>/<path:file_path>', methods=['GET'])
 def get_file(project_name, file_path):
     """
     Route to retrieve a file's content based on the specified project and file path.
     The format of the file content is determined by the 'format' query parameter.
+    With 'raw=true' the file is streamed from disk without being read into memory, through the
+    server's sendfile support where available, honouring Range, If-Modified-Since and If-None-Match.
+    With 'as=md|json|yaml' a JSON or YAML file is returned converted to that format. If the conversion
+    takes longer than DISK_CONVERSION_TIMEOUT the response is 202 with Retry-After; the conversion
+    continues and the retry is served from the cache.
     """
     format_type = request.args.get('format', 'json')  # Default to JSON if format is not specified
+    raw = request.args.get('raw', 'false').lower() == 'true'
+    target_format = request.args.get('as')
+
+    if target_format is not None and (target_format not in target_formats or format_type not in source_formats):
+        return jsonify({'error': f"Conversion is supported from {', '.join(source_formats)} "
+                                 f"to {', '.join(target_formats)}"}), 400
 
     logging.info(f"Request received for project '{project_name}' to retrieve file '{file_path}' in format '{format_type}'.")
 
     try:
+        full_path = disk_manager.resolve_path(project_name, file_path, format_type)
+        # Missing files are answered from the project's index, without a stat
+        if not disk_manager.index(project_name).exists(file_path + '.' + format_type):
+            raise FileNotFoundError(f"File not found: {full_path}")
+        # The one stat of the request, it versions the ETag and the cached content
+        signature = stat_signature(full_path)
+        if signature is None:
+            raise FileNotFoundError(f"File not found: {full_path}")
+        etag = make_etag('disk', signature, format_type, raw, target_format)
+        cached_response = not_modified(etag)
+        if cached_response is not None:
+            return cached_response
+
+        if raw:
+            logging.info(f"Streaming file '{full_path}'.")
+            return send_file(os.path.abspath(full_path), mimetype=raw_mimetypes.get(format_type, 'text/plain'),
+                             conditional=True, etag=etag)
+
+        if target_format is not None:
+            try:
+                content, signature = conversion_cache.convert(full_path, format_type, target_format)
+            except TimeoutError:
+                return jsonify({'message': 'Conversion in progress, retry shortly'}), 202, {'Retry-After': '1'}
+            if content is None:
+                raise FileNotFoundError(f"File not found: {full_path}")
+            logging.info(f"Returning file '{file_path}' converted to {target_format}.")
+            etag = make_etag('disk', signature, format_type, raw, target_format)
+            return with_etag((content, 200, {'Content-Type': converted_mimetypes[target_format]}), etag)
+
         # Read the file content based on the requested format
-        file_content = disk_manager.read_file(project_name, file_path, format_type)
+        file_content = disk_manager.read_path(full_path, format_type, signature)
         logging.info(f"File content successfully read for file '{file_path}'.")
 
         if format_type == 'json':
             # Return content as JSON
             logging.info(f"Returning file content as JSON.")
-            return jsonify(file_content)
+            return with_etag(jsonify(file_content), etag)
         elif format_type == 'md':
             # Return markdown content
-            return file_content, 200, {'Content-Type': 'text/markdown'}
+            return with_etag((file_content, 200, {'Content-Type': 'text/markdown'}), etag)
         else: 
             # For other formats like txt, yaml, etc., return as plain text
             logging.info(f"Returning file content as plain text.")
-            return file_content, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+            return with_etag((file_content, 200, {'Content-Type': 'text/plain; charset=utf-8'}), etag)
 
     except FileNotFoundError:
         logging.error(f"File '{file_path}' not found for project '{project_name}'.")
@@ -44,3 +160,43 @@ def get_file(project_name, file_path):
     except Exception as e:
         logging.exception(f"An error occurred while retrieving the file '{file_path}': {e}")
         return jsonify({'error': 'An error occurred while processing the request'}), 500
+
+@disk_blueprint.route('/<project_name>/<path:file_path>', methods=['PUT'])
+@api_auth_instance.require_api_key
+def put_file(project_name, file_path):
+    """
+    Route to upload a file to the specified project and file path. The request body is the file's
+    content, streamed to disk in chunks; 'format' selects the file extension and the format the
+    content is validated against (json and yaml must parse, md and txt must be UTF-8); other
+    formats are rejected with 400. Uploads larger than DISK_MAX_UPLOAD_BYTES are rejected with 413. If the content is identical to the
+    existing file nothing is written, otherwise the existing file is backed up and replaced.
+    """
+    format_type = request.args.get('format', 'json')  # Default to JSON if format is not specified
+
+    logging.info(f"Upload received for project '{project_name}' to file '{file_path}' in format '{format_type}'.")
+
+    if format_type not in upload_formats:
+        return jsonify({'error': f"Uploads are supported in {', '.join(upload_formats)}"}), 400
+    if request.content_length is not None and request.content_length > max_upload_bytes:
+        abort(413)
+
+    try:
+        result = disk_manager.upload_file(project_name, file_path, request.stream, format_type, max_upload_bytes)
+        full_path = disk_manager.resolve_path(project_name, file_path, format_type)
+    except PayloadTooLarge:
+        abort(413)
+    except FileNotFoundError:
+        logging.error(f"Project '{project_name}' not found for upload of '{file_path}'.")
+        return jsonify({'error': 'Project not found'}), 404
+    except ValueError as e:
+        logging.error(f"Rejected upload of '{file_path}' to project '{project_name}': {e}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.exception(f"An error occurred while uploading the file '{file_path}': {e}")
+        return jsonify({'error': 'An error occurred while processing the request'}), 500
+
+    if result['created']:
+        return jsonify(dict(result, message='File created')), 201
+    etag = make_etag('disk', stat_signature(full_path), format_type, False, None)
+    message = 'File updated' if result['changed'] else 'File unchanged'
+    return with_etag(jsonify(dict(result, message=message)), etag)
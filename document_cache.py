@@ -0,0 +1,169 @@
+# ./document_cache.py
+"""
+DocumentCache Module
+--------------------
+Caches parsed documents (JSON, YAML, ...) in memory so that hot files are not re-read and re-parsed
+on every request. Entries are keyed by path and variant (e.g. the format a file was parsed as) and
+are only served while the file's stat signature (mtime_ns, size, inode) is unchanged, so external
+edits are picked up on the next access. The cache is bounded by an approximate byte budget, measured
+as the on-disk size of the cached files, and evicts least recently used entries.
+
+Classes:
+- DocumentCache: Thread-safe, stat-validated LRU cache of parsed documents.
+
+Cached documents are shared between requests and must be treated as read-only; copy them before
+modifying.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from file_handler import stat_signature
+
+
+class DocumentCache:
+    """
+    LRU cache of parsed documents validated against the files' stat signatures.
+
+    Attributes:
+        name (str): Name of the cache, used in logs and stats.
+        max_bytes (int): Byte budget, measured as the combined size of the cached files.
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups that had to load the file.
+        evictions (int): Entries evicted to stay within the budget.
+    """
+
+    def __init__(self, loader, max_bytes, name='documents'):
+        """
+        Initializes an empty cache.
+
+        Args:
+            loader (callable): Called as loader(path, variant) to parse a file. May return None if
+                the file cannot be parsed, in which case nothing is cached.
+            max_bytes (int): Byte budget of the cache.
+            name (str): Name of the cache.
+        """
+        self.name = name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loader = loader
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, variant=None, signature=None):
+        """
+        Returns the parsed document of a file, loading it if it is not cached or changed on disk.
+
+        Args:
+            path (str): The path to the file.
+            variant (str, optional): Distinguishes different parses of the same file.
+            signature (tuple, optional): The file's stat signature, if the caller has just taken
+                it; the file is stat'ed otherwise.
+
+        Returns:
+            tuple: (document, signature), or (None, None) if the file does not exist or could not
+                be parsed. The signature identifies the version of the file the document was read from.
+        """
+        key = (os.path.abspath(path), variant)
+        if signature is None:
+            signature = stat_signature(path)
+        if signature is None:
+            self._discard(key)
+            return None, None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        document = self._loader(path, variant)
+        if document is None:
+            self._discard(key)
+            return None, None
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (document, signature)
+            self._bytes += signature[1]
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+                self.evictions += 1
+                logging.info(f"Evicted {evicted_key[0]} from the {self.name} cache.")
+        return document, signature
+
+    def peek(self, path, variant=None):
+        """
+        Returns the cached document of a file if it is cached and unchanged on disk, without
+        loading it otherwise. Only hits are counted.
+
+        Args:
+            path (str): The path to the file.
+            variant (str, optional): Distinguishes different parses of the same file.
+
+        Returns:
+            tuple: (document, signature), or (None, None) if no current entry is cached.
+        """
+        key = (os.path.abspath(path), variant)
+        signature = stat_signature(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or signature is None or entry[1] != signature:
+                return None, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def invalidate(self, path):
+        """
+        Drops every cached variant of a file. Used as a hook after the file was written.
+
+        Args:
+            path (str): The path to the file.
+        """
+        full_path = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == full_path]:
+                self._remove(key)
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, hit rate, number of entries and bytes held versus budget.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _discard(self, key):
+        """
+        Drops one entry, taking the lock.
+        """
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        """
+        Drops one entry. Must be called with the lock held.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1][1]
@@ -1,18 +1,107 @@
 # ./file_handler.py
-# This module handles file operations, including reading JSON files.
+# This module handles file operations, including reading and atomically writing JSON files, and group
+# commits of concurrent changes to the same file (GroupCommitter), so a burst of updates costs one
+# rewrite of the file instead of one per request.
 
 import json
 import logging
-import fcntl
+import os
+import tempfile
+import threading
+
+
+def stat_signature(file_path):
+    """
+    Returns a signature identifying the current version of a file on disk.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        tuple or None: (mtime_ns, size, inode) of the file, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def atomic_write_bytes(file_path, payload):
+    """
+    Writes bytes to a file atomically: the data is written to a temporary file in the same
+    directory, flushed to disk and then renamed over the target, so readers see either the old or
+    the new content but never a partially written file.
+
+    Args:
+        file_path (str): The path to the file.
+        payload (bytes): The content to write.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    sync_directory(directory)
+
+
+def sync_directory(directory):
+    """
+    Flushes a directory's entries to disk, so a file renamed into it survives a crash.
+
+    Args:
+        directory (str): The path to the directory.
+    """
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def atomic_write_json(file_path, data, indent=4):
+    """
+    Writes JSON data to a file atomically, see atomic_write_bytes.
+
+    Args:
+        file_path (str): The path to the JSON file.
+        data: The JSON-serializable data to write.
+        indent (int, optional): Indentation passed to json.dumps.
+    """
+    atomic_write_bytes(file_path, json.dumps(data, indent=indent).encode('utf-8'))
+
 
 class FileHandler:
     def __init__(self):
+        """
+        Initializes the FileHandler.
+        """
         logging.basicConfig(level=logging.INFO)
+        self._write_listeners = []
+
+    def add_write_listener(self, listener):
+        """
+        Registers a callback that is called with the file path after every successful write,
+        e.g. to invalidate caches of that file.
+
+        Args:
+            listener (callable): Called as listener(file_path).
+        """
+        self._write_listeners.append(listener)
 
     def read_json_file(self, file_path):
         """
-        Reads and returns the content of a JSON file, also locks the file so that it cannot be modified. 
-        This is to prevent concurrent access to the file.
+        Reads and returns the content of a JSON file. Writes replace files atomically, so a
+        reader always sees a complete document without having to lock the file.
         Args:
         - file_path (str): The path to the JSON file.
 
@@ -21,10 +110,7 @@ class FileHandler:
         """
         try:
             with open(file_path, 'r') as file:
-                fcntl.flock(file, fcntl.LOCK_SH)  # Shared lock for reading
-                data = json.load(file)
-                fcntl.flock(file, fcntl.LOCK_UN)  # Unlock the file
-                return data
+                return json.load(file)
         except FileNotFoundError:
             logging.error(f"File not found: {file_path}")
         except json.JSONDecodeError as e:
@@ -35,18 +121,106 @@ class FileHandler:
 
     def write_json_file(self, file_path, data):
         """
-        Writes the given data to a JSON file, also unlocks the file so that it can be modified.
+        Writes the given data to a JSON file atomically (temporary file, fsync, rename).
+        Callers writing the same file concurrently must serialize their read-modify-write cycles,
+        as the task routes do under the document's revision lock.
 
         Args:
             file_path (str): The path to the JSON file.
             data (dict): The data to write to the file.
         """
         try:
-            with open(file_path, 'w') as file:
-                fcntl.flock(file, fcntl.LOCK_EX)  # Exclusive lock for writing
-                json.dump(data, file, indent=4)
-                fcntl.flock(file, fcntl.LOCK_UN)  # Unlock the file
+            atomic_write_json(file_path, data)
             logging.info(f"Data successfully written to {file_path}")
         except Exception as e:
             logging.error(f"Failed to write data to {file_path}: {e}")
             raise
+        for listener in self._write_listeners:
+            listener(file_path)
+
+
+class _PendingChange:
+    """
+    A change waiting in a GroupCommitter queue, and its outcome.
+    """
+
+    def __init__(self, change):
+        self.change = change
+        self.done = threading.Event()
+        # Set when this change's request is handed the next batch to commit
+        self.batch = None
+        self.result = None
+        self.error = None
+
+
+class GroupCommitter:
+    """
+    Commits concurrent changes to a file in batches. The first request to submit a change for a
+    file commits it right away; changes submitted while a commit is running are queued, and when it
+    finishes the request of the oldest queued change commits the whole queue with one call. Nothing
+    waits for a time window: the batch is whatever arrived during the previous commit, so a single
+    request is never delayed and a burst costs one commit per batch instead of one per request.
+    """
+
+    def __init__(self, commit_batch):
+        """
+        Initializes the committer.
+
+        Args:
+            commit_batch (callable): Called as commit_batch(path, changes) with the changes of a
+                batch in submission order; returns one result per change. If it raises, every
+                change of the batch fails with the exception.
+        """
+        self._commit_batch = commit_batch
+        # path -> changes queued behind the running commit; no entry if none is running
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def submit(self, path, change):
+        """
+        Commits a change to a file, batched with the changes submitted concurrently.
+
+        Args:
+            path (str): The path to the file.
+            change: The change, passed on to commit_batch.
+
+        Returns:
+            The result commit_batch returned for the change.
+        """
+        pending = _PendingChange(change)
+        with self._lock:
+            queue = self._queues.get(path)
+            if queue is None:
+                self._queues[path] = []
+                pending.batch = [pending]
+            else:
+                queue.append(pending)
+        if pending.batch is None:
+            pending.done.wait()
+        if pending.batch is not None:
+            self._commit(path, pending.batch)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _commit(self, path, batch):
+        """
+        Commits a batch, then hands the changes queued meanwhile to the request of the oldest one.
+        """
+        try:
+            results = self._commit_batch(path, [pending.change for pending in batch])
+            for pending, result in zip(batch, results):
+                pending.result = result
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        finally:
+            with self._lock:
+                queued = self._queues.pop(path)
+                if queued:
+                    self._queues[path] = []
+            for pending in batch[1:]:
+                pending.done.set()
+            if queued:
+                queued[0].batch = queued
+                queued[0].done.set()
@@ -2,10 +2,18 @@
 """
 MarkdownConverter Module
 ------------------------
-Responsible for converting JSON data to Markdown format. This module is utilized in 
-transforming task data into a readable Markdown format, enhancing the user's understanding 
+Responsible for converting JSON data to Markdown format. This module is utilized in
+transforming task data into a readable Markdown format, enhancing the user's understanding
 and interaction with the data.
 
+Rendering is cached at two levels. Complete documents are cached by document version and task
+number, so repeated requests for an unchanged task file are served without rendering. When a whole
+document is rendered, each main task's section is cached as a fragment keyed by document version
+and task number. Writers report which tasks a new version changed (record_update), and the sections
+of every other task are carried over from the previous version with a single copy of its fragments,
+so after a write only the touched tasks are re-rendered and the document is assembled from cached
+fragments with a single join.
+
 Classes:
 - MarkdownConverter: Converts JSON data to a well-structured Markdown format.
 
@@ -14,50 +22,198 @@ Dependencies:
 """
 
 import logging
+import os
+import threading
+from collections import OrderedDict
+
+
+def _checkbox(status):
+    return 'x' if status else ' '
+
 
 class MarkdownConverter:
-    def __init__(self):
+    def __init__(self, cache_size=None, fragment_cache_size=None):
         """
-        Initializes the MarkdownConverter with basic logging configuration.
+        Initializes the MarkdownConverter with basic logging configuration and empty render caches.
+
+        Args:
+            cache_size (int, optional): Number of rendered documents to keep. Defaults to the
+                MARKDOWN_CACHE_SIZE environment variable, or 256.
+            fragment_cache_size (int, optional): Number of rendered task sections to keep. Defaults
+                to the MARKDOWN_FRAGMENT_CACHE_SIZE environment variable, or 20000.
         """
         logging.basicConfig(level=logging.INFO)
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv('MARKDOWN_CACHE_SIZE', 256))
+        self.fragment_cache_size = (fragment_cache_size if fragment_cache_size is not None
+                                    else int(os.getenv('MARKDOWN_FRAGMENT_CACHE_SIZE', 20000)))
+        self.hits = 0
+        self.misses = 0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        self._documents = OrderedDict()
+        # version -> {main task number: rendered section}
+        self._fragments = OrderedDict()
+        self._fragment_count = 0
+        # version -> (previous version, main task numbers the version changed)
+        self._updates = OrderedDict()
+        self._lock = threading.Lock()
 
-    def convert_to_markdown(self, data):
-        print(data)
+    def record_update(self, previous_version, version, task_numbers):
+        """
+        Records that a document version was derived from a previous one by changing some tasks, so
+        the sections of all other tasks can be reused from the previous version.
+
+        Args:
+            previous_version (hashable): The version the document was read at.
+            version (hashable): The version that was written.
+            task_numbers (iterable): The task or subtask numbers the write changed.
+        """
+        if previous_version is None or version is None or previous_version == version:
+            return
+        touched = frozenset(str(task_number).split('.')[0] for task_number in task_numbers)
+        with self._lock:
+            self._updates[version] = (previous_version, touched)
+            while len(self._updates) > self.cache_size:
+                self._updates.popitem(last=False)
+
+    def convert_to_markdown(self, data, version=None, task_number=None):
         """
         Converts JSON data to Markdown format.
 
         Args:
             data (dict): The JSON data to be converted.
+            version (hashable, optional): Version of the document the data was taken from, e.g. the
+                task file's stat signature. When given, the rendered document is cached under it.
+            task_number (hashable, optional): The task number (or task number and view) the data
+                was extracted for, part of the cache key.
 
         Returns:
             str: The converted Markdown string, or an error message in case of failure.
         """
+        cache_key = (version, task_number) if version is not None else None
+        if cache_key is not None:
+            with self._lock:
+                md_content = self._documents.get(cache_key)
+                if md_content is not None:
+                    self._documents.move_to_end(cache_key)
+                    self.hits += 1
+                    return md_content
+                self.misses += 1
+
         try:
-            md_content = data.get("overview", "") + "\n\n"
-
-            # Check if the data contains a single subtask or multiple tasks
-            if 'tasks' in data:
-                for task_key, task_info in data["tasks"].items():
-                    if 'description' in task_info:
-                        # Main task with description and subtasks
-                        md_content += f"## [{'x' if task_info['status'] else ' '}] {task_key}. {task_info['description']}\n"
-                        for subtask_key, subtask_info in task_info.items():
-                            if isinstance(subtask_info, dict) and 'task' in subtask_info:
-                                md_content += f"- [{'x' if subtask_info['status'] else ' '}] {subtask_key}. {subtask_info['task']}\n"
-                        md_content += "\n"
-                    else:
-                        # Individual subtask without a main task
-                        md_content += f"- [{'x' if task_info['status'] else ' '}] {task_key}. {task_info['task']}\n"
-            else:
-                # Fallback for unexpected data format
-                md_content += "Error: Unrecognized data format for Markdown conversion.\n"
-
-            return md_content
+            # Sections are only cached for whole documents; single task views are small
+            md_content = self._render(data, version if task_number is None else None)
         except Exception as e:
             logging.error(f"Error converting JSON to Markdown: {e}")
             return "Error in Markdown conversion"
 
+        if cache_key is not None and self.cache_size > 0:
+            with self._lock:
+                self._documents[cache_key] = md_content
+                self._documents.move_to_end(cache_key)
+                while len(self._documents) > self.cache_size:
+                    self._documents.popitem(last=False)
+        return md_content
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the size of the document and fragment caches.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "documents": len(self._documents),
+                "fragment_hits": self.fragment_hits,
+                "fragment_misses": self.fragment_misses,
+                "fragments": self._fragment_count
+            }
+
+    def _render(self, data, version=None):
+        """
+        Renders a task document, reusing cached sections of unchanged main tasks if the version of
+        the document is known.
+        """
+        parts = [data.get("overview", ""), "\n\n"]
+
+        # Check if the data contains a single subtask or multiple tasks
+        if 'tasks' in data:
+            fragments = self._cached_fragments(version) if version is not None else {}
+            rendered = 0
+            for task_key, task_info in data["tasks"].items():
+                if 'description' in task_info:
+                    # Main task with description and subtasks
+                    fragment = fragments.get(task_key)
+                    if fragment is None:
+                        fragment = fragments[task_key] = self._render_task(task_key, task_info)
+                        rendered += 1
+                    parts.append(fragment)
+                else:
+                    # Individual subtask without a main task
+                    parts.append(f"- [{_checkbox(task_info['status'])}] {task_key}. {task_info['task']}\n")
+            if version is not None:
+                self._store_fragments(version, fragments, rendered)
+        else:
+            # Fallback for unexpected data format
+            parts.append("Error: Unrecognized data format for Markdown conversion.\n")
+
+        return ''.join(parts)
+
+    def _render_task(self, task_key, task_info):
+        """
+        Renders the section of a main task and its subtasks.
+        """
+        lines = [f"## [{_checkbox(task_info['status'])}] {task_key}. {task_info['description']}\n"]
+        for subtask_key, subtask_info in task_info.items():
+            if isinstance(subtask_info, dict) and 'task' in subtask_info:
+                lines.append(f"- [{_checkbox(subtask_info['status'])}] {subtask_key}. {subtask_info['task']}\n")
+        lines.append("\n")
+        return ''.join(lines)
+
+    def _cached_fragments(self, version):
+        """
+        Returns a private copy of the sections cached for a document version. If none are, the
+        sections of the nearest earlier version with cached sections are returned, less those of
+        the tasks changed by the updates since.
+        """
+        with self._lock:
+            fragments = self._fragments.get(version)
+            if fragments is not None:
+                self._fragments.move_to_end(version)
+                return dict(fragments)
+            touched = set()
+            for _ in range(len(self._updates)):
+                if version not in self._updates:
+                    break
+                version, changed = self._updates[version]
+                touched.update(changed)
+                fragments = self._fragments.get(version)
+                if fragments is not None:
+                    fragments = dict(fragments)
+                    for task_key in touched:
+                        fragments.pop(task_key, None)
+                    return fragments
+            return {}
+
+    def _store_fragments(self, version, fragments, rendered):
+        """
+        Caches the sections of a document version, evicting the sections of the least recently used
+        versions to stay within the fragment budget.
+        """
+        with self._lock:
+            self.fragment_hits += len(fragments) - rendered
+            self.fragment_misses += rendered
+            if len(fragments) > self.fragment_cache_size:
+                return
+            previous = self._fragments.pop(version, None)
+            if previous is not None:
+                self._fragment_count -= len(previous)
+            self._fragments[version] = fragments
+            self._fragment_count += len(fragments)
+            while self._fragment_count > self.fragment_cache_size:
+                _, evicted = self._fragments.popitem(last=False)
+                self._fragment_count -= len(evicted)
+
 # Example usage:
 # converter = MarkdownConverter()
 # markdown_text = converter.convert_to_markdown(json_data)
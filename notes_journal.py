@@ -0,0 +1,190 @@
+# notes_journal.py
+"""
+NotesJournal Module
+-------------------
+Append-only mutation log for a notes file. Instead of rewriting the whole notes JSON after every
+add, update or delete, NotesManager appends one compact JSON record per mutation to
+`<notes file>.journal`. On load the notes tree is rebuilt from the snapshot plus a replay of the
+journal, and compaction periodically folds the journal back into a fresh snapshot.
+
+Records are idempotent (they carry note ids and final field values), so replaying a journal over a
+snapshot that already contains some of its records, e.g. after a crash during compaction, yields
+the same tree.
+
+Several worker processes may share a journal. Access is coordinated with an fcntl lock on
+`<notes file>.journal.lock`: loads hold it shared, appends and compaction hold it exclusively. A
+writer first replays the records other workers appended since its last read, and compaction folds
+every record in the journal, so no worker's records are lost when the journal is emptied.
+
+Classes:
+- NotesJournal: Appends, replays and truncates the journal of one notes file.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from file_handler import stat_signature
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class NotesJournal:
+    """
+    Append-only journal of note mutations.
+
+    Attributes:
+        journal_file (str): Path to the journal file.
+        lock_file (str): Path to the file locked to coordinate workers sharing the journal.
+        fsync_policy (str): 'always' fsyncs every append, 'interval' at most once per
+            `fsync_interval` seconds, 'never' leaves flushing to the operating system.
+        fsync_interval (float): Seconds between fsyncs with the 'interval' policy.
+    """
+
+    def __init__(self, notes_file, fsync_policy=None, fsync_interval=None):
+        """
+        Initializes the journal of a notes file.
+
+        Args:
+            notes_file (str): Path to the notes snapshot file.
+            fsync_policy (str, optional): Defaults to NOTES_JOURNAL_FSYNC, or 'always'.
+            fsync_interval (float, optional): Defaults to NOTES_JOURNAL_FSYNC_INTERVAL, or 1 second.
+        """
+        self.journal_file = notes_file + '.journal'
+        self.lock_file = self.journal_file + '.lock'
+        self.fsync_policy = fsync_policy or os.getenv('NOTES_JOURNAL_FSYNC', 'always')
+        if self.fsync_policy not in FSYNC_POLICIES:
+            logging.warning(f"Unknown journal fsync policy '{self.fsync_policy}', using 'always'.")
+            self.fsync_policy = 'always'
+        self.fsync_interval = fsync_interval or float(os.getenv('NOTES_JOURNAL_FSYNC_INTERVAL', 1))
+        self._last_fsync = 0.0
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def signature(self):
+        """
+        Returns the stat signature of the journal file, or None if there is no journal yet.
+        """
+        return stat_signature(self.journal_file)
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        """
+        Holds the journal's lock, shared with other threads and worker processes.
+
+        Args:
+            exclusive (bool): Take the lock exclusively, to append or compact. Shared to load.
+        """
+        with self._lock:
+            if self._depth:
+                # Already held by this thread, e.g. a compaction catching up
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._depth = 1
+                try:
+                    yield
+                finally:
+                    self._depth = 0
+            finally:
+                os.close(fd)
+
+    def append(self, records):
+        """
+        Appends mutation records to the journal with a single write. Call with the lock held
+        exclusively.
+
+        If the journal ends in a record that was only partially written before a crash, that record
+        is terminated first, so it is skipped on replay instead of swallowing the new records.
+
+        Args:
+            records (list of dict): The records to append.
+
+        Returns:
+            int: The size of the journal after the append, in bytes.
+        """
+        payload = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode('utf-8')
+        with open(self.journal_file, 'a+b') as file:
+            size = file.seek(0, os.SEEK_END)
+            if size:
+                file.seek(size - 1)
+                if file.read(1) != b'\n':
+                    logging.warning(f"Terminating incomplete trailing record in {self.journal_file}")
+                    payload = b'\n' + payload
+            if payload:
+                file.write(payload)
+                file.flush()
+                now = time.monotonic()
+                if self.fsync_policy == 'always' or (
+                        self.fsync_policy == 'interval' and now - self._last_fsync >= self.fsync_interval):
+                    os.fsync(file.fileno())
+                    self._last_fsync = now
+            return size + len(payload)
+
+    def replay(self, apply_record, offset=0):
+        """
+        Replays the records of the journal from a byte offset. Call with the lock held.
+
+        A trailing record that was only partially written before a crash is ignored.
+
+        Args:
+            apply_record (callable): Called with each record in journal order.
+            offset (int): Position to replay from, the end of the records already applied.
+
+        Returns:
+            tuple: (records replayed, offset after the last complete record).
+        """
+        try:
+            with open(self.journal_file, 'rb') as file:
+                file.seek(offset)
+                data = file.read()
+        except FileNotFoundError:
+            return 0, 0
+
+        lines = data.split(b'\n')
+        # The last element is empty if the journal ends with a newline, a torn record otherwise
+        torn = lines.pop()
+        if torn.strip():
+            logging.warning(f"Ignoring incomplete trailing record in {self.journal_file}")
+
+        replayed = 0
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.error(f"Skipping corrupt record {line_number} after offset {offset} of {self.journal_file}")
+                continue
+            apply_record(record)
+            replayed += 1
+
+        if replayed:
+            logging.info(f"Replayed {replayed} journal records from {self.journal_file}")
+        return replayed, offset + len(data) - len(torn)
+
+    def size(self):
+        """
+        Returns the size of the journal in bytes, 0 if there is no journal.
+        """
+        signature = self.signature()
+        return signature[1] if signature else 0
+
+    def truncate(self):
+        """
+        Empties the journal after its records were folded into a snapshot. Call with the lock held
+        exclusively.
+        """
+        try:
+            os.unlink(self.journal_file)
+        except FileNotFoundError:
+            pass
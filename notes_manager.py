@@ -2,7 +2,9 @@
 import json
 import logging
 import uuid
-from type_hierarchy_validator import TypeHierarchyValidator, parse_identifier
+from type_hierarchy_validator import TypeHierarchyValidator, parse_identifier, format_identifier
+from file_handler import stat_signature, atomic_write_json
+from notes_search import NotesSearchIndex, make_snippet
 import datetime
 
 class NotesManager:
@@ -13,19 +15,66 @@ class NotesManager:
         validator (TypeHierarchyValidator): Validator for note type hierarchy.
         notes_file (str): Path to the notes JSON file.
         notes_data (dict): Data structure containing notes.
+        signature (tuple): Stat signature of the notes file as last loaded or saved by this manager.
+        journal (NotesJournal): Mutation journal, or None to rewrite the notes file on every change.
+        journal_signature (tuple): Stat signature of the journal as last replayed or appended to.
+        journal_offset (int): Byte offset up to which the journal has been applied.
+        journal_records (int): Number of journal records applied on top of the snapshot.
+
+    Every note is indexed by its ID, so notes can be looked up, updated and deleted in constant time
+    without walking the hierarchy; the identifier passed along with a note ID is optional. Nodes are
+    additionally indexed by type together with the number of notes in their subtree, so notes can be
+    queried by type and/or subtree without scanning the whole tree. Notes at the root of the tree
+    are of type 'project'. A full-text index over note content is built on the first search and then
+    kept up to date by every mutation.
     """
 
-    def __init__(self, notes_file, validator):
+    def __init__(self, notes_file, validator, journal=None):
         """
         Initializes the NotesManager with the notes file path and a hierarchy validator.
         
         Args:
             notes_file (str): Path to the notes JSON file.
             validator (TypeHierarchyValidator): Validator for note type hierarchy.
+            journal (NotesJournal, optional): Journal that mutations are appended to. When given,
+                the notes are loaded as the snapshot file plus a replay of the journal.
         """
         self.validator = validator
         self.notes_file = notes_file
-        self.notes_data = self._load_notes_data(notes_file)
+        self.journal = journal
+        self.journal_signature = None
+        self.journal_offset = 0
+        self.journal_records = 0
+        if journal is not None:
+            # Shared with other workers' loads, excluded while they append or compact
+            with journal.locked(exclusive=False):
+                self._load()
+        else:
+            self._load()
+
+    def _load(self):
+        """
+        Loads the notes snapshot and replays the journal over it. Call with the journal lock held.
+        """
+        self.signature = stat_signature(self.notes_file)
+        self.notes_data = self._load_notes_data(self.notes_file)
+        self._build_indexes()
+        if self.journal is not None:
+            self.journal_records, self.journal_offset = self.journal.replay(self._apply_record)
+            self.journal_signature = self.journal.signature()
+
+    def _catch_up(self):
+        """
+        Applies the journal records other workers appended since this manager last read the
+        journal, or reloads entirely if another worker compacted the journal into a new snapshot.
+        Call with the journal lock held exclusively.
+        """
+        if stat_signature(self.notes_file) != self.signature or self.journal.size() < self.journal_offset:
+            logging.info(f"Notes of {self.notes_file} were compacted by another worker, reloading.")
+            self._load()
+            return
+        replayed, self.journal_offset = self.journal.replay(self._apply_record, self.journal_offset)
+        self.journal_records += replayed
 
     def _load_notes_data(self, notes_file):
         """
@@ -47,6 +96,85 @@ class NotesManager:
             logging.error(f"Error loading notes data: {e}")
             raise
 
+    def _build_indexes(self):
+        """
+        Builds the note and node indexes from the loaded notes data:
+
+        - the note index maps every note ID to (node, path), where path is a tuple of (type, name) pairs;
+        - the node index maps every node path to its node;
+        - the type index maps every type to the set of paths of nodes of that type;
+        - subtree counts map every node path to the number of notes per type in its subtree.
+        """
+        self._note_index = {}
+        self._nodes = {}
+        self._type_index = {}
+        self._subtree_counts = {}
+        self._search_index = None
+        stack = [(self.notes_data, ())]
+        while stack:
+            node, path = stack.pop()
+            self._index_node(path, node)
+            for key, value in node.items():
+                if not isinstance(value, dict):
+                    continue
+                if key == 'notes':
+                    for note_id in value:
+                        self._note_index[note_id] = (node, path)
+                        self._count_note(path, 1)
+                    continue
+                for name, child in value.items():
+                    if isinstance(child, dict):
+                        stack.append((child, path + ((key, name),)))
+
+    def _index_node(self, path, node):
+        """
+        Adds a node to the node and type indexes.
+
+        Args:
+            path (tuple): The (type, name) pairs leading to the node.
+            node (dict): The node.
+        """
+        self._nodes[path] = node
+        self._type_index.setdefault(_node_type(path), set()).add(path)
+
+    def _count_note(self, path, delta):
+        """
+        Adjusts the per-type note counts of a node's subtree and of all its ancestors' subtrees.
+
+        Args:
+            path (tuple): The path of the node holding the note.
+            delta (int): 1 when a note was added, -1 when one was removed.
+        """
+        note_type = _node_type(path)
+        for depth in range(len(path) + 1):
+            counts = self._subtree_counts.setdefault(path[:depth], {})
+            counts[note_type] = counts.get(note_type, 0) + delta
+
+    def _locate_note(self, note_id):
+        """
+        Looks up the node holding a note.
+
+        Args:
+            note_id (str): The unique ID of the note.
+
+        Returns:
+            tuple or None: (node, path) of the note, or None if there is no such note.
+        """
+        return self._note_index.get(note_id)
+
+    def get_note_identifier(self, note_id):
+        """
+        Returns the hierarchical identifier of a note.
+
+        Args:
+            note_id (str): The unique ID of the note.
+
+        Returns:
+            str or None: The identifier, e.g. '<file:src/main.py>/<class:MyClass>', or None.
+        """
+        located = self._locate_note(note_id)
+        return format_identifier(located[1]) if located else None
+
     def add_note(self, identifier, content, api_key):
         """
         Adds a new note to the notes structure based on the given identifier.
@@ -57,115 +185,271 @@ class NotesManager:
             api_key (str): The API key associated with the note.
 
         Returns:
-            bool: True if the note is added successfully, False otherwise.
+            tuple: (True, note ID) if the note is added successfully, (False, None) if the
+                identifier does not adhere to the type hierarchy.
         """
-        
-        parsed_identifier = parse_identifier(identifier)
-        current_level = self.notes_data
+        if self.validator is not None and not self.validator.validate_hierarchy(identifier):
+            logging.warning(f"Rejected note with invalid identifier: {identifier}")
+            return False, None
 
-        for type, name in parsed_identifier:
-            current_level = current_level.setdefault(type, {}).setdefault(name, {})
+        parsed_identifier = parse_identifier(identifier)
 
         new_note_id = self._generate_unique_id()
         created_at = datetime.datetime.now().isoformat()
-        current_level['notes'][new_note_id] = {
-            "content": content,
-            "created_at": created_at,
-            "created_by": api_key
-        }
-
-        self.save_notes_structure()
+        self._commit([{
+            "op": "add",
+            "path": parsed_identifier,
+            "id": new_note_id,
+            "note": {
+                "content": content,
+                "created_at": created_at,
+                "created_by": api_key
+            }
+        }])
         return True, new_note_id
 
     def update_note(self, note_id, identifier, updates):
         """
-        Updates an existing note based on its ID and identifier.
+        Updates an existing note based on its ID.
 
         Args:
             note_id (str): The unique ID of the note to update.
-            identifier (str): The hierarchical identifier of the note.
+            identifier (str): The hierarchical identifier of the note. Optional, the note is found by ID.
             updates (dict): A dictionary containing the updated fields.
 
         Returns:
             bool: True if the update is successful, False otherwise.
         """
-        parsed_identifier = parse_identifier(identifier)
-        current_level = self.notes_data
-
-        for type, name in parsed_identifier:
-            current_level = current_level.get(type, {}).get(name, {})
-
-        note_to_update = current_level.get("notes", {}).get(note_id)
-        if not note_to_update:
+        located = self._locate_note(note_id)
+        if not located:
             logging.warning(f"Note with ID {note_id} not found.")
             return False
 
-        note_to_update.update(updates['updates'])
-        note_to_update["updated_at"] = datetime.datetime.now().isoformat()
-
-        self.save_notes_structure()
+        fields = dict(updates['updates'])
+        fields["updated_at"] = datetime.datetime.now().isoformat()
+        self._commit([{"op": "update", "path": list(located[1]), "id": note_id, "fields": fields}])
         logging.info(f"Note with ID {note_id} updated successfully.")
         return True
 
     def delete_note(self, note_id, identifier):
         """
-        Deletes a note based on its ID and identifier.
+        Deletes a note based on its ID.
 
         Args:
             note_id (str): The unique ID of the note to delete.
-            identifier (str): The hierarchical identifier of the note.
+            identifier (str): The hierarchical identifier of the note. Optional, the note is found by ID.
 
         Returns:
             bool: True if the deletion is successful, False otherwise.
         """
-        parsed_identifier = parse_identifier(identifier)
-        current_level = self.notes_data
-
-        for type, name in parsed_identifier:
-            current_level = current_level.get(type, {}).get(name, {})
-
-        note_to_delete = current_level.get("notes", {}).get(note_id)
-        if not note_to_delete:
+        located = self._locate_note(note_id)
+        if not located:
             logging.warning(f"Note with ID {note_id} not found.")
             return False
 
-        note_to_delete = current_level.get('notes', {}).get(note_id)
-
-        if note_id not in current_level.get('notes', {}):
-            logging.warning(f"Note with ID {note_id} not found.")
-            return False
-
-        del current_level['notes'][note_id]
-        self.save_notes_structure()
+        self._commit([{"op": "delete", "path": list(located[1]), "id": note_id}])
         logging.info(f"Note with ID {note_id} deleted successfully.")
         return True
 
-    def get_note_by_id(self, note_id, identifier):
+    def apply_batch(self, operations, api_key):
         """
-        Retrieves a note by its ID and identifier.
+        Validates and applies a batch of add, update and delete operations atomically: either all
+        operations are applied and persisted with a single write, or none is.
+
+        Each operation is a dict with an 'op' of 'add' (with 'identifier' and 'content'), 'update'
+        (with 'note_id' and an 'updates' dict) or 'delete' (with 'note_id').
 
         Args:
-            note_id (str): The unique ID of the note.
-            identifier (str): The hierarchical identifier of the note.
+            operations (list of dict): The operations, applied in order.
+            api_key (str): The API key associated with added notes.
 
         Returns:
-            dict or None: The note if found, None otherwise.
+            tuple: (applied, results), where results holds one dict per operation with its 'index',
+                'op', 'status' and either the affected 'note_id' or an 'error'.
         """
-        parsed_identifier = parse_identifier(identifier)
-        current_level = self.notes_data
+        records = []
+        results = []
+        deleted = set()
+        created_at = datetime.datetime.now().isoformat()
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            result = {'index': index, 'op': op}
+            results.append(result)
+            if op == 'add':
+                identifier = operation.get('identifier', '')
+                if not isinstance(identifier, str) or (
+                        self.validator is not None and not self.validator.validate_hierarchy(identifier)):
+                    result['error'] = f"Invalid identifier: {identifier}"
+                    continue
+                note_id = self._generate_unique_id()
+                result['note_id'] = note_id
+                records.append({
+                    "op": "add",
+                    "path": parse_identifier(identifier),
+                    "id": note_id,
+                    "note": {
+                        "content": operation.get('content', ''),
+                        "created_at": created_at,
+                        "created_by": api_key
+                    }
+                })
+            elif op in ('update', 'delete'):
+                note_id = operation.get('note_id')
+                result['note_id'] = note_id
+                located = self._locate_note(note_id) if isinstance(note_id, str) else None
+                if not located or note_id in deleted:
+                    result['error'] = f"Note with ID {note_id} not found"
+                    continue
+                if op == 'delete':
+                    deleted.add(note_id)
+                    records.append({"op": "delete", "path": list(located[1]), "id": note_id})
+                    continue
+                updates = operation.get('updates')
+                if not isinstance(updates, dict) or not updates:
+                    result['error'] = "An 'updates' object is required"
+                    continue
+                fields = dict(updates)
+                fields["updated_at"] = created_at
+                records.append({"op": "update", "path": list(located[1]), "id": note_id, "fields": fields})
+            else:
+                result['error'] = f"Unknown operation: {op}"
+
+        if any('error' in result for result in results):
+            for result in results:
+                result['status'] = 'error' if 'error' in result else 'skipped'
+                if result['op'] == 'add':
+                    result.pop('note_id', None)
+            logging.warning(f"Rejected batch of {len(operations)} note operations.")
+            return False, results
+
+        self._commit(records)
+        for result in results:
+            result['status'] = 'ok'
+        logging.info(f"Applied batch of {len(records)} note operations.")
+        return True, results
+
+    def _commit(self, records):
+        """
+        Applies mutation records to the in-memory notes and persists them with a single write,
+        either by appending them to the journal or, without a journal, by rewriting the notes file.
+
+        Args:
+            records (list of dict): The mutation records ('add', 'update' or 'delete').
+        """
+        if self.journal is None:
+            for record in records:
+                self._apply_record(record)
+            self.save_notes_structure()
+            return
+
+        with self.journal.locked():
+            self._catch_up()
+            for record in records:
+                self._apply_record(record)
+            self.journal_offset = self.journal.append(records)
+            self.journal_records += len(records)
+            self.journal_signature = self.journal.signature()
+
+    def _apply_record(self, record):
+        """
+        Applies a mutation record to the in-memory notes and the note index. Applying a record
+        more than once leaves the notes in the same state, which keeps journal replay safe.
+
+        Args:
+            record (dict): The mutation record.
+        """
+        path = tuple((type, name) for type, name in record["path"])
+        current_level = self._nodes.get(path)
+        if current_level is None:
+            current_level = self.notes_data
+            for depth, (type, name) in enumerate(path, start=1):
+                current_level = current_level.setdefault(type, {}).setdefault(name, {})
+                if path[:depth] not in self._nodes:
+                    self._index_node(path[:depth], current_level)
+        notes = current_level.setdefault("notes", {})
+
+        if record["op"] == "add":
+            if record["id"] not in notes:
+                self._count_note(path, 1)
+            notes[record["id"]] = dict(record["note"])
+            self._note_index[record["id"]] = (current_level, path)
+            if self._search_index is not None:
+                self._search_index.add(record["id"], notes[record["id"]].get("content", ""))
+        elif record["op"] == "update":
+            if record["id"] in notes:
+                notes[record["id"]].update(record["fields"])
+                if self._search_index is not None and "content" in record["fields"]:
+                    self._search_index.add(record["id"], notes[record["id"]].get("content", ""))
+        elif record["op"] == "delete":
+            if notes.pop(record["id"], None) is not None:
+                self._note_index.pop(record["id"], None)
+                self._count_note(path, -1)
+                if self._search_index is not None:
+                    self._search_index.remove(record["id"])
+        else:
+            logging.error(f"Unknown notes journal operation: {record['op']}")
+
+    def is_stale(self):
+        """
+        Checks whether the notes file or its journal changed on disk since this manager last
+        loaded or wrote them, e.g. because they were edited externally.
+
+        Returns:
+            bool: True if the in-memory notes may be out of date.
+        """
+        if stat_signature(self.notes_file) != self.signature:
+            return True
+        return self.journal is not None and self.journal.signature() != self.journal_signature
+
+    def compact(self):
+        """
+        Folds the journal into a fresh snapshot of the notes file and empties the journal.
+        The journal is locked exclusively and records appended by other workers are applied first,
+        so the snapshot holds every record of the journal it replaces. The snapshot is replaced
+        atomically, so a crash leaves either the old snapshot plus the full journal or the new
+        snapshot plus a journal whose records it already contains.
 
-        for type, name in parsed_identifier:
-            current_level = current_level.get(type, {}).get(name, {})
+        Returns:
+            int: The number of journal records that were folded.
+        """
+        if self.journal is None:
+            return 0
+        with self.journal.locked():
+            if self.journal.signature() is None:
+                return 0
+            self._catch_up()
+            folded = self.journal_records
+            atomic_write_json(self.notes_file, self.notes_data, indent=4)
+            self.signature = stat_signature(self.notes_file)
+            self.journal.truncate()
+            self.journal_signature = None
+            self.journal_offset = 0
+            self.journal_records = 0
+        logging.info(f"Compacted {folded} journal records into {self.notes_file}")
+        return folded
+
+    def get_note_by_id(self, note_id, identifier=None):
+        """
+        Retrieves a note by its ID.
 
-        if note_id not in current_level.get('notes',{}):
+        Args:
+            note_id (str): The unique ID of the note.
+            identifier (str, optional): The hierarchical identifier of the note. Not needed, the
+                note is found by ID.
+
+        Returns:
+            dict or None: The note if found, None otherwise.
+        """
+        located = self._locate_note(note_id)
+        if not located:
             logging.warning(f"Note with ID {note_id} not found.")
             return False
 
-        return current_level.get('notes',{}).get(note_id)
+        return located[0]['notes'][note_id]
 
     def get_notes_by_note_type(self, identifier):
         """
-        Retrieves notes based on the note type specified in the identifier.
+        Retrieves all notes of the note type specified in the identifier, at any depth.
 
         Args:
             identifier (str): The hierarchical identifier specifying the note type.
@@ -174,18 +458,113 @@ class NotesManager:
             dict: A dictionary of notes of the specified type.
         """
         note_type = identifier.split(':')[0].lower()
-        return self.notes_data.get(note_type, {}).get('notes', {})
+        notes = {}
+        for path in self._type_index.get(note_type, ()):
+            notes.update(self._nodes[path].get('notes', {}))
+        return notes
+
+    def query_notes(self, note_type=None, under=None):
+        """
+        Retrieves notes by type, by subtree, or by type within a subtree.
+
+        Args:
+            note_type (str, optional): Only return notes of nodes of this type.
+            under (str, optional): Hierarchical identifier of the subtree to search, including its root.
+
+        Returns:
+            dict or None: Mapping of note ID to the note plus its 'identifier', or None if the
+                subtree does not exist.
+        """
+        under_path = tuple(parse_identifier(under)) if under else ()
+        if under_path not in self._nodes:
+            return None
+
+        if note_type is not None:
+            paths = [path for path in self._type_index.get(note_type.lower(), ())
+                     if path[:len(under_path)] == under_path]
+        else:
+            paths = []
+            stack = [(self._nodes[under_path], under_path)]
+            while stack:
+                node, path = stack.pop()
+                paths.append(path)
+                for key, value in node.items():
+                    if key != 'notes' and isinstance(value, dict):
+                        stack.extend((child, path + ((key, name),)) for name, child in value.items()
+                                     if isinstance(child, dict))
+
+        notes = {}
+        for path in paths:
+            node_notes = self._nodes[path].get('notes', {})
+            if node_notes:
+                identifier = format_identifier(path)
+                for note_id, note in node_notes.items():
+                    notes[note_id] = dict(note, identifier=identifier)
+        return notes
+
+    def get_note_counts(self, under=None):
+        """
+        Returns note counts for the whole project or for a subtree.
+
+        Args:
+            under (str, optional): Hierarchical identifier of the subtree to count, including its root.
+
+        Returns:
+            dict or None: {'total': int, 'by_type': {type: int}}, or None if the subtree does not exist.
+        """
+        under_path = tuple(parse_identifier(under)) if under else ()
+        if under_path not in self._nodes:
+            return None
+        by_type = {note_type: count for note_type, count in self._subtree_counts.get(under_path, {}).items()
+                   if count}
+        return {'total': sum(by_type.values()), 'by_type': by_type}
+
+    def search_notes(self, query, prefix=False, offset=0, limit=20):
+        """
+        Searches note content using the full-text index.
+
+        Args:
+            query (str): The search query; every term must match.
+            prefix (bool): Treat every query term as a prefix.
+            offset (int): Number of ranked results to skip.
+            limit (int): Maximum number of results to return.
+
+        Returns:
+            tuple: (total number of matches, list of results), where each result holds the note's
+                'note_id', 'identifier', 'score' and a content 'snippet'.
+        """
+        if self._search_index is None:
+            self._search_index = NotesSearchIndex()
+            for note_id, (node, path) in self._note_index.items():
+                self._search_index.add(note_id, node['notes'][note_id].get('content', ''))
+
+        matches = self._search_index.search(query, prefix)
+        results = []
+        for note_id, score in matches[offset:offset + limit]:
+            node, path = self._note_index[note_id]
+            results.append({
+                'note_id': note_id,
+                'identifier': format_identifier(path),
+                'score': round(score, 4),
+                'snippet': make_snippet(node['notes'][note_id].get('content', ''), query, prefix),
+            })
+        return len(matches), results
 
     def save_notes_structure(self):
         """
         Saves the current notes structure back to the file.
+
+        Raises:
+            Exception: If the file cannot be written. The in-memory notes then no longer match the
+                file, so the caller must discard this manager.
         """
         try:
-            with open(self.notes_file, 'w') as file:
-                json.dump(self.notes_data, file, indent=4)
+            atomic_write_json(self.notes_file, self.notes_data, indent=4)
+            self.signature = stat_signature(self.notes_file)
             logging.info("Notes structure saved successfully.")
         except Exception as e:
             logging.error(f"Failed to save notes structure: {e}")
+            raise
 
     def _generate_unique_id(self):
         """
@@ -209,3 +588,10 @@ class NotesManager:
         parts = identifier.split('/')
         formatted_parts = [f"{part.split(':')[0].capitalize()}: {part.split(':')[1]}" for part in parts]
         return "# Note for " + ', '.join(formatted_parts)
+
+
+def _node_type(path):
+    """
+    Returns the type of the node at a path; the root of the notes tree is the project.
+    """
+    return path[-1][0] if path else 'project'
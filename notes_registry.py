@@ -0,0 +1,323 @@
+# notes_registry.py
+"""
+NotesRegistry Module
+--------------------
+Keeps one loaded NotesManager per project resident in memory, so note requests no longer re-parse
+the whole notes file. Each access compares the notes file's stat signature with the one the manager
+last loaded or saved, which picks up external edits. Idle projects are evicted in least recently
+used order once the number of resident projects or their combined file size exceeds the budget.
+
+With NOTES_PERSISTENCE=journal, mutations are appended to a per-project NotesJournal instead of
+rewriting the notes file, and a background thread periodically compacts the journals of resident
+projects into fresh snapshots. Compaction rewrites the notes file without changing its content, so
+the file's new signature is adopted by the revision tracker without bumping the revision.
+
+Classes:
+- NotesRegistry: Process-wide cache of NotesManager instances with per-project locking.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from notes_manager import NotesManager
+from notes_journal import NotesJournal
+
+
+class _ProjectLock:
+    """
+    The lock of one project and the number of threads holding or waiting for it.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users = 0
+
+
+class NotesRegistry:
+    """
+    Process-wide registry of resident NotesManager instances.
+
+    Attributes:
+        notes_dir (str): Directory containing the `<project_name>.json` notes files.
+        validator (TypeHierarchyValidator): Validator handed to every NotesManager.
+        max_projects (int): Maximum number of resident projects.
+        max_bytes (int): Approximate memory budget, measured as the combined size of the notes files.
+        persistence (str): 'snapshot' rewrites the notes file on every mutation, 'journal' appends
+            mutations to a journal that is compacted in the background.
+        compact_interval (float): Seconds between background compaction passes in journal mode.
+        revisions (RevisionTracker): Tracker told about compactions, or None.
+    """
+
+    def __init__(self, notes_dir, validator, max_projects=None, max_bytes=None, persistence=None,
+                 compact_interval=None, revisions=None):
+        """
+        Initializes an empty registry.
+
+        Args:
+            notes_dir (str): Directory containing the notes files.
+            validator (TypeHierarchyValidator): Validator for note type hierarchy.
+            max_projects (int, optional): Defaults to NOTES_CACHE_MAX_PROJECTS, or 32.
+            max_bytes (int, optional): Defaults to NOTES_CACHE_MAX_BYTES, or 256 MiB.
+            persistence (str, optional): Defaults to NOTES_PERSISTENCE, or 'snapshot'.
+            compact_interval (float, optional): Defaults to NOTES_COMPACT_INTERVAL, or 30 seconds.
+            revisions (RevisionTracker, optional): Revision tracker of the notes files.
+        """
+        self.notes_dir = notes_dir
+        self.validator = validator
+        self.max_projects = max_projects or int(os.getenv('NOTES_CACHE_MAX_PROJECTS', 32))
+        self.max_bytes = max_bytes or int(os.getenv('NOTES_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+        self.persistence = persistence or os.getenv('NOTES_PERSISTENCE', 'snapshot')
+        self.compact_interval = compact_interval or float(os.getenv('NOTES_COMPACT_INTERVAL', 30))
+        self.revisions = revisions
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._managers = OrderedDict()
+        self._project_locks = {}
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    @contextmanager
+    def open(self, project_name):
+        """
+        Yields the resident NotesManager of a project while holding the project's lock.
+
+        Reads and mutations of one project are serialized, so concurrent requests cannot lose
+        each other's updates. Different projects do not block each other. If the block raises, the
+        manager is dropped so a half-applied change is not served from memory.
+
+        Args:
+            project_name (str): The name of the project.
+
+        Yields:
+            NotesManager: The loaded notes of the project.
+
+        Raises:
+            Exception: If the notes file cannot be loaded.
+        """
+        with self._project_lock(project_name):
+            manager = self._resident_manager(project_name)
+            try:
+                yield manager
+            except Exception:
+                with self._lock:
+                    if self._managers.get(project_name) is manager:
+                        del self._managers[project_name]
+                raise
+
+    def invalidate(self, project_name):
+        """
+        Drops a project so that its notes file is re-read on next access.
+
+        Args:
+            project_name (str): The name of the project.
+        """
+        with self._project_lock(project_name):
+            with self._lock:
+                self._managers.pop(project_name, None)
+
+    def stats(self):
+        """
+        Returns the registry counters.
+
+        Returns:
+            dict: Hits, loads, evictions, the number of resident projects and their file size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'projects': len(self._managers),
+                'bytes': self._resident_bytes(),
+            }
+
+    @contextmanager
+    def _project_lock(self, project_name):
+        """
+        Holds the lock serializing access to a project, creating it on first use. The lock counts
+        the threads holding or waiting for it and is dropped once it is unused and the project is
+        no longer resident, so evicted projects do not leave locks behind.
+        """
+        with self._lock:
+            project_lock = self._project_locks.get(project_name)
+            if project_lock is None:
+                project_lock = self._project_locks[project_name] = _ProjectLock()
+            project_lock.users += 1
+        project_lock.lock.acquire()
+        try:
+            yield
+        finally:
+            self._release(project_name, project_lock)
+
+    def _release(self, project_name, project_lock):
+        """
+        Releases a project's lock, dropping it if it is unused and the project is not resident.
+        """
+        project_lock.lock.release()
+        with self._lock:
+            project_lock.users -= 1
+            if not project_lock.users and project_name not in self._managers:
+                self._project_locks.pop(project_name, None)
+
+    def _notes_file(self, project_name):
+        """
+        Returns the path of a project's notes file.
+        """
+        return os.path.join(self.notes_dir, f"{project_name}.json")
+
+    def _resident_manager(self, project_name):
+        """
+        Returns the resident manager of a project, (re)loading it if the notes file changed.
+        Must be called with the project's lock held.
+
+        Args:
+            project_name (str): The name of the project.
+
+        Returns:
+            NotesManager: The loaded notes of the project.
+        """
+        notes_file = self._notes_file(project_name)
+        with self._lock:
+            manager = self._managers.get(project_name)
+        if manager is not None and not manager.is_stale():
+            with self._lock:
+                self._managers.move_to_end(project_name)
+                self.hits += 1
+            return manager
+
+        if manager is not None:
+            logging.info(f"Notes file changed on disk, reloading: {notes_file}")
+        journal = None
+        if self.persistence == 'journal':
+            journal = NotesJournal(notes_file)
+            self._start_compactor()
+        manager = NotesManager(notes_file, self.validator, journal)
+
+        with self._lock:
+            self.loads += 1
+            self._managers[project_name] = manager
+            evicted = self._evict(keep=project_name)
+        self._fold_evicted(evicted)
+        return manager
+
+    def compact(self, project_name=None):
+        """
+        Compacts the journals of resident projects into fresh snapshots.
+
+        Args:
+            project_name (str, optional): Only compact this project.
+
+        Returns:
+            int: The number of journal records folded.
+        """
+        with self._lock:
+            project_names = [project_name] if project_name else list(self._managers)
+        folded = 0
+        for name in project_names:
+            with self._project_lock(name):
+                with self._lock:
+                    manager = self._managers.get(name)
+                if manager is None:
+                    continue
+                try:
+                    folded += self._compact_manager(manager)
+                except Exception as e:
+                    logging.error(f"Failed to compact notes journal of project '{name}': {e}")
+        return folded
+
+    def _compact_manager(self, manager):
+        """
+        Compacts a manager's journal and lets the revision tracker adopt the rewritten notes file.
+        Must be called with the project's lock held.
+
+        Returns:
+            int: The number of journal records folded.
+        """
+        folded = manager.compact()
+        if folded and self.revisions is not None:
+            self.revisions.adopt(manager.notes_file)
+        return folded
+
+    def _start_compactor(self):
+        """
+        Starts the background compaction thread, once per registry.
+        """
+        with self._lock:
+            if self._compactor is not None:
+                return
+            self._compactor = threading.Thread(target=self._compact_periodically, name='notes-compactor',
+                                               daemon=True)
+            self._compactor.start()
+
+    def _compact_periodically(self):
+        """
+        Body of the background compaction thread.
+        """
+        while True:
+            time.sleep(self.compact_interval)
+            self.compact()
+
+    def _resident_bytes(self):
+        """
+        Returns the combined notes file size of the resident projects.
+        """
+        return sum(manager.signature[1] for manager in self._managers.values() if manager.signature)
+
+    def _evict(self, keep):
+        """
+        Evicts least recently used projects while over budget. Projects that are currently in use
+        are skipped. Must be called with the registry lock held.
+
+        Evicted projects with a journal still need it folded into their snapshot. Their locks are
+        taken here and they are returned, to be compacted by _fold_evicted once the registry lock
+        is released, so an eviction does not stall access to other projects.
+
+        Args:
+            keep (str): The project that was just loaded and must stay resident.
+
+        Returns:
+            list: (project name, manager, project lock) of evicted projects to compact.
+        """
+        evicted = []
+        for project_name in list(self._managers):
+            if len(self._managers) <= self.max_projects and self._resident_bytes() <= self.max_bytes:
+                break
+            if project_name == keep:
+                continue
+            project_lock = self._project_locks.get(project_name)
+            if project_lock is not None and project_lock.users:
+                continue
+            manager = self._managers.pop(project_name)
+            self.evictions += 1
+            logging.info(f"Evicted notes of project '{project_name}' from the registry.")
+            if manager.journal is None:
+                # The project is unused, so its lock entry can go with it
+                self._project_locks.pop(project_name, None)
+                continue
+            if project_lock is None:
+                project_lock = self._project_locks[project_name] = _ProjectLock()
+            # Unused, so this cannot block; it keeps the project from being reloaded mid-compaction
+            project_lock.users += 1
+            project_lock.lock.acquire()
+            evicted.append((project_name, manager, project_lock))
+        return evicted
+
+    def _fold_evicted(self, evicted):
+        """
+        Compacts the journals of evicted projects, rather than replaying them on the next load,
+        and releases their locks. Must be called without the registry lock held.
+
+        Args:
+            evicted (list): As returned by _evict.
+        """
+        for project_name, manager, project_lock in evicted:
+            try:
+                self._compact_manager(manager)
+            except Exception as e:
+                logging.error(f"Failed to compact notes journal of evicted project '{project_name}': {e}")
+            finally:
+                self._release(project_name, project_lock)
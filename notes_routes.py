@@ -3,15 +3,23 @@
 Blueprint Initialization: Initializes a Flask Blueprint for managing note-related routes.
 Validator and Authenticator Initialization: Sets up instances of TypeHierarchyValidator and APIAuthenticator for use in the routes.
 Route Functions: Each route corresponds to an operation (add, update, delete, retrieve) on notes. They interact with the NotesManager class to perform the required actions.
+Notes Registry: NotesManager instances stay resident per project in a NotesRegistry, which reloads them when the notes file changes on disk and serializes access per project.
 Error Handling: Each route includes a try-except block to handle potential exceptions and log errors.
 Authentication: The @api_auth.require_api_key decorator ensures that each route is protected by API key authentication.
 JSON Responses: Responses are returned as JSON, with appropriate HTTP status codes.
+Change Feed: Note mutations are published to the project's change feed, which clients follow through /changes.
+Conditional Requests: GET responses carry an ETag derived from the revision of the project's notes, and a matching If-None-Match is answered with 304 before the query runs. Mutations honour If-Match and answer 412 if the client's revision is stale.
 """
-from flask import Blueprint, request, jsonify
-from notes_manager import NotesManager
+from flask import Blueprint, request, jsonify, g
+from notes_registry import NotesRegistry
 from type_hierarchy_validator import TypeHierarchyValidator
-from api_authenticator import APIAuthenticator
+from api_authenticator import api_auth_instance
+from conditional_requests import not_modified, with_etag, revision_etag, precondition_failed
+from revisions import revision_tracker
+from change_feed import change_feed, changes_response
 import logging
+import os
+import time
 
 # Initialize Flask Blueprint for notes routes
 notes_blueprint = Blueprint('notes_routes', __name__)
@@ -19,8 +27,51 @@ notes_blueprint = Blueprint('notes_routes', __name__)
 # Initialize TypeHierarchyValidator
 validator = TypeHierarchyValidator('./config/type_hierarchy.json')
 
-# API Authenticator instance
-api_auth = APIAuthenticator()
+# Resident NotesManager instances, one per project
+notes_registry = NotesRegistry('./notes', validator, revisions=revision_tracker)
+
+# Maximum number of operations accepted by a single batch request
+max_batch_operations = int(os.getenv('NOTES_BATCH_MAX_OPERATIONS', 500))
+
+# Shared API Authenticator instance, so all blueprints use the same key cache
+api_auth = api_auth_instance
+
+
+def _publish_note_change(project_name, notes_manager, op, note_id, revision):
+    """
+    Publishes a note mutation to the project's change feed. Added and updated notes are sent
+    with their content and identifier.
+
+    Args:
+        project_name (str): The name of the project.
+        notes_manager (NotesManager): The project's resident NotesManager, with the project lock held.
+        op (str): 'add', 'update' or 'delete'.
+        note_id (str): The ID of the note.
+        revision (int): The revision of the notes after the mutation.
+    """
+    data = {"note_id": note_id, "revision": revision}
+    if op != 'delete':
+        note = notes_manager.get_note_by_id(note_id)
+        data["identifier"] = notes_manager.get_note_identifier(note_id)
+        data["note"] = dict(note) if note else None
+    event_types = {'add': 'note_added', 'update': 'note_updated', 'delete': 'note_deleted'}
+    change_feed.publish(('notes', project_name), event_types[op], data)
+
+def _notes_etag(notes_manager):
+    """
+    Derives the ETag of the current GET request from the revision of the project's notes and the
+    full request path.
+
+    Args:
+        notes_manager (NotesManager): The project's resident NotesManager.
+
+    Returns:
+        str or None: The ETag, or None if the project has no notes yet.
+    """
+    revision = revision_tracker.current(notes_manager.notes_file)
+    if revision is None:
+        return None
+    return revision_etag(revision, request.full_path)
 
 @notes_blueprint.route('/<project_name>/add', methods=['POST'])
 @api_auth.require_api_key
@@ -28,14 +79,23 @@ def add_note_route(project_name):
     try:
         identifier = request.args.get('identifier', '')
         content = request.json.get('content', '')
-        api_key = request.headers.get('X-API-Key')
+        # Session token requests carry no API key, so record the authenticated user instead
+        api_key = request.headers.get('X-API-Key') or g.get('auth_user')
 
-        # Initialize NotesManager with the path to the project's notes file
-        notes_manager = NotesManager(f'./notes/{project_name}.json', validator)
+        # Call the add_note method of the project's resident NotesManager
+        with notes_registry.open(project_name) as notes_manager:
+            # Held across the check and the commit, so workers cannot commit the same revision
+            with revision_tracker.lock(notes_manager.notes_file):
+                failed = precondition_failed(revision_tracker.current(notes_manager.notes_file))
+                if failed is not None:
+                    return failed
+                added, note_id = notes_manager.add_note(identifier, content, api_key)
+                if added:
+                    revision = revision_tracker.commit(notes_manager.notes_file)
+                    _publish_note_change(project_name, notes_manager, 'add', note_id, revision)
 
-        # Call the add_note method of NotesManager
-        if notes_manager.add_note(identifier, content, api_key):
-            return jsonify({"message": "Note added successfully"}), 201
+        if added:
+            return jsonify({"message": "Note added successfully", "note_id": note_id, "revision": revision}), 201
         else:
             return jsonify({"error": "Failed to add note"}), 400
     except Exception as e:
@@ -43,11 +103,60 @@ def add_note_route(project_name):
         return jsonify({"error": "An error occurred"}), 500
 
 
+@notes_blueprint.route('/<project_name>/batch', methods=['POST'])
+@api_auth.require_api_key
+def batch_notes(project_name):
+    """
+    Applies a batch of add, update and delete operations to a project's notes atomically,
+    persisting them with a single write.
+
+    Request Body:
+        {"operations": [
+            {"op": "add", "identifier": "<file:src/main.py>", "content": "..."},
+            {"op": "update", "note_id": "...", "updates": {"content": "..."}},
+            {"op": "delete", "note_id": "..."}
+        ]}
+
+    Args:
+        project_name (str): The name of the project.
+
+    Returns:
+        A JSON response with one result per operation, including the IDs of added notes.
+        If any operation is invalid, none is applied and a 400 is returned.
+    """
+    try:
+        operations = (request.get_json(silent=True) or {}).get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"error": "A non-empty 'operations' list is required"}), 400
+        if len(operations) > max_batch_operations:
+            return jsonify({"error": f"A batch can contain at most {max_batch_operations} operations"}), 400
+        api_key = request.headers.get('X-API-Key') or g.get('auth_user')
+
+        with notes_registry.open(project_name) as notes_manager:
+            with revision_tracker.lock(notes_manager.notes_file):
+                failed = precondition_failed(revision_tracker.current(notes_manager.notes_file))
+                if failed is not None:
+                    return failed
+                applied, results = notes_manager.apply_batch(operations, api_key)
+                if applied:
+                    revision = revision_tracker.commit(notes_manager.notes_file)
+                    for result in results:
+                        _publish_note_change(project_name, notes_manager, result['op'], result['note_id'], revision)
+
+        if applied:
+            return jsonify({"message": "Batch applied successfully", "results": results, "revision": revision}), 200
+        else:
+            return jsonify({"error": "Batch rejected, no operations were applied", "results": results}), 400
+    except Exception as e:
+        logging.error(f"Error in applying note batch: {e}")
+        return jsonify({"error": "An error occurred"}), 500
+
 @notes_blueprint.route('/<project_name>/update/<note_id>', methods=['PUT'])
 @api_auth.require_api_key
 def update_note(project_name, note_id):
     """
-    Updates an existing note for the specified project.
+    Updates an existing note for the specified project. The 'identifier' query parameter is
+    optional, notes are found by ID.
 
     Args:
         project_name (str): The name of the project.
@@ -60,11 +169,20 @@ def update_note(project_name, note_id):
         # Extract data from request
         identifier = request.args.get('identifier', '')
         updates = request.json
-        notes_manager = NotesManager(f'./notes/{project_name}.json', validator)
 
         # Update the note
-        if notes_manager.update_note(note_id, identifier, updates):
-            return jsonify({"message": "Note updated successfully"}), 200
+        with notes_registry.open(project_name) as notes_manager:
+            with revision_tracker.lock(notes_manager.notes_file):
+                failed = precondition_failed(revision_tracker.current(notes_manager.notes_file))
+                if failed is not None:
+                    return failed
+                updated = notes_manager.update_note(note_id, identifier, updates)
+                if updated:
+                    revision = revision_tracker.commit(notes_manager.notes_file)
+                    _publish_note_change(project_name, notes_manager, 'update', note_id, revision)
+
+        if updated:
+            return jsonify({"message": "Note updated successfully", "revision": revision}), 200
         else:
             return jsonify({"error": "Failed to update note"}), 400
     except Exception as e:
@@ -75,7 +193,8 @@ def update_note(project_name, note_id):
 @api_auth.require_api_key
 def delete_note(project_name, note_id):
     """
-    Deletes a note for the specified project.
+    Deletes a note for the specified project. The 'identifier' query parameter is optional,
+    notes are found by ID.
 
     Args:
         project_name (str): The name of the project.
@@ -87,17 +206,152 @@ def delete_note(project_name, note_id):
     try:
         # Extract identifier from request
         identifier = request.args.get('identifier', '')
-        notes_manager = NotesManager(f'./notes/{project_name}.json', validator)
 
         # Delete the note
-        if notes_manager.delete_note(note_id, identifier):
-            return jsonify({"message": "Note deleted successfully"}), 200
+        with notes_registry.open(project_name) as notes_manager:
+            with revision_tracker.lock(notes_manager.notes_file):
+                failed = precondition_failed(revision_tracker.current(notes_manager.notes_file))
+                if failed is not None:
+                    return failed
+                deleted = notes_manager.delete_note(note_id, identifier)
+                if deleted:
+                    revision = revision_tracker.commit(notes_manager.notes_file)
+                    _publish_note_change(project_name, notes_manager, 'delete', note_id, revision)
+
+        if deleted:
+            return jsonify({"message": "Note deleted successfully", "revision": revision}), 200
         else:
             return jsonify({"error": "Failed to delete note"}), 400
     except Exception as e:
         logging.error(f"Error in deleting note: {e}")
         return jsonify({"error": "An error occurred"}), 500
 
+@notes_blueprint.route('/<project_name>/changes', methods=['GET'])
+@api_auth.require_api_key
+def get_note_changes(project_name):
+    """
+    Streams the note mutations of a project as 'note_added', 'note_updated' and 'note_deleted'
+    events. See change_feed.changes_response for the query parameters.
+
+    Args:
+        project_name (str): The name of the project.
+
+    Returns:
+        A Server-Sent Events stream, or a JSON long poll response with mode=poll.
+    """
+    return changes_response(change_feed, ('notes', project_name))
+
+@notes_blueprint.route('/<project_name>/query', methods=['GET'])
+@api_auth.require_api_key
+def query_notes(project_name):
+    """
+    Retrieves notes by type, by subtree, or by type within a subtree, using the type index
+    instead of scanning the whole notes tree.
+
+    Query Parameters:
+        type (str, optional): Only return notes of this type, e.g. 'method'.
+        under (str, optional): Identifier of the subtree to search, e.g. '<file:src/main.py>'.
+
+    Args:
+        project_name (str): The name of the project.
+
+    Returns:
+        A JSON response with the matching notes and their count, or an error message.
+    """
+    try:
+        note_type = request.args.get('type') or None
+        under = request.args.get('under', '')
+        with notes_registry.open(project_name) as notes_manager:
+            etag = _notes_etag(notes_manager)
+            cached_response = not_modified(etag)
+            if cached_response is not None:
+                return cached_response
+            notes = notes_manager.query_notes(note_type, under)
+            if notes is None:
+                return jsonify({"error": "Subtree not found"}), 404
+            return with_etag(jsonify({"notes": notes, "count": len(notes)}), etag)
+    except Exception as e:
+        logging.error(f"Error in querying notes: {e}")
+        return jsonify({"error": "An error occurred"}), 500
+
+
+@notes_blueprint.route('/<project_name>/counts', methods=['GET'])
+@api_auth.require_api_key
+def get_note_counts(project_name):
+    """
+    Retrieves the number of notes per type for a project or one of its subtrees.
+
+    Query Parameters:
+        under (str, optional): Identifier of the subtree to count, e.g. '<file:src/main.py>'.
+
+    Args:
+        project_name (str): The name of the project.
+
+    Returns:
+        A JSON response with the total and per-type note counts, or an error message.
+    """
+    try:
+        under = request.args.get('under', '')
+        with notes_registry.open(project_name) as notes_manager:
+            etag = _notes_etag(notes_manager)
+            cached_response = not_modified(etag)
+            if cached_response is not None:
+                return cached_response
+            counts = notes_manager.get_note_counts(under)
+        if counts is None:
+            return jsonify({"error": "Subtree not found"}), 404
+        return with_etag(jsonify(counts), etag)
+    except Exception as e:
+        logging.error(f"Error in counting notes: {e}")
+        return jsonify({"error": "An error occurred"}), 500
+
+@notes_blueprint.route('/<project_name>/search', methods=['GET'])
+@api_auth.require_api_key
+def search_notes(project_name):
+    """
+    Searches the content of a project's notes.
+
+    Query Parameters:
+        q (str): The search query; every term must match.
+        prefix (str, optional): 'true' to match query terms as prefixes.
+        page (int, optional): The page of results to return, starting at 1.
+        per_page (int, optional): Results per page, at most 100. Defaults to 20.
+
+    Args:
+        project_name (str): The name of the project.
+
+    Returns:
+        A JSON response with the ranked results, the total number of matches and the query latency.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Query parameter 'q' is required"}), 400
+        prefix = request.args.get('prefix', 'false').lower() == 'true'
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+        started = time.perf_counter()
+        with notes_registry.open(project_name) as notes_manager:
+            etag = _notes_etag(notes_manager)
+            cached_response = not_modified(etag)
+            if cached_response is not None:
+                return cached_response
+            total, results = notes_manager.search_notes(query, prefix, (page - 1) * per_page, per_page)
+        took_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        return with_etag(jsonify({
+            "query": query,
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "took_ms": took_ms,
+            "results": results
+        }), etag)
+    except Exception as e:
+        logging.error(f"Error in searching notes: {e}")
+        return jsonify({"error": "An error occurred"}), 500
+
 @notes_blueprint.route('/<project_name>/<identifier>', methods=['GET'])
 @api_auth.require_api_key
 def get_notes_by_identifier(project_name, identifier):
@@ -112,14 +366,16 @@ def get_notes_by_identifier(project_name, identifier):
         A JSON response containing the notes or an error message.
     """
     try:
-        notes_manager = NotesManager(f'./notes/{project_name}.json', validator)
-
-        # Retrieve notes
-        notes = notes_manager.get_notes_by_note_type(identifier)
-        if notes:
-            return jsonify(notes), 200
-        else:
-            return jsonify({"error": "No notes found"}), 404
+        # Retrieve notes, serializing while the project lock is held
+        with notes_registry.open(project_name) as notes_manager:
+            etag = _notes_etag(notes_manager)
+            cached_response = not_modified(etag)
+            if cached_response is not None:
+                return cached_response
+            notes = notes_manager.get_notes_by_note_type(identifier)
+            if notes:
+                return with_etag(jsonify(notes), etag)
+        return jsonify({"error": "No notes found"}), 404
     except Exception as e:
         logging.error(f"Error in retrieving notes: {e}")
         return jsonify({"error": "An error occurred"}), 500
@@ -129,25 +385,28 @@ def get_notes_by_identifier(project_name, identifier):
 @api_auth.require_api_key
 def get_notes_by_id(project_name, note_id):
     """
-    Retrieves notes based on the specified identifier for a project.
+    Retrieves a note by its ID for a project. The 'identifier' query parameter is optional,
+    notes are found by ID.
 
     Args:
         project_name (str): The name of the project.
-        identifier (str): The hierarchical identifier of the notes.
+        note_id (str): The unique ID of the note.
 
     Returns:
-        A JSON response containing the notes or an error message.
+        A JSON response containing the note or an error message.
     """
     try:
         # Extract identifier from request
         identifier = request.args.get('identifier', '')
-        notes_manager = NotesManager(f'./notes/{project_name}.json', validator)
-
-        note = notes_manager.get_note_by_id(note_id,identifier)
-        if note:
-            return jsonify(note), 200
-        else:
-            return jsonify({"error": "Note not found"}), 404
+        with notes_registry.open(project_name) as notes_manager:
+            etag = _notes_etag(notes_manager)
+            cached_response = not_modified(etag)
+            if cached_response is not None:
+                return cached_response
+            note = notes_manager.get_note_by_id(note_id,identifier)
+            if note:
+                return with_etag(jsonify(note), etag)
+        return jsonify({"error": "Note not found"}), 404
     except Exception as e:
         logging.error(f"Error in retrieving note: {e}")
         return jsonify({"error": "An error occurred"}), 500
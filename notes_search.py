@@ -0,0 +1,164 @@
+# notes_search.py
+"""
+NotesSearchIndex Module
+-----------------------
+In-memory inverted index over note content. NotesManager keeps one index per project and updates
+it on every add, update and delete, so searches never rescan the notes tree.
+
+Classes:
+- NotesSearchIndex: Tokenizes note content and answers ranked, optionally prefix-matching queries.
+"""
+
+import bisect
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Splits text into lower-cased word tokens.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list of str: The tokens in order of appearance.
+    """
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class NotesSearchIndex:
+    """
+    Inverted index mapping tokens to the notes containing them.
+
+    Attributes:
+        postings (dict): Token to {note ID: term frequency}.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty index.
+        """
+        self.postings = {}
+        self._note_terms = {}
+        self._vocabulary = []
+
+    def __len__(self):
+        """
+        Returns the number of indexed notes.
+        """
+        return len(self._note_terms)
+
+    def add(self, note_id, content):
+        """
+        Indexes the content of a note, replacing any content indexed for it before.
+
+        Args:
+            note_id (str): The unique ID of the note.
+            content (str): The content of the note.
+        """
+        self.remove(note_id)
+        terms = Counter(tokenize(content))
+        self._note_terms[note_id] = terms
+        for term, frequency in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                bisect.insort(self._vocabulary, term)
+            postings[note_id] = frequency
+
+    def remove(self, note_id):
+        """
+        Removes a note from the index.
+
+        Args:
+            note_id (str): The unique ID of the note.
+        """
+        terms = self._note_terms.pop(note_id, None)
+        if not terms:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            del postings[note_id]
+            if not postings:
+                del self.postings[term]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+
+    def expand(self, term, prefix=False):
+        """
+        Returns the indexed tokens a query term matches.
+
+        Args:
+            term (str): The lower-cased query term.
+            prefix (bool): Match every token starting with the term instead of the exact token.
+
+        Returns:
+            list of str: The matching tokens.
+        """
+        if not prefix:
+            return [term] if term in self.postings else []
+        start = bisect.bisect_left(self._vocabulary, term)
+        end = bisect.bisect_left(self._vocabulary, term + '\uffff', start)
+        return self._vocabulary[start:end]
+
+    def search(self, query, prefix=False):
+        """
+        Finds the notes containing every term of a query, ranked by TF-IDF.
+
+        Args:
+            query (str): The search query.
+            prefix (bool): Treat every query term as a prefix.
+
+        Returns:
+            list of tuple: (note ID, score) pairs, best match first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        note_count = len(self._note_terms)
+        scores = None
+        for term in dict.fromkeys(terms):
+            term_scores = {}
+            for token in self.expand(term, prefix):
+                postings = self.postings[token]
+                idf = math.log(1 + note_count / len(postings))
+                for note_id, frequency in postings.items():
+                    term_scores[note_id] = term_scores.get(note_id, 0.0) + (1 + math.log(frequency)) * idf
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {note_id: score + term_scores[note_id]
+                          for note_id, score in scores.items() if note_id in term_scores}
+            if not scores:
+                return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def make_snippet(content, query, prefix=False, width=80):
+    """
+    Extracts the part of a note's content around the first occurrence of a query term.
+
+    Args:
+        content (str): The content of the note.
+        query (str): The search query.
+        prefix (bool): Whether the query terms are prefixes.
+        width (int): Approximate length of the snippet.
+
+    Returns:
+        str: The snippet, with '...' marking cut-off text.
+    """
+    content = str(content)
+    terms = tokenize(query)
+    if not terms:
+        return content[:width]
+    pattern = r'\b(?:' + '|'.join(re.escape(term) for term in terms) + (r')' if prefix else r')\b')
+    match = re.search(pattern, content, re.IGNORECASE)
+    start = max(0, match.start() - width // 4) if match else 0
+    end = min(len(content), start + width)
+    snippet = content[start:end].strip()
+    return ('...' if start > 0 else '') + snippet + ('...' if end < len(content) else '')
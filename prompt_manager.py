@@ -17,8 +17,20 @@ class PromptManager:
         self.prompts_dir = prompts_dir
         logging.basicConfig(level=logging.INFO)
 
+    def prompt_path(self, filename):
+        """
+        Returns the path of a prompt file inside the prompts directory.
+
+        Args:
+            filename (str): The name of the prompt file, including the .md extension.
+
+        Returns:
+            str: The path of the prompt file.
+        """
+        return os.path.join(self.prompts_dir, filename)
+
     def get_prompt(self, filename):
-        file_path = os.path.join(self.prompts_dir, filename)
+        file_path = self.prompt_path(filename)
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 content = file.read()
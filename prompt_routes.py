@@ -6,6 +6,8 @@ This module defines the Flask routes for retrieving markdown prompt documents.
 It handles requests for specific prompt documents from the 'prompts' directory, 
 appending the '.md' extension in the backend. The module ensures secure access 
 through API key authentication and maintains detailed logging for each operation.
+Responses carry an ETag derived from the prompt file's stat signature, and a matching
+If-None-Match is answered with 304 without reading the file.
 
 Functions:
 - get_prompt: Retrieves the content of a markdown file based on the project name.
@@ -13,11 +15,14 @@ Functions:
 Dependencies:
 - prompt_manager: Module for handling the retrieval of markdown files.
 - require_api_key: Decorator from api_authenticator for API key validation.
+- conditional_requests: Helpers for ETag based conditional responses.
 """
 
 from flask import Blueprint, jsonify
 from prompt_manager import PromptManager
 from api_authenticator import api_auth_instance
+from conditional_requests import make_etag, not_modified, with_etag
+from file_handler import stat_signature
 import logging
 
 # Initialize Blueprint for prompt routes
@@ -37,8 +42,14 @@ def get_prompt(project_name):
         The content of the markdown file or an error message.
     """
     filename = f"{project_name}.md"
+    signature = stat_signature(prompt_manager.prompt_path(filename))
+    etag = make_etag('prompts', signature) if signature else None
+    cached_response = not_modified(etag)
+    if cached_response is not None:
+        return cached_response
+
     content, error = prompt_manager.get_prompt(filename)
     if error:
         logging.error(f"Error retrieving prompt for {filename}: {error}")
         return jsonify({'error': error}), 404
-    return content, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return with_etag((content, 200, {'Content-Type': 'text/plain; charset=utf-8'}), etag)
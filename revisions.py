@@ -0,0 +1,187 @@
+# ./revisions.py
+"""
+Revisions Module
+----------------
+Tracks a revision number per document (task file, notes file) for optimistic concurrency control.
+The revision is persisted in a `<document>.rev` sidecar next to the document together with the
+stat signature of the document it describes. Writes made through the API bump the revision; an
+edit made outside the API is detected by the signature no longer matching and also bumps it.
+
+Routes derive their ETags from the revision and honour `If-Match` on mutations, answering 412 when
+the client's revision is stale, so concurrent writers find out instead of the last one silently
+winning. The check and the write happen under a brief per-document lock, which also holds an fcntl
+lock on `<document>.rev.lock` so worker processes sharing the document take turns.
+
+A cached revision is only trusted while both the document's and the sidecar's stat signatures are
+unchanged. A commit by another worker always rewrites the sidecar, so it is noticed even when the
+document itself did not change, e.g. when notes were appended to their journal.
+
+Classes:
+- RevisionTracker: Reads, bumps and persists document revisions.
+
+Instances:
+- revision_tracker: The process-wide tracker shared by all blueprints.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from file_handler import stat_signature, atomic_write_json
+
+
+class _DocumentLock:
+    """
+    Reentrant lock of one document, held across threads and worker processes.
+    """
+
+    def __init__(self, lock_file):
+        self.lock_file = lock_file
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except OSError:
+                    os.close(fd)
+                    raise
+            except OSError:
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+class RevisionTracker:
+    """
+    Tracks document revisions, caching them in memory and persisting them in sidecar files.
+    """
+
+    def __init__(self):
+        """
+        Initializes the tracker with empty caches.
+        """
+        # path -> (revision, signature of the document at that revision, signature of the sidecar)
+        self._revisions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def lock(self, path):
+        """
+        Returns the lock serializing revision checks and writes of a document, across threads and
+        worker processes. It is reentrant and used as a context manager.
+
+        Args:
+            path (str): The path to the document.
+
+        Returns:
+            _DocumentLock: The document's lock.
+        """
+        with self._lock:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = _DocumentLock(path + '.rev.lock')
+            return lock
+
+    def current(self, path):
+        """
+        Returns the current revision of a document. If the document changed on disk since its
+        revision was recorded, the revision is bumped first.
+
+        Args:
+            path (str): The path to the document.
+
+        Returns:
+            int or None: The revision, or None if the document has never existed.
+        """
+        signature = stat_signature(path)
+        sidecar_signature = stat_signature(path + '.rev')
+        if signature is None and sidecar_signature is None:
+            # Never existed: no lock, so requests for unknown documents leave nothing behind
+            return None
+        cached = self._revisions.get(path)
+        if cached is not None and cached[1] == signature and cached[2] == sidecar_signature:
+            return cached[0]
+
+        with self.lock(path):
+            # Another process may have written the document and its sidecar
+            signature = stat_signature(path)
+            recorded = self._read_sidecar(path)
+            if recorded is not None and recorded[1] == signature:
+                self._revisions[path] = recorded
+                return recorded[0]
+            if recorded is None and signature is None:
+                return None
+            revision = (recorded[0] if recorded is not None else 0) + 1
+            if recorded is not None:
+                logging.info(f"{path} changed outside the API, revision bumped to {revision}")
+            self._record(path, revision, signature)
+            return revision
+
+    def commit(self, path, count=1):
+        """
+        Bumps the revision of a document after it was written. Call with the document's lock held.
+
+        Args:
+            path (str): The path to the document.
+            count (int): Number of changes the write committed; each counts as one revision.
+
+        Returns:
+            int: The new revision.
+        """
+        with self.lock(path):
+            # The sidecar, not the cache, has the latest revision committed by any worker
+            recorded = self._read_sidecar(path) or self._revisions.get(path)
+            revision = (recorded[0] if recorded is not None else 0) + count
+            self._record(path, revision, stat_signature(path))
+            return revision
+
+    def adopt(self, path):
+        """
+        Records the current signature of a document without bumping its revision, for rewrites
+        that do not change the content, such as journal compaction.
+
+        Args:
+            path (str): The path to the document.
+        """
+        with self.lock(path):
+            recorded = self._read_sidecar(path) or self._revisions.get(path)
+            if recorded is not None:
+                self._record(path, recorded[0], stat_signature(path))
+
+    def _record(self, path, revision, signature):
+        atomic_write_json(path + '.rev', {"revision": revision, "signature": signature})
+        self._revisions[path] = (revision, signature, stat_signature(path + '.rev'))
+
+    def _read_sidecar(self, path):
+        """
+        Returns the (revision, document signature, sidecar signature) recorded in a document's
+        sidecar, or None if it has none.
+        """
+        # Stat before reading: if the sidecar is replaced in between, the next check reads it again
+        sidecar_signature = stat_signature(path + '.rev')
+        try:
+            with open(path + '.rev', 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        signature = tuple(data['signature']) if data.get('signature') is not None else None
+        return data['revision'], signature, sidecar_signature
+
+
+revision_tracker = RevisionTracker()
@@ -1,32 +1,108 @@
 # task_manager.py
 # This module is responsible for extracting specific tasks or subtasks from JSON data.
+# Task documents are indexed once when they are loaded: TaskIndex maps every dotted task number
+# ('3', '3.1', '3.1.2', ...) to its node, with parent and child pointers, so lookups are O(1) at
+# any nesting depth. A task's subtasks are the dict-valued keys of its node that extend its number.
 
 import logging
 
+class TaskIndex:
+    """
+    Flat index of a task document from dotted task number to task node.
+
+    Attributes:
+        document (dict): The indexed task document. Nodes returned by the index are part of it.
+    """
+
+    def __init__(self, document):
+        """
+        Builds the index of a task document.
+
+        Args:
+            document (dict): The task document, with its tasks under 'tasks'.
+        """
+        self.document = document
+        self._nodes = {}
+        self._parents = {}
+        self._children = {None: []}
+        tasks = document.get('tasks') if isinstance(document, dict) else None
+        if isinstance(tasks, dict):
+            for task_number, node in tasks.items():
+                if isinstance(node, dict):
+                    self._add(task_number, node, None)
+
+    def _add(self, task_number, node, parent):
+        self._nodes[task_number] = node
+        self._parents[task_number] = parent
+        self._children[parent].append(task_number)
+        self._children[task_number] = []
+        prefix = task_number + '.'
+        for key, value in node.items():
+            if isinstance(value, dict) and key.startswith(prefix):
+                self._add(key, value, task_number)
+
+    def __contains__(self, task_number):
+        return task_number in self._nodes
+
+    def get(self, task_number):
+        """
+        Returns the node of a task or subtask, or None if it does not exist.
+        """
+        return self._nodes.get(task_number)
+
+    def parent(self, task_number):
+        """
+        Returns the number of a task's parent, or None for main tasks.
+        """
+        return self._parents.get(task_number)
+
+    def children(self, task_number=None):
+        """
+        Returns the numbers of a task's direct subtasks, or of the main tasks if no number is given.
+        """
+        return list(self._children.get(task_number, ()))
+
+    def descendants(self, task_number):
+        """
+        Returns the numbers of all subtasks of a task at any depth, in document order.
+        """
+        numbers = []
+        pending = list(reversed(self._children.get(task_number, ())))
+        while pending:
+            number = pending.pop()
+            numbers.append(number)
+            pending.extend(reversed(self._children[number]))
+        return numbers
+
+    def fields(self, task_number):
+        """
+        Returns a task's own fields (status, description or task), without its subtasks.
+        """
+        children = set(self._children[task_number])
+        return {key: value for key, value in self._nodes[task_number].items() if key not in children}
+
+
 class TaskManager:
     def __init__(self):
         logging.basicConfig(level=logging.INFO)
 
 
-    def extract_task_data(self, data, task_number):
+    def extract_task_data(self, index, task_number, descendants=False):
         """
-        Extracts and returns specific task or subtask data from JSON.
+        Extracts and returns specific task or subtask data from an indexed task document.
         Args:
-        - data (dict): The JSON data.
-        - task_number (str): The task number to extract, which can include subtasks like '1.1'.
+        - index (TaskIndex): The index of the task document.
+        - task_number (str): The task number to extract, at any depth, e.g. '1', '1.1' or '1.1.2'.
+        - descendants (bool): Return the task and all of its subtasks as a flat mapping instead.
 
         Returns:
-        - dict: The extracted task or subtask data.
-        """
-        try:
-            if '.' in task_number:
-                sub_task = task_number
-                main_task = task_number.split('.', 1)[0]
-                print(f"sub_task: {sub_task}, main_task: {main_task}")
-                task_data = data['tasks'][main_task][sub_task] 
-                return {'tasks': {task_number: task_data}}
-            else:
-                return {'tasks': {task_number: data['tasks'][task_number]}}
-        except KeyError as e:
-            logging.error(f"Task or subtask not found: {task_number}. Error: {e}")
-            return None
\ No newline at end of file
+        - dict: The extracted task or subtask data, or None if it does not exist.
+        """
+        node = index.get(task_number)
+        if node is None:
+            logging.error(f"Task or subtask not found: {task_number}")
+            return None
+        if descendants:
+            numbers = [task_number] + index.descendants(task_number)
+            return {'tasks': {number: index.fields(number) for number in numbers}}
+        return {'tasks': {task_number: node}}
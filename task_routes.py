@@ -8,24 +8,37 @@ retrieving, updating, and 'deleting' tasks, with each operation secured through
 and detailed logging for monitoring and debugging.
 
 Functions:
-- get_task: Retrieves task data from a specified file.
+- get_task: Retrieves task data from a specified file, optionally as it was at a point in time.
+- get_task_history: Lists the recorded versions of a task file.
+- get_task_changes: Streams task updates as Server-Sent Events or long polls.
 - update_task: Updates the details of a specific task.
+- update_tasks: Updates many tasks with a single read-modify-write.
 - delete_task: Marks a task as deleted in the task file.
 
 Dependencies:
-- FileHandler: Module for handling file operations.
-- TaskManager: Module for extracting specific tasks or subtasks.
+- FileHandler: Module for handling file operations; GroupCommitter batches concurrent updates of a task file into one write.
+- TaskManager: Module for extracting specific tasks or subtasks; TaskIndex indexes task documents by task number.
 - MarkdownConverter: Module for converting tasks to Markdown format.
+- DocumentCache: Cache of parsed task documents shared by the GET and PUT handlers.
+- BackupStore: Deduplicated version history of the task documents.
+- revision_tracker: Revision numbers of the task files, used for ETags and If-Match checks.
+- change_feed: Publishes task updates to /changes subscribers.
 - require_api_key: Decorator from api_authenticator for API key validation.
 """
 
 from flask import Blueprint, request, jsonify
-from file_handler import FileHandler
-from task_manager import TaskManager
+from task_manager import TaskManager, TaskIndex
 from markdown_converter import MarkdownConverter
+from document_cache import DocumentCache
+from backup_store import BackupStore
+from conditional_requests import make_etag, not_modified, with_etag, revision_etag, if_match_satisfied, stale_revision
+from revisions import revision_tracker
+from change_feed import change_feed, changes_response
+from file_handler import FileHandler, GroupCommitter, stat_signature
 from api_authenticator import api_auth_instance
+import copy
 import logging
-import shutil
+import threading
 from datetime import datetime
 import os
 
@@ -35,82 +48,453 @@ file_handler = FileHandler()
 task_manager = TaskManager()
 markdown_converter = MarkdownConverter()
 
+def _load_task_index(path):
+    """
+    Parses and indexes a task file, returning None if it cannot be read.
+    """
+    tasks_data = file_handler.read_json_file(path)
+    return TaskIndex(tasks_data) if tasks_data is not None else None
+
+# Indexed task documents, invalidated whenever the file handler writes a task file
+task_cache = DocumentCache(lambda path, variant: _load_task_index(path),
+                           max_bytes=int(os.getenv('TASK_CACHE_MAX_BYTES', 64 * 1024 * 1024)), name='tasks')
+file_handler.add_write_listener(task_cache.invalidate)
+
+# Deduplicated version history of the task documents
+backup_store = BackupStore('./tasks/backups/store', legacy_dir='./tasks/backups')
+# Keeps the versions of concurrent writers in the backup timeline in the order they were committed
+_backup_lock = threading.Lock()
+
+@task_blueprint.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Returns the hit, miss and eviction statistics of the task document cache and the Markdown
+    render cache.
+    """
+    stats = task_cache.stats()
+    stats['markdown'] = markdown_converter.stats()
+    return jsonify(stats), 200
+
+def _parse_timestamp(value):
+    """
+    Parses a point in time given as epoch seconds or as an ISO 8601 timestamp (local time if it has
+    no UTC offset).
+
+    Args:
+        value (str): The timestamp.
+
+    Returns:
+        float or None: The point in time in epoch seconds, or None if the value is not a timestamp
+            or is not a representable date (e.g. 'nan', 'inf' or '1e20').
+    """
+    try:
+        when = float(value)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except (ValueError, OverflowError, OSError):
+            return None
+    try:
+        # Rejects non-finite and out of range values, as an ISO timestamp would be
+        datetime.fromtimestamp(when)
+    except (ValueError, OverflowError, OSError):
+        return None
+    return when
+
+def _format_timestamp(when):
+    return datetime.fromtimestamp(when).astimezone().isoformat()
+
+@task_blueprint.route('/<project_name>/history', methods=['GET'])
+def get_task_history(project_name):
+    """
+    Lists the recorded versions of a task file, oldest first, with the task and subtask numbers
+    each version changed.
+
+    Query Parameters:
+        limit (int, optional): Only list the most recent versions.
+
+    Args:
+        project_name (str): The name of the JSON file containing tasks.
+
+    Returns:
+        A JSON response with the versions of the task file.
+    """
+    entries = backup_store.timeline(project_name)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit >= 0:
+        entries = entries[-limit:] if limit else []
+    versions = [{
+        "version": entry['sha'],
+        "timestamp": _format_timestamp(entry['time']),
+        "changed": entry.get('changed')
+    } for entry in entries]
+    return jsonify({"project": project_name, "count": len(versions), "versions": versions}), 200
+
+@task_blueprint.route('/<project_name>/changes', methods=['GET'])
+def get_task_changes(project_name):
+    """
+    Streams the updates of a project's tasks, so clients no longer need to poll the task file.
+    Each 'task_updated' event carries the task number, the updated task and the new revision of
+    the task file. See change_feed.changes_response for the query parameters.
+
+    Args:
+        project_name (str): The name of the JSON file containing tasks.
+
+    Returns:
+        A Server-Sent Events stream, or a JSON long poll response with mode=poll, or 404 if the
+        project has no task file.
+    """
+    if revision_tracker.current(f'tasks/{project_name}.json') is None:
+        return jsonify({'error': 'File not found'}), 404
+    return changes_response(change_feed, ('tasks', project_name))
+
 @task_blueprint.route('/<project_name>', methods=['GET'])
 @task_blueprint.route('/<project_name>/<task_number>', methods=['GET'])
 # @api_auth_instance.require_api_key
 def get_task(project_name, task_number=None):
     """
     Retrieves and returns the specified task or subtask data from a JSON file.
+    Responses carry an ETag derived from the task file's revision and the requested representation;
+    a matching If-None-Match is answered with 304 before the file is parsed or rendered.
+
+    Query Parameters:
+        format (str, optional): 'json' (default) or 'md'.
+        at (str, optional): Return the tasks as they were at this point in time, given as an ISO 8601
+            timestamp or epoch seconds. The version is found in the backup timeline.
+        descendants (str, optional): 'true' to return the task and all of its subtasks, at any
+            depth, as a flat mapping from task number to task.
 
     Args:
         project_name (str): The name of the JSON file containing tasks.
-        task_number (str, optional): The specific task number to retrieve, can include subtasks like '1.1'.
+        task_number (str, optional): The specific task number to retrieve, at any depth, e.g. '1.1' or '1.1.2'.
 
     Returns:
         JSON or Markdown formatted string of the task data, or an error message.
     """
     format_type = request.args.get('format', 'json')
+    descendants = bool(task_number) and request.args.get('descendants', 'false').lower() == 'true'
+    view = (task_number, descendants) if descendants else task_number
     file_path = f'tasks/{project_name}.json'
 
-    logging.info(f"Retrieving tasks from {file_path}")
-    tasks_data = file_handler.read_json_file(file_path)
+    at = request.args.get('at')
+    if at:
+        when = _parse_timestamp(at)
+        if when is None:
+            return jsonify({'error': 'Invalid timestamp'}), 400
+        entry = backup_store.version_at(project_name, when)
+        if entry is None:
+            return jsonify({'error': 'No version of the task file at that time'}), 404
+        # Stored versions never change, so the version alone identifies the document
+        signature = entry['sha']
+        etag = make_etag('tasks', signature, view, format_type)
+        cached_response = not_modified(etag)
+        if cached_response is not None:
+            return cached_response
+        logging.info(f"Retrieving version {signature[:12]} of {file_path}")
+        try:
+            task_index = TaskIndex(backup_store.load(signature))
+        except (OSError, ValueError) as e:
+            # Pruned since it was found in the timeline, or unreadable
+            logging.error(f"Could not restore version {signature[:12]} of {file_path}: {e}")
+            return jsonify({'error': 'No version of the task file at that time'}), 404
+    else:
+        revision = revision_tracker.current(file_path)
+        etag = revision_etag(revision, view, format_type) if revision else None
+        cached_response = not_modified(etag)
+        if cached_response is not None:
+            return cached_response
+
+        logging.info(f"Retrieving tasks from {file_path}")
+        task_index, signature = task_cache.get(file_path)
+        revision = revision_tracker.current(file_path)
+        etag = revision_etag(revision, view, format_type) if revision else None
     
-    if tasks_data is None:
+    if task_index is None:
         logging.error("Task file not found")
         return jsonify({'error': 'File not found'}), 404
 
+    tasks_data = task_index.document
     if task_number:
-        tasks_data = task_manager.extract_task_data(tasks_data, task_number)
+        tasks_data = task_manager.extract_task_data(task_index, task_number, descendants)
         if tasks_data is None:
             logging.error("Specific task or subtask not found")
             return jsonify({'error': 'Task or subtask not found'}), 404
 
     if format_type == 'md':
-        markdown_content = markdown_converter.convert_to_markdown(tasks_data)
-        return markdown_content, 200, {'Content-Type': 'text/markdown'}
+        markdown_content = markdown_converter.convert_to_markdown(tasks_data, signature, view)
+        return with_etag((markdown_content, 200, {'Content-Type': 'text/markdown'}), etag)
+
+    return with_etag(jsonify(tasks_data), etag)
+
+def _find_task(task_index, task_number):
+    """
+    Locates a task or subtask in an indexed task document.
+
+    Args:
+        task_index (TaskIndex): The index of the task document.
+        task_number (str): The task or subtask number, e.g. '2', '2.1' or '2.1.3'.
+
+    Returns:
+        dict: The task or subtask.
+
+    Raises:
+        KeyError: If the task or subtask does not exist.
+    """
+    task_data = task_index.get(task_number)
+    if task_data is None:
+        raise KeyError(task_number)
+    return task_data
+
+def _apply_task_changes(task_data, task_number, changes):
+    """
+    Updates the status and/or description of a task or subtask in place. Descriptions only apply
+    to main tasks.
+    """
+    if 'status' in changes:
+        task_data['status'] = changes['status']
+    if 'description' in changes and '.' not in task_number:
+        task_data['description'] = changes['description']
+
+class _TaskChange:
+    """
+    An update of a task document, submitted to the group committer by a PUT or PATCH request.
+
+    Attributes:
+        project_name (str): The name of the JSON file containing tasks.
+        task_numbers (list): The task and subtask numbers the update touches.
+        apply_changes (callable): Changes a TaskIndex in place; raises KeyError before changing
+            anything if a task or subtask does not exist.
+        if_match (ETags or None): The request's parsed If-Match header.
+    """
+
+    def __init__(self, project_name, task_numbers, apply_changes, if_match):
+        self.project_name = project_name
+        self.task_numbers = task_numbers
+        self.apply_changes = apply_changes
+        self.if_match = if_match
+
+def _apply_batch(file_path, changes):
+    """
+    Applies the changes of a batch, in order, to a private copy of a task document; the cached
+    document is shared with readers and is left unmodified. A change is skipped if its If-Match
+    names a stale revision, counting one revision per change applied before it, or if a task it
+    changes does not exist.
+
+    Returns:
+        tuple or None: (revision, original index, original signature, updated index, results),
+            with one ('ok', revision), ('stale', revision) or ('missing', task number) result per
+            change, or None if the task file does not exist.
+    """
+    revision = revision_tracker.current(file_path)
+    original_index, original_signature = task_cache.get(file_path)
+    if original_index is None or revision is None:
+        return None
+    task_index = TaskIndex(copy.deepcopy(original_index.document))
+    results = []
+    applied = 0
+    for change in changes:
+        if not if_match_satisfied(change.if_match, revision + applied):
+            results.append(('stale', revision + applied))
+            continue
+        try:
+            change.apply_changes(task_index)
+        except KeyError as e:
+            results.append(('missing', e.args[0]))
+            continue
+        applied += 1
+        results.append(('ok', revision + applied))
+    return revision, original_index, original_signature, task_index, results
 
-    return jsonify(tasks_data), 200
+def _commit_batch(file_path, changes):
+    """
+    Commits a batch of updates of a task file with a single write; the commit function of the
+    group committer.
+
+    The changes are applied to a copy of the document before the task file's revision lock is
+    taken. Under the lock, the revision and the file are checked to be unchanged (otherwise the
+    changes are applied again to the current version), the document is written and one revision
+    is committed per applied change. The versions before and after the write are then recorded in
+    the backup store, in commit order but without holding the revision lock, and the updated tasks
+    are published to the change feed. The Markdown converter is told which tasks changed, so it
+    only re-renders those.
+
+    Returns:
+        list: One result per change, see _apply_batch, or ('not_found', None) for every change if
+            the task file does not exist.
+    """
+    prepared = _apply_batch(file_path, changes)
+    with revision_tracker.lock(file_path):
+        if (prepared is None or revision_tracker.current(file_path) != prepared[0]
+                or stat_signature(file_path) != prepared[2]):
+            prepared = _apply_batch(file_path, changes)
+        if prepared is None:
+            return [('not_found', None)] * len(changes)
+        _, original_index, original_signature, task_index, results = prepared
+        applied = [change for change, result in zip(changes, results) if result[0] == 'ok']
+        if not applied:
+            return results
+
+        file_handler.write_json_file(file_path, task_index.document)
+        task_numbers = [task_number for change in applied for task_number in change.task_numbers]
+        markdown_converter.record_update(original_signature, stat_signature(file_path), task_numbers)
+        revision_tracker.commit(file_path, len(applied))
+        # Taken before the revision lock is released, so the next writer's versions are
+        # recorded after these
+        _backup_lock.acquire()
+    project_name = applied[0].project_name
+    try:
+        backup_store.snapshot(project_name, original_index.document)
+        backup_store.snapshot(project_name, task_index.document)
+    except Exception as e:
+        # The update is written and committed, a missing backup must not fail it
+        logging.exception(f"Could not record the backup of {file_path}: {e}")
+    finally:
+        _backup_lock.release()
+
+    for change, (outcome, revision) in zip(changes, results):
+        if outcome != 'ok':
+            continue
+        for task_number in change.task_numbers:
+            change_feed.publish(('tasks', project_name), 'task_updated', {
+                "task_number": task_number,
+                "task": _find_task(task_index, task_number),
+                "revision": revision
+            })
+    return results
+
+# Batches concurrent updates of a task file into one write
+task_committer = GroupCommitter(_commit_batch)
+
+def _write_tasks(project_name, file_path, task_numbers, apply_changes):
+    """
+    Applies changes to a task document and writes it, bumping the revision of the task file.
+    Updates of the same file submitted concurrently are committed together with a single write,
+    see _commit_batch.
+
+    Args:
+        project_name (str): The name of the JSON file containing tasks.
+        file_path (str): The path of the task file.
+        task_numbers (list): The task and subtask numbers the changes touch.
+        apply_changes (callable): Called with the TaskIndex of a copy of the document to change it
+            in place; must raise KeyError before changing anything if a task does not exist.
+
+    Returns:
+        tuple: (revision, None) on success, or (None, response) with a 404 response if the task
+            file does not exist or a 412 response if the request's If-Match names a stale revision.
+
+    Raises:
+        KeyError: If a task or subtask to change does not exist.
+    """
+    if_match = request.if_match if 'If-Match' in request.headers else None
+    outcome, value = task_committer.submit(file_path, _TaskChange(project_name, task_numbers, apply_changes, if_match))
+    if outcome == 'ok':
+        return value, None
+    if outcome == 'stale':
+        logging.info(f"Rejected stale update of {file_path}")
+        return None, stale_revision(value)
+    if outcome == 'not_found':
+        return None, (jsonify({'error': 'File not found'}), 404)
+    raise KeyError(value)
 
 @task_blueprint.route('/<project_name>/<task_number>', methods=['PUT'])
 def update_task(project_name, task_number):
+    """
+    Updates the status and/or description of a task or subtask. The versions of the task document
+    before and after the update are recorded in the backup store. An If-Match header naming a
+    stale revision of the task file is answered with 412.
+
+    Args:
+        project_name (str): The name of the JSON file containing tasks.
+        task_number (str): The task or subtask to update, e.g. '2' or '2.1'.
+
+    Returns:
+        A JSON response indicating success or failure.
+    """
     data = request.json
     file_path = f'tasks/{project_name}.json'
 
-    # Create a backup before updating
-    backup_dir = './tasks/backups/'
-    os.makedirs(backup_dir, exist_ok=True)  # Create backups directory if it doesn't exist
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    backup_file_path = f'{backup_dir}datetime_{project_name}_{timestamp}.json'
-    shutil.copy(file_path, backup_file_path)
-    logging.info(f"Backup created at {backup_file_path}")
+    def apply_changes(task_index):
+        _apply_task_changes(_find_task(task_index, task_number), task_number, data)
+
+    try:
+        revision, failed = _write_tasks(project_name, file_path, [task_number], apply_changes)
+        if failed is not None:
+            return failed
+        return jsonify({"message": "Task updated successfully", "revision": revision}), 200
 
+    except KeyError as e:
+        logging.error(f"Task or subtask not found: {e}")
+        return jsonify({'error': 'Task or subtask not found'}), 404
+    except Exception as e:
+        logging.exception(f"An error occurred while updating the task: {e}")
+        return jsonify({'error': 'An error occurred while updating the task'}), 500
 
-    tasks_data = file_handler.read_json_file(file_path)
-    if tasks_data is None:
+@task_blueprint.route('/<project_name>', methods=['PATCH'])
+def update_tasks(project_name):
+    """
+    Updates many tasks and subtasks with a single read, backup and write. All changes are
+    validated against the task document first; if any is invalid, none is applied. An If-Match
+    header naming a stale revision of the task file is answered with 412.
+
+    Request Body:
+        {"2": {"description": "..."}, "2.1": {"status": true}, "2.2": {"status": true}}
+
+    Args:
+        project_name (str): The name of the JSON file containing tasks.
+
+    Returns:
+        A JSON response with one result per task number. If any change is invalid, nothing is
+        written and a 400 is returned.
+    """
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, dict) or not changes:
+        return jsonify({'error': 'A non-empty map of task numbers to changes is required'}), 400
+    file_path = f'tasks/{project_name}.json'
+
+    original_index, _ = task_cache.get(file_path)
+    if original_index is None:
         return jsonify({'error': 'File not found'}), 404
 
-    try:
-        if '.' in task_number:
-            # Handle subtask
-            main_task, subtask_id = task_number.split('.', 1)
-            task_data = tasks_data['tasks'][main_task][task_number]
+    results = {}
+    valid = True
+    for task_number, task_changes in changes.items():
+        if not isinstance(task_changes, dict) or not ('status' in task_changes or 'description' in task_changes):
+            results[task_number] = {'error': "Changes must set 'status' and/or 'description'"}
+        elif 'description' in task_changes and '.' in task_number:
+            results[task_number] = {'error': 'Only main tasks have a description'}
         else:
-            # Handle main task
-            task_data = tasks_data['tasks'][task_number]
+            if task_number in original_index:
+                results[task_number] = None
+                continue
+            results[task_number] = {'error': 'Task or subtask not found'}
+        valid = False
 
-        # Update status and/or description
-        if 'status' in data:
-            task_data['status'] = data['status']
-        if 'description' in data and '.' not in task_number:
-            task_data['description'] = data['description']
+    if not valid:
+        for task_number, result in results.items():
+            if result is None:
+                results[task_number] = {'message': 'Not applied, the update was rejected'}
+        return jsonify({'error': 'No tasks were updated', 'results': results}), 400
 
-        # Write the updated data back to the file
-        file_handler.write_json_file(file_path, tasks_data)
-        return jsonify({"message": "Task updated successfully"}), 200
+    def apply_changes(task_index):
+        # Find every task first, so a missing one leaves the document unchanged
+        found = [(_find_task(task_index, task_number), task_number, task_changes)
+                 for task_number, task_changes in changes.items()]
+        for task_data, task_number, task_changes in found:
+            _apply_task_changes(task_data, task_number, task_changes)
 
+    try:
+        revision, failed = _write_tasks(project_name, file_path, list(changes), apply_changes)
+        if failed is not None:
+            return failed
+        for task_number in changes:
+            results[task_number] = {'message': 'Task updated successfully'}
+        return jsonify({'message': f'{len(changes)} tasks updated successfully', 'results': results,
+                        'revision': revision}), 200
     except KeyError as e:
+        # The task file was changed by another writer between validation and the write
         logging.error(f"Task or subtask not found: {e}")
-        return jsonify({'error': 'Task or subtask not found'}), 404
+        return jsonify({'error': 'No tasks were updated',
+                        'results': {str(e.args[0]): {'error': 'Task or subtask not found'}}}), 400
     except Exception as e:
-        logging.exception(f"An error occurred while updating the task: {e}")
-        return jsonify({'error': 'An error occurred while updating the task'}), 500
\ No newline at end of file
+        logging.exception(f"An error occurred while updating tasks: {e}")
+        return jsonify({'error': 'An error occurred while updating the tasks'}), 500
@@ -0,0 +1,62 @@
+# bench_markdown.py
+# Benchmarks Markdown rendering of task documents as the number of tasks grows: a cold render,
+# a render after a write changed one task (only that task's section is re-rendered, the others are
+# carried over from the previous version) and a cached render.
+# Usage: python tests/bench_markdown.py [max_tasks]
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from markdown_converter import MarkdownConverter
+
+SUBTASKS = 5
+
+
+def build_tasks(task_count):
+    """
+    Builds a task document with `task_count` main tasks of SUBTASKS subtasks each.
+    """
+    tasks = {}
+    for i in range(1, task_count + 1):
+        task = {"status": i % 3 == 0, "description": f"Main task {i}"}
+        for j in range(1, SUBTASKS + 1):
+            task[f"{i}.{j}"] = {"status": j % 2 == 0, "task": f"Subtask {j} of task {i}"}
+        tasks[str(i)] = task
+    return {"overview": "Benchmark project", "tasks": tasks}
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def bench(task_count):
+    data = build_tasks(task_count)
+    converter = MarkdownConverter(fragment_cache_size=task_count * 2)
+
+    cold, cold_ms = timed(lambda: converter.convert_to_markdown(data, version=1))
+
+    changed = copy.deepcopy(data)
+    changed_task = str(task_count // 2)
+    changed["tasks"][changed_task]["status"] = True
+    converter.record_update(1, 2, [changed_task])
+    updated, update_ms = timed(lambda: converter.convert_to_markdown(changed, version=2))
+    assert updated == MarkdownConverter().convert_to_markdown(changed)
+
+    cached, cached_ms = timed(lambda: converter.convert_to_markdown(data, version=1))
+    assert cached == cold
+    return cold_ms, update_ms, cached_ms
+
+
+if __name__ == "__main__":
+    max_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'tasks':>10} {'cold (ms)':>12} {'1 changed (ms)':>16} {'cached (ms)':>12}")
+    task_count = 100
+    while task_count <= max_tasks:
+        cold_ms, update_ms, cached_ms = bench(task_count)
+        print(f"{task_count:>10} {cold_ms:>12.2f} {update_ms:>16.2f} {cached_ms:>12.4f}")
+        task_count *= 10 if task_count < 10000 else 2
@@ -0,0 +1,61 @@
+# bench_notes_index.py
+# Benchmarks note lookup by ID as the number of notes in a project grows.
+# Usage: python tests/bench_notes_index.py [max_notes]
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from notes_manager import NotesManager
+
+LOOKUPS = 10000
+
+
+def build_notes(note_count):
+    """
+    Builds a notes tree with `note_count` notes spread over files, classes and methods.
+    """
+    notes_data = {"file": {}}
+    note_ids = []
+    for i in range(note_count):
+        file_node = notes_data["file"].setdefault(f"src/module_{i % 200}.py", {"class": {}})
+        class_node = file_node["class"].setdefault(f"Class{i % 7}", {"method": {}})
+        method_node = class_node["method"].setdefault(f"method_{i % 13}", {"notes": {}})
+        note_id = str(uuid.uuid4())
+        method_node["notes"][note_id] = {"content": f"Note {i}", "created_at": "2024-01-01T00:00:00"}
+        note_ids.append(note_id)
+    return notes_data, note_ids
+
+
+def bench(note_count):
+    notes_data, note_ids = build_notes(note_count)
+    with tempfile.TemporaryDirectory() as directory:
+        notes_file = os.path.join(directory, 'bench.json')
+        with open(notes_file, 'w') as file:
+            json.dump(notes_data, file)
+
+        started = time.perf_counter()
+        notes_manager = NotesManager(notes_file, None)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        sample = [random.choice(note_ids) for _ in range(LOOKUPS)]
+        started = time.perf_counter()
+        for note_id in sample:
+            notes_manager.get_note_by_id(note_id)
+        lookup_us = (time.perf_counter() - started) / LOOKUPS * 1e6
+    return load_ms, lookup_us
+
+
+if __name__ == "__main__":
+    max_notes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"{'notes':>10} {'load (ms)':>12} {'lookup (us)':>12}")
+    note_count = 1000
+    while note_count <= max_notes:
+        load_ms, lookup_us = bench(note_count)
+        print(f"{note_count:>10} {load_ms:>12.1f} {lookup_us:>12.3f}")
+        note_count *= 10 if note_count < 100000 else 2
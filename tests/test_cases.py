@@ -362,5 +362,276 @@ tests = [
         "data": {
             "content": "Your YAML content here"
         }
+    },
+
+    ## 7. Authentication
+    ### 7.1. Exchange an API key for a session token (Test 22)
+    {
+        "name": f"Issue Session Token for {project_name}",
+        "overview": f"Testing exchange of an API key for a short-lived session token for the '{project_name}' project.",
+        "endpoint": f"{base_url}/auth/{project_name}/token",
+        "method": "POST",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        }
+    },
+
+    ## 8. Notes Queries
+    ### 8.1. Query all method notes within a file (Test 23)
+    {
+        "name": f"Query Method Notes in a File for {project_name}",
+        "overview": f"Testing retrieval of all 'method' notes under a file in the '{project_name}' project.",
+        "endpoint": f"{base_url}/notes/{project_name}/query",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "type": "method",
+            "under": "<file:src/main.py>"
+        }
+    },
+
+    ### 8.2. Count notes per type (Test 24)
+    {
+        "name": f"Count Notes per Type for {project_name}",
+        "overview": f"Testing retrieval of per-type note counts for the '{project_name}' project.",
+        "endpoint": f"{base_url}/notes/{project_name}/counts",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        }
+    },
+
+    ### 8.3. Full-text search over notes (Test 25)
+    {
+        "name": f"Search Notes in {project_name}",
+        "overview": f"Testing full-text search with prefix matching over the notes of the '{project_name}' project.",
+        "endpoint": f"{base_url}/notes/{project_name}/search",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "q": "meth",
+            "prefix": "true",
+            "page": 1,
+            "per_page": 10
+        }
+    },
+
+    ### 8.4. Batch note operations (Test 26)
+    {
+        "name": f"Batch Note Operations for {project_name}",
+        "overview": f"Testing an atomic batch of note additions in the '{project_name}' project.",
+        "endpoint": f"{base_url}/notes/{project_name}/batch",
+        "method": "POST",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "data": {
+            "operations": [
+                {"op": "add", "identifier": "<file:src/main.py>/<class:MyClass>", "content": "Batch note 1"},
+                {"op": "add", "identifier": "<file:src/main.py>/<class:MyClass>/<method:my_method>", "content": "Batch note 2"}
+            ]
+        }
+    },
+
+    ## 9. Task Caching and History
+    ### 9.1. Task document cache statistics (Test 27)
+    {
+        "name": "Get Task Cache Statistics",
+        "overview": "Testing retrieval of the hit, miss and eviction counters of the task document cache.",
+        "endpoint": f"{base_url}/tasks/cache/stats",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        }
+    },
+
+    ### 9.2. Task history (Test 28)
+    {
+        "name": f"Get Task History for {project_name}",
+        "overview": f"Testing the list of recorded versions of the '{project_name}' task file.",
+        "endpoint": f"{base_url}/tasks/{project_name}/history",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "limit": 10
+        }
+    },
+
+    ### 9.3. Tasks at a point in time (Test 29)
+    {
+        "name": f"Get Tasks at a Point in Time for {project_name}",
+        "overview": f"Testing retrieval of the '{project_name}' tasks as they were at a given timestamp.",
+        "endpoint": f"{base_url}/tasks/{project_name}",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "at": "2024-01-01T12:00:00",
+            "format": "md"
+        }
+    },
+
+    ### 9.4. Bulk task update (Test 30)
+    {
+        "name": f"Bulk Update Tasks in '{project_name}'",
+        "overview": f"Testing a single PATCH updating several tasks and subtasks in '{project_name}' project.",
+        "endpoint": f"{base_url}/tasks/{project_name}",
+        "method": "PATCH",
+        "data": {
+            "2": {"description": "Updated description for task 2"},
+            "2.1": {"status": True},
+            "2.2": {"status": True}
+        },
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        }
+    },
+
+    ### 9.5. Task change feed, long poll (Test 31)
+    {
+        "name": f"Poll Task Changes for {project_name}",
+        "overview": f"Testing the long poll fallback of the '{project_name}' task change feed.",
+        "endpoint": f"{base_url}/tasks/{project_name}/changes",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "mode": "poll",
+            "since": "0",
+            "timeout": 1
+        }
+    },
+
+    ### 8.5. Note change feed, long poll (Test 32)
+    {
+        "name": f"Poll Note Changes for {project_name}",
+        "overview": f"Testing the long poll fallback of the '{project_name}' note change feed.",
+        "endpoint": f"{base_url}/notes/{project_name}/changes",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "mode": "poll",
+            "since": "0",
+            "timeout": 1
+        }
+    },
+
+    ### 9.6. Task with all descendants (Test 33)
+    {
+        "name": f"Get Task 3 with All Subtasks from {project_name}",
+        "overview": f"Testing retrieval of task 3 and all of its subtasks at any depth as a flat mapping in '{project_name}' project.",
+        "endpoint": f"{base_url}/tasks/{project_name}/3",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "descendants": "true"
+        }
+    },
+
+    ## 10. Disk Files
+    ### 10.1. Disk file cache statistics (Test 34)
+    {
+        "name": "Get Disk File Cache Statistics",
+        "overview": "Testing retrieval of the hit rate and bytes held by the parsed disk file cache.",
+        "endpoint": f"{base_url}/disk/cache/stats",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        }
+    },
+
+    ### 10.2. Raw disk file with a byte range (Test 35)
+    {
+        "name": f"Stream Raw Disk File from {project_name}",
+        "overview": f"Testing raw streaming of a disk file in the '{project_name}' project.",
+        "endpoint": f"{base_url}/disk/{project_name}/README",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "format": "md",
+            "raw": "true"
+        }
+    },
+
+    ### 10.3. Disk file converted to Markdown (Test 36)
+    {
+        "name": f"Get OpenAPI Spec as Markdown from {project_name}",
+        "overview": f"Testing conversion of a JSON disk file to Markdown in the '{project_name}' project.",
+        "endpoint": f"{base_url}/disk/{project_name}/openapi",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "format": "json",
+            "as": "md"
+        }
+    },
+
+    ### 10.4. Disk project listing (Test 37)
+    {
+        "name": f"List JSON Files in {project_name}",
+        "overview": f"Testing the paginated listing of the JSON files at any depth in the '{project_name}' project.",
+        "endpoint": f"{base_url}/disk/{project_name}",
+        "method": "GET",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "list": "*.json",
+            "depth": 0,
+            "page": 1,
+            "per_page": 50
+        }
+    },
+
+    ### 10.5. Upload a disk file (Test 38)
+    {
+        "name": f"Upload JSON File to {project_name}",
+        "overview": f"Testing the streamed, validated upload of a JSON file to the '{project_name}' project.",
+        "endpoint": f"{base_url}/disk/{project_name}/uploads/example",
+        "method": "PUT",
+        "data": {
+            "openapi": "3.0.0",
+            "info": {"title": "Example", "version": "1.0"},
+            "paths": {}
+        },
+        "headers": {
+            "Content-Type": "application/json",
+            "X-API-Key": f"{api_key}"
+        },
+        "params": {
+            "format": "json"
+        }
     }
 ]
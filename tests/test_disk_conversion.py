@@ -0,0 +1,77 @@
+# test_disk_conversion.py
+# Tests converted file requests that outlive DISK_CONVERSION_TIMEOUT: the request is answered with
+# 202 and Retry-After while the conversion keeps running, and the retry is served from the cache.
+# Parsing of the source file is held back by an event so the conversion is reliably still running.
+# Usage: python -m unittest tests/test_disk_conversion.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+import disk_routes
+from conversion_cache import ConversionCache
+from disk_manager import DiskManager
+
+
+class HeldDiskManager(DiskManager):
+    """
+    DiskManager whose parsing waits until the test releases it.
+    """
+
+    def __init__(self, base_path):
+        super().__init__(base_path)
+        self.release = threading.Event()
+
+    def _parse_file(self, full_path, format_type):
+        self.release.wait(5)
+        return super()._parse_file(full_path, format_type)
+
+
+class DiskConversionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'project'))
+        with open(os.path.join(self.directory, 'project', 'spec.json'), 'w') as file:
+            json.dump({"openapi": "3.0.0", "info": {"title": "Spec", "version": "1.0"}}, file)
+
+        self.disk_manager = HeldDiskManager(self.directory)
+        self.routes = (disk_routes.disk_manager, disk_routes.conversion_cache)
+        disk_routes.disk_manager = self.disk_manager
+        disk_routes.conversion_cache = ConversionCache(self.disk_manager, workers=1, timeout=0.05)
+
+        app = Flask(__name__)
+        app.register_blueprint(disk_routes.disk_blueprint, url_prefix='/disk')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.disk_manager.release.set()
+        disk_routes.disk_manager, disk_routes.conversion_cache = self.routes
+        shutil.rmtree(self.directory)
+
+    def test_slow_conversion_is_answered_with_202(self):
+        response = self.client.get('/disk/project/spec?format=json&as=md')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(disk_routes.conversion_cache.stats()['pending'], 1)
+
+        self.disk_manager.release.set()
+        for _ in range(50):
+            if disk_routes.conversion_cache.stats()['pending'] == 0:
+                break
+            time.sleep(0.05)
+
+        response = self.client.get('/disk/project/spec?format=json&as=md')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/markdown; charset=utf-8')
+        self.assertIn('Spec', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
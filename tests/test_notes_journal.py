@@ -0,0 +1,119 @@
+# test_notes_journal.py
+# Tests journaled notes persistence: replay of a torn trailing record, and compaction by one worker
+# while another appends to the same journal. Each NotesManager with its own NotesJournal stands in
+# for a worker process; they coordinate through the journal's file lock as separate processes do.
+# Usage: python -m unittest tests/test_notes_journal.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from notes_journal import NotesJournal
+from notes_manager import NotesManager
+from notes_registry import NotesRegistry
+
+
+def add_record(note_id, content):
+    return {"op": "add", "path": [["file", "main.py"]], "id": note_id,
+            "note": {"content": content, "created_at": "2024-01-01T00:00:00", "created_by": "test"}}
+
+
+class NotesJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.notes_file = os.path.join(self.directory, 'project.json')
+        with open(self.notes_file, 'w') as file:
+            json.dump({}, file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def worker(self):
+        return NotesManager(self.notes_file, None, NotesJournal(self.notes_file, fsync_policy='never'))
+
+    def write_journal(self, data):
+        with open(self.notes_file + '.journal', 'wb') as file:
+            file.write(data)
+
+    def test_replay_ignores_torn_trailing_record(self):
+        complete = ''.join(json.dumps(add_record(f"n{i}", f"note {i}")) + '\n' for i in range(2))
+        self.write_journal(complete.encode('utf-8') + b'{"op":"add","path":[["file","ma')
+
+        manager = self.worker()
+        self.assertEqual(manager.journal_records, 2)
+        self.assertIsNotNone(manager.get_note_by_id('n0'))
+        self.assertIsNotNone(manager.get_note_by_id('n1'))
+
+    def test_append_after_torn_record_is_not_lost(self):
+        self.write_journal(json.dumps(add_record('n0', 'note 0')).encode('utf-8') + b'\n{"op":"ad')
+
+        added, note_id = self.worker().add_note('<file:main.py>', 'after the crash', 'test')
+        self.assertTrue(added)
+
+        reloaded = self.worker()
+        self.assertIsNotNone(reloaded.get_note_by_id('n0'))
+        self.assertEqual(reloaded.get_note_by_id(note_id)['content'], 'after the crash')
+
+    def test_compaction_folds_records_of_other_workers(self):
+        compacting = self.worker()
+        appending = self.worker()
+        _, own_id = compacting.add_note('<file:main.py>', 'own note', 'test')
+        _, other_id = appending.add_note('<file:main.py>', 'other note', 'test')
+
+        self.assertEqual(compacting.compact(), 2)
+        self.assertFalse(os.path.exists(self.notes_file + '.journal'))
+
+        reloaded = self.worker()
+        self.assertIsNotNone(reloaded.get_note_by_id(own_id))
+        self.assertIsNotNone(reloaded.get_note_by_id(other_id))
+
+    def test_compaction_racing_appends_loses_nothing(self):
+        compacting = self.worker()
+        appending = self.worker()
+        note_ids = []
+        done = threading.Event()
+
+        def append():
+            for i in range(300):
+                _, note_id = appending.add_note('<file:main.py>', f"note {i}", 'test')
+                note_ids.append(note_id)
+            done.set()
+
+        def compact():
+            while not done.is_set():
+                compacting.compact()
+
+        threads = [threading.Thread(target=append), threading.Thread(target=compact)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reloaded = self.worker()
+        missing = [note_id for note_id in note_ids if reloaded.get_note_by_id(note_id) is None]
+        self.assertEqual(missing, [])
+
+    def test_eviction_compacts_journal(self):
+        for name in ('a', 'b'):
+            with open(os.path.join(self.directory, f"{name}.json"), 'w') as file:
+                json.dump({}, file)
+        registry = NotesRegistry(self.directory, None, max_projects=1, persistence='journal',
+                                 compact_interval=3600)
+        with registry.open('a') as manager:
+            _, note_id = manager.add_note('<file:main.py>', 'evicted note', 'test')
+        with registry.open('b'):
+            pass
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'a.json.journal')))
+        self.assertNotIn('a', registry._project_locks)
+        with registry.open('a') as manager:
+            self.assertEqual(manager.get_note_by_id(note_id)['content'], 'evicted note')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,8 @@ def test_endpoint(name, url, method, data=None, params=None, overview="", expect
             response = requests.post(url, json=data, headers=headers, params=params)
         elif method == "PUT":
             response = requests.put(url, json=data, headers=headers, params=params)
+        elif method == "PATCH":
+            response = requests.patch(url, json=data, headers=headers, params=params)
         elif method == "DELETE":
             response = requests.delete(url, json=data, headers=headers, params=params)
 
@@ -0,0 +1,157 @@
+# test_task_revisions.py
+# Tests optimistic concurrency and group commits of task updates: a stale If-Match is answered with
+# 412, also within a batch; concurrent writers all get their updates applied with distinct
+# revisions; updates queued behind a commit are written together; requests for a missing project
+# leave no lock file or change channel behind; and a revision committed by another worker is seen
+# even if the document did not change. A second RevisionTracker stands in for another worker process; they
+# coordinate through the sidecar and its lock file.
+# Usage: python -m unittest tests/test_task_revisions.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from change_feed import change_feed
+from revisions import RevisionTracker, revision_tracker
+from task_routes import file_handler, task_blueprint, task_committer
+
+TASK_COUNT = 8
+
+
+class TaskRevisionsTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        os.makedirs(os.path.join('tasks', 'backups', 'store', 'timeline'))
+        # Each test uses its own project, the route modules keep state per project
+        self.project = os.path.basename(self.directory)
+        self.file_path = f'tasks/{self.project}.json'
+        tasks = {str(number): {"description": f"Task {number}", "status": False,
+                               f"{number}.1": {"task": f"Subtask {number}.1", "status": False}}
+                 for number in range(1, TASK_COUNT + 1)}
+        with open(self.file_path, 'w') as file:
+            json.dump({"overview": "Test project", "tasks": tasks}, file)
+
+        app = Flask(__name__)
+        app.register_blueprint(task_blueprint, url_prefix='/tasks')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def read_tasks(self):
+        with open(self.file_path) as file:
+            return json.load(file)['tasks']
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(f'/tasks/{self.project}').headers['ETag']
+
+        response = self.client.put(f'/tasks/{self.project}/1', json={"status": True}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.put(f'/tasks/{self.project}/2', json={"status": True}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+
+        tasks = self.read_tasks()
+        self.assertTrue(tasks['1']['status'])
+        self.assertFalse(tasks['2']['status'])
+
+    def test_concurrent_writers_apply_every_update(self):
+        revisions = []
+
+        def update(number):
+            response = self.client.put(f'/tasks/{self.project}/{number}.1', json={"status": True})
+            self.assertEqual(response.status_code, 200)
+            revisions.append(response.json['revision'])
+
+        threads = [threading.Thread(target=update, args=(number,)) for number in range(1, TASK_COUNT + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        tasks = self.read_tasks()
+        self.assertTrue(all(tasks[str(number)][f'{number}.1']['status'] for number in range(1, TASK_COUNT + 1)))
+        self.assertEqual(len(set(revisions)), TASK_COUNT)
+        self.assertEqual(revision_tracker.current(self.file_path), max(revisions))
+
+    def run_batched(self, updates):
+        """
+        Runs updates (callables) on threads while the task file's revision lock is held, so the
+        first one commits alone and the others queue behind it and are committed as one batch.
+        """
+        threads = [threading.Thread(target=update) for update in updates]
+        with revision_tracker.lock(self.file_path):
+            for thread in threads:
+                thread.start()
+                # Queue in order
+                time.sleep(0.02)
+            for _ in range(200):
+                if len(task_committer._queues.get(self.file_path, ())) == len(updates) - 1:
+                    break
+                time.sleep(0.01)
+        for thread in threads:
+            thread.join()
+
+    def test_queued_updates_are_committed_with_one_write(self):
+        writes = []
+        file_handler.add_write_listener(writes.append)
+        self.addCleanup(file_handler._write_listeners.remove, writes.append)
+        statuses = []
+
+        def update(number):
+            response = self.client.put(f'/tasks/{self.project}/{number}', json={"status": True})
+            statuses.append(response.status_code)
+
+        self.run_batched([lambda number=number: update(number) for number in range(1, TASK_COUNT + 1)])
+
+        self.assertEqual(statuses, [200] * TASK_COUNT)
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(all(task['status'] for task in self.read_tasks().values()))
+
+    def test_stale_if_match_within_a_batch_is_rejected(self):
+        revision = revision_tracker.current(self.file_path)
+        statuses = {}
+
+        def update(number, headers):
+            response = self.client.put(f'/tasks/{self.project}/{number}', json={"status": True}, headers=headers)
+            statuses[number] = response.status_code
+
+        # Both queued updates were read after the first one; only the earlier of them may apply
+        after_first = {'If-Match': f'"{revision + 1}.0"'}
+        self.run_batched([lambda: update(1, {}), lambda: update(2, after_first), lambda: update(3, after_first)])
+
+        self.assertEqual(statuses, {1: 200, 2: 200, 3: 412})
+        self.assertEqual(revision_tracker.current(self.file_path), revision + 2)
+
+    def test_missing_project_leaves_no_files(self):
+        before = sorted(os.listdir('tasks'))
+
+        response = self.client.get('/tasks/missing-project')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(sorted(os.listdir('tasks')), before)
+        self.assertNotIn('tasks/missing-project.json', revision_tracker._locks)
+
+        response = self.client.get('/tasks/missing-project/changes?mode=poll&timeout=0')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(('tasks', 'missing-project'), change_feed._channels)
+
+    def test_commit_by_another_worker_is_seen(self):
+        revision = revision_tracker.current(self.file_path)
+        # Another worker commits without changing the document, as journaled notes appends do
+        RevisionTracker().commit(self.file_path)
+
+        self.assertEqual(revision_tracker.current(self.file_path), revision + 1)
+        self.assertEqual(revision_tracker.commit(self.file_path), revision + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
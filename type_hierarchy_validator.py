@@ -3,9 +3,18 @@
 # file representing a hierarchy of types and provide methods to validate a sequence of types 
 # against this hierarchy and to retrieve the allowed children for a given type. It includes 
 # comprehensive error checking and logging.
+#
+# The hierarchy is compiled at load time into integer type codes with a bitmask of allowed child
+# types per type, and validated type sequences are kept in a bounded LRU cache, so repeated notes on
+# the same file/class/method path validate in near-constant time.
 import re
 import json
 import logging
+import os
+from functools import lru_cache
+
+# Matches one '<type:name>' segment of a hierarchical identifier
+IDENTIFIER_PATTERN = re.compile(r'<([\w-]+):([^>]+)>')
 
 class TypeHierarchyValidator:
     """
@@ -13,17 +22,20 @@ class TypeHierarchyValidator:
 
     Attributes:
         type_hierarchy (dict): A dictionary representing the type hierarchy loaded from JSON.
+        type_codes (dict): Integer code of every known type, including types that only appear as children.
 
     Methods:
         validate_hierarchy(identifier): Validates if a sequence of note types in the identifier adheres to the hierarchy.
     """
 
-    def __init__(self, json_file):
+    def __init__(self, json_file, cache_size=None):
         """
         Initializes the TypeHierarchyValidator class by loading the type hierarchy from a JSON file.
 
         Args:
             json_file (str): Path to the JSON file containing the type hierarchy.
+            cache_size (int, optional): Number of validated type sequences to cache.
+                Defaults to TYPE_HIERARCHY_CACHE_SIZE, or 4096.
         """
         try:
             with open(json_file) as f:
@@ -40,6 +52,28 @@ class TypeHierarchyValidator:
             logging.error(f"An error occurred while loading the type hierarchy: {str(e)}")
             raise
 
+        self._compile()
+        cache_size = cache_size or int(os.getenv('TYPE_HIERARCHY_CACHE_SIZE', 4096))
+        self._validate_type_sequence = lru_cache(maxsize=cache_size)(self._validate_type_sequence)
+        self._note_types = lru_cache(maxsize=cache_size)(self._note_types)
+
+    def _compile(self):
+        """
+        Compiles the loaded hierarchy into integer type codes and, per type code, a bitmask of the
+        type codes allowed as its children.
+        """
+        types = self.type_hierarchy.get('types', {})
+        self.type_codes = {}
+        for parent, definition in types.items():
+            self.type_codes.setdefault(parent, len(self.type_codes))
+            for child in definition.get('children', []):
+                self.type_codes.setdefault(child.lower(), len(self.type_codes))
+
+        self._allowed_children = [0] * len(self.type_codes)
+        for parent, definition in types.items():
+            for child in definition.get('children', []):
+                self._allowed_children[self.type_codes[parent]] |= 1 << self.type_codes[child.lower()]
+
     def validate_hierarchy(self, identifier):
         """
         Validates if a sequence of note types in the identifier adheres to the defined type hierarchy.
@@ -50,23 +84,50 @@ class TypeHierarchyValidator:
         Returns:
             bool: True if the hierarchy is valid, False otherwise.
         """
-        note_types = [segment.split(':')[0].lower() for segment in identifier.split('/') if ':' in segment]
-
         try:
-            for i in range(len(note_types) - 1):
-                parent, child = note_types[i], note_types[i + 1]
-                if child not in self.type_hierarchy['types'][parent]['children']:
-                    logging.warning(f"Invalid hierarchy: '{child}' cannot be a child of '{parent}'")
-                    return False
-            logging.info("Hierarchy validation successful for " + str(note_types))
-            return True
-        except KeyError as e:
-            logging.error("Invalid type encountered in the hierarchy validation: " + str(e))
-            return False
+            return self._validate_type_sequence(self._note_types(identifier))
         except Exception as e:
             logging.error("An error occurred during hierarchy validation: " + str(e))
             return False
 
+    def _note_types(self, identifier):
+        """
+        Extracts the lower-cased note types of an identifier. Wrapped in a per-instance LRU cache.
+
+        Args:
+            identifier (str): The hierarchical identifier of the note.
+
+        Returns:
+            tuple of str: The note types from the root down.
+        """
+        return tuple(note_type.lower() for note_type, _ in parse_identifier(identifier))
+
+    def _validate_type_sequence(self, note_types):
+        """
+        Validates a tuple of note types. Wrapped in a per-instance LRU cache; since a sequence is
+        validated by checking its prefix first, cached prefixes are shared between sequences.
+
+        Args:
+            note_types (tuple of str): Lower-cased note types from the root down.
+
+        Returns:
+            bool: True if every type is known and each is an allowed child of its predecessor.
+        """
+        if not note_types:
+            return True
+        child = self.type_codes.get(note_types[-1])
+        if child is None:
+            logging.warning(f"Invalid hierarchy: unknown type '{note_types[-1]}'")
+            return False
+        if len(note_types) == 1:
+            return True
+        if not self._validate_type_sequence(note_types[:-1]):
+            return False
+        if not self._allowed_children[self.type_codes[note_types[-2]]] >> child & 1:
+            logging.warning(f"Invalid hierarchy: '{note_types[-1]}' cannot be a child of '{note_types[-2]}'")
+            return False
+        return True
+
     def _convert_keys_to_lower(self, data):
         """
         Converts all keys in a nested dictionary to lowercase.
@@ -92,8 +153,20 @@ def parse_identifier(identifier):
     Returns:
         list of tuples: A list of tuples where each tuple contains a type and a name/path.
     """
-    pattern = r'<(\w+):([^>]+)>'
-    return re.findall(pattern, identifier)
+    return IDENTIFIER_PATTERN.findall(identifier)
+
+
+def format_identifier(parsed_identifier):
+    """
+    Formats parsed identifier components back into a hierarchical identifier.
+
+    Args:
+        parsed_identifier (iterable of tuples): (type, name/path) pairs as returned by parse_identifier.
+
+    Returns:
+        str: The hierarchical identifier, e.g. '<file:src/main.py>/<class:MyClass>'.
+    """
+    return '/'.join(f"<{type}:{name}>" for type, name in parsed_identifier)
 # Example usage:
 # validator = TypeHierarchyValidator('./config/type_hierarchy.json')
 # note_types = ['project', 'file', 'class', 'method']